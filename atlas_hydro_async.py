@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+asyncio front-end of atlas_hydro_tools.py library.
+Compatibility: python3 only (asyncio).
+
+AsyncAtlasHydroTools offers the measurement functions of AtlasHydroTools as coroutines so that EZO modules can be used inside an asyncio based code without a thread per call. All timeouts and ready-polling waits are made with asyncio.sleep, bus transactions (writing a command, reading a response) are serialised with an asyncio lock held only during the transaction, never during the waits, and each EZO module is queried by one coroutine at a time. Many EZO modules and other I/O can then be interleaved on one event loop.
+
+The class relies on an AtlasHydroTools object (constructed with autoscan=False) for the I2C communication, the errors management, the latency model and the lists of connected EZO modules. Please refer to atlas_hydro_tools.py header for the description of the arguments and of the error values, they are the same here.
+
+Example:
+    async def main():
+        async with await AsyncAtlasHydroTools.create() as tentacle:
+            temp, ph = await asyncio.gather(tentacle.read_t(), tentacle.read_ph())
+            readings = await tentacle.read_all("sim")
+
+    asyncio.run(main())
+
+LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
+
+    # ========== CONSTRUCTOR ==========#
+
+    __init__(mode="op", silent=True, keep_awake=True, poll=True, transport="smbus"): Constructor of the class. Initialises the communication protocols and default values. NO EZO MODULE IS KNOWN UNTIL scan() IS AWAITED, please use create() instead.
+            mode, silent, keep_awake, poll, transport: see respective descriptions in AtlasHydroTools constructor. Ready-polling is activated by default.
+
+    create(mode="op", silent=True, keep_awake=True, poll=True, transport="smbus"): Coroutine class method constructing the class and awaiting scan(). Returns the constructed object.
+            mode, silent, keep_awake, poll, transport: see respective descriptions in Constructor above.
+
+    close(): Coroutine waiting for the bus transaction in progress, then closing the AtlasHydroTools object (see AtlasHydroTools close() function). No function using the bus can be called afterwards. Should be awaited explicitly when done, or the object used as an asynchronous context manager (async with await AsyncAtlasHydroTools.create() as tentacle: ...).
+
+    # ========== PRIVATE FUNCTIONS ==========#
+
+    _module_lock(addr): Returns the asyncio lock of EZO module with addr address, held during its' whole measurement process.
+            addr: Integer argument, no default value. I2C address of a connected EZO module.
+
+    _poll(addr, start, first, cmd=None): Coroutine counterpart of AtlasHydroTools._poll() function.
+
+    _read(addr, start, cmd, temp): Coroutine waiting for the response of EZO module with addr address to cmd command sent at start time, then reading it. Waits the learned or default timeout in sleep mode and polls the status byte in poll mode. Returns measurement as a tuple (see AtlasHydroTools._read() function).
+            addr: Integer argument, no default value. I2C address of a connected EZO module.
+            start: Float argument, no default value. _clock() time at which the command was sent.
+            cmd: String argument, no default value. Name of the sent command ("R" or "RT").
+            temp: Float argument, no default value. Compensation temperature sent with "RT" command, None for "R" command.
+
+    _query(addr, rt=True, temp=default_temp): Coroutine counterpart of AtlasHydroTools._query() function. Returns measurement as a tuple (see AtlasHydroTools._read() function).
+
+    _measure_t(): Coroutine counterpart of AtlasHydroTools._measure_t() function. The measured temperature is kept for "spec" mode of read_multi().
+
+    _query_speculative(addr, indexes, temp): Coroutine measuring EZO modules addr[i] for i in indexes concurrently with the RTD EZO module addr[indexes[0]], temperature compensated ones with temp temperature. Once both the temperature and the compensated measurement are read, EZO modules whose temperature differs from the measured one by more than spec_tolerance are queried again with the measured temperature. Returns the list of measurement tuples in indexes order.
+
+    _read_sensor(sensor, rt=True, temp=default_temp): Coroutine reading EZO module of sensor type. Returns measurement as float, or -100.0 in operation mode if no such EZO module is connected (EZOnotConnected raised in development mode).
+            sensor: String argument, no default value. One of ["rtd", "ph", "ec", "do", "orp"].
+            rt, temp: see respective descriptions in AtlasHydroTools._write() function.
+
+    # ========== PUBLIC FUNCTIONS ==========#
+
+    scan(), read(addr, rt=True, temp=default_temp), read_t(), read_ph(rt=False, temp=default_temp), read_ec(rt=False, temp=default_temp), read_do(rt=False, temp=default_temp), read_orp(), read_all(mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"), set_t(temp=default_temp), cmd(addr, cmd): Coroutine counterparts of the AtlasHydroTools functions with the same names and arguments.
+        NB: set_t() waits for the measurements in progress of the temperature compensated EZO modules (and holds them until the "T" commands are processed).
+
+    read_multi(addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"): Coroutine counterpart of AtlasHydroTools.read_multi() function, with the same modes and forms.
+        NB.1: in "sim" and "spec" modes the measurements of all EZO modules are awaited concurrently, each module being read as soon as it is ready.
+        NB.2: unlike AtlasHydroTools.read_multi(), the addr list given as argument is not modified.
+        NB.3: raises ReadMultiError if mode or form is unknown, ImportError for "array" form if numpy is not installed.
+
+    addresses(), sensors(), versions(), units(), mode_change(mode=""), poll_config(...), latency(addr=None), latency_config(...), latency_reset(addr=None), latency_save(path), latency_load(path), stats(addr=None), stats_reset(addr=None), stats_export(path): Non blocking functions of AtlasHydroTools, directly called.
+
+'''
+
+import asyncio
+
+from atlas_hydro_tools import AtlasHydroTools, EZOnotConnected, EZOnotReady, EZOError, ReadMultiError, STATUS_OK, STATUS_NOT_CONNECTED, _clock
+
+try:
+    import numpy
+except ImportError:  # read_multi() "array" form unavailable.
+    numpy = None
+
+
+class AsyncAtlasHydroTools(object):
+
+    default_temp = AtlasHydroTools.default_temp
+
+    _shared = ("mode", "silent", "poll", "addresses", "sensors", "versions", "units", "mode_change", "poll_config",
+               "latency", "latency_config", "latency_reset", "latency_save", "latency_load",
+               "stats", "stats_reset", "stats_export")  # non blocking AtlasHydroTools attributes and functions directly accessible.
+
+    # ========== CONSTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, mode="op", silent=True, keep_awake=True, poll=True, transport="smbus"):
+        self._tools = AtlasHydroTools(mode, silent, keep_awake, poll, autoscan=False, transport=transport)
+        self._bus_lock = asyncio.Lock()  # held during bus transactions only.
+        self._module_locks = {}  # {address: lock held during the whole measurement process of the EZO module}.
+
+    @classmethod
+    async def create(cls, mode="op", silent=True, keep_awake=True, poll=True, transport="smbus"):
+        tentacle = cls(mode, silent, keep_awake, poll, transport)
+        await tentacle.scan()
+        return tentacle
+
+    def __getattr__(self, name):
+        if name in self._shared:
+            return getattr(self._tools, name)
+        raise AttributeError(name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _module_lock(self, addr):
+        if addr not in self._module_locks:
+            self._module_locks[addr] = asyncio.Lock()
+        return self._module_locks[addr]
+
+    async def _poll(self, addr, start, first, cmd=None):
+        tools = self._tools
+        interval = tools._poll_interval
+        polls = 1
+        slept = max(0.0, start + first - _clock())
+        await asyncio.sleep(slept)
+        async with self._bus_lock:
+            status, data = tools._read_raw(addr)
+        while status == 254 and _clock() + interval < start + tools._poll_deadline:  # 254: EZO module still processing the command.
+            await asyncio.sleep(interval)
+            slept += interval
+            interval = min(interval * tools._poll_backoff, tools._poll_max_interval)
+            async with self._bus_lock:
+                status, data = tools._read_raw(addr)
+            polls += 1
+        if cmd is not None:
+            if status == 1 and tools.poll:
+                tools._learn(addr, cmd, _clock() - start)
+            tools._observe(addr, cmd, _clock() - start, slept, polls)
+        return status, data
+
+    async def _read(self, addr, start, cmd, temp):
+        tools = self._tools
+        try:
+            if tools.poll:
+                status, data = await self._poll(addr, start, tools._first_check(addr, cmd), cmd)
+            else:
+                status, data = await self._poll(addr, start, tools._timeout(addr, cmd), cmd)
+            return tools._parse(status, data), STATUS_OK, start, temp, data
+        except ValueError:
+            return tools._failure(EZOnotReady, addr, start, temp)
+        except OSError:
+            return tools._failure(EZOError, addr, start, temp)
+
+    async def _query(self, addr, rt=True, temp=default_temp):
+        tools = self._tools
+        try:
+            addr = tools._check_addr(addr)
+        except EZOnotConnected:
+            return tools._failure(EZOnotConnected, addr)
+
+        async with self._module_lock(addr):
+            try:
+                async with self._bus_lock:
+                    addr, cmd, temp = tools._write(addr, rt, temp)
+                start = _clock()
+            except OSError:
+                return tools._failure(EZOError, addr)
+            return await self._read(addr, start, cmd, temp)
+
+    async def _measure_t(self):
+        tools = self._tools
+        if tools._rtd:
+            reading = await self._query(tools._addresses[tools._sensors.index("rtd")])
+            if reading[1] == STATUS_OK and tools.minH2Otemp < reading[0] < tools.maxH2Otemp:
+                tools._last_temp = reading[0]
+            return reading
+        else:
+            return -100.0, STATUS_NOT_CONNECTED, _clock(), None, None
+
+    async def _query_speculative(self, addr, indexes, temp):
+        tools = self._tools
+        rtd = asyncio.ensure_future(self._measure_t())
+
+        async def compensated(address):
+            reading = await self._query(address, True, temp)
+            measured = await rtd  # temperature measured concurrently.
+            if measured[1] == STATUS_OK and tools.minH2Otemp < measured[0] < tools.maxH2Otemp and abs(temp - measured[0]) > tools.spec_tolerance:
+                if not tools.silent:
+                    print("Temperature changed to", measured[0], "\b°C, querying I2C address", address, "again")
+                reading = await self._query(address, True, measured[0])
+            return reading
+
+        others = [compensated(addr[i]) if tools._sensors[tools._addresses.index(addr[i])] not in tools._no_rt else self._query(addr[i]) for i in indexes[1:]]
+        return list(await asyncio.gather(rtd, *others))
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    async def scan(self):
+        tools = self._tools
+        await asyncio.sleep(tools._short_timeout)
+        async with self._bus_lock:
+            tools._scan_wake()
+        await asyncio.sleep(tools._short_timeout)
+        async with self._bus_lock:
+            tools._scan_probe()
+        await asyncio.sleep(tools._short_timeout)
+        async with self._bus_lock:
+            tools._scan_identify()
+        await asyncio.sleep(tools._medium_timeout)
+        async with self._bus_lock:
+            tools._scan_collect()
+        await asyncio.sleep(tools._short_timeout)
+
+    async def read(self, addr, rt=True, temp=default_temp):
+        return (await self._query(addr, rt, temp))[0]
+
+    async def read_t(self):
+        return (await self._measure_t())[0]
+
+    async def _read_sensor(self, sensor, rt=True, temp=default_temp):
+        tools = self._tools
+        try:
+            addr = tools._addresses[tools._sensors.index(sensor)]
+        except ValueError:
+            return tools._error(EZOnotConnected, sensor)
+        return await self.read(addr, rt, temp)
+
+    async def read_ph(self, rt=False, temp=default_temp):
+        return await self._read_sensor("ph", rt, temp)
+
+    async def read_ec(self, rt=False, temp=default_temp):
+        return await self._read_sensor("ec", rt, temp)
+
+    async def read_do(self, rt=False, temp=default_temp):
+        return await self._read_sensor("do", rt, temp)
+
+    async def read_orp(self):
+        return await self._read_sensor("orp")
+
+    async def read_multi(self, addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"):
+        tools = self._tools
+        if not isinstance(mode, str) or mode.lower() not in ["seq", "sim", "spec"] or not isinstance(form, str) or form.lower() not in ["float", "record", "array"]:
+            raise ReadMultiError
+        if form.lower() == "array" and numpy is None:
+            raise ImportError("numpy is needed for read_multi() \"array\" form")
+
+        addr = list(addr)
+        readings = [None] * len(addr)  # measurement tuples (see AtlasHydroTools._read() function).
+        for i in range(len(addr)):
+            try:
+                addr[i] = tools._check_addr(addr[i])
+            except EZOnotConnected:
+                readings[i] = tools._failure(EZOnotConnected, addr[i])
+
+        rtd = addr.index(tools._addresses[tools._sensors.index("rtd")]) if tools._rtd and tools._addresses[tools._sensors.index("rtd")] in addr else None
+        speculative = mode.lower() == "spec" and rt and not manual_temp_override and tools._last_temp is not None and rtd is not None
+
+        if rt and not manual_temp_override and rtd is not None and not speculative:
+            readings[rtd] = await self._measure_t()
+            override_temp = readings[rtd][0]
+
+        pending = [i for i in range(len(addr)) if readings[i] is None]
+        if mode.lower() == "seq":
+            for i in pending:
+                readings[i] = await self._query(addr[i], rt, override_temp)
+        else:
+            if speculative:
+                pending.remove(rtd)
+                results = await self._query_speculative(addr, [rtd] + pending, tools._last_temp)
+                pending = [rtd] + pending
+            else:
+                results = await asyncio.gather(*[self._query(addr[i], rt, override_temp) for i in pending])
+            for i, reading in zip(pending, results):
+                readings[i] = reading
+
+        if form.lower() != "float":
+            return tools._records(addr, readings, form.lower())
+        return [reading[0] for reading in readings]
+
+    async def read_all(self, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"):
+        return await self.read_multi(self._tools._addresses, mode, rt, manual_temp_override, override_temp, form)
+
+    async def set_t(self, temp=default_temp):
+        tools = self._tools
+        addresses = sorted(addr for addr in tools._addresses if tools._sensors[tools._addresses.index(addr)] not in tools._no_rt)
+        locks = []
+        try:
+            for addr in addresses:  # measurements in progress finished first, none started until the "T" commands are processed.
+                lock = self._module_lock(addr)
+                await lock.acquire()
+                locks.append(lock)
+            async with self._bus_lock:
+                for addr in addresses:
+                    tools._send(addr, "T," + str(temp))
+            await asyncio.sleep(tools._short_timeout)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    async def cmd(self, addr, cmd):
+        tools = self._tools
+        try:
+            addr = tools._check_addr(addr)
+            async with self._module_lock(addr):
+                async with self._bus_lock:
+                    tools._send(addr, str(cmd))
+                await asyncio.sleep(tools._long_timeout)
+        except Exception:
+            if tools.mode == "dev":
+                raise
+
+    async def close(self):
+        async with self._bus_lock:  # transaction in progress finished first.
+            self._tools.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark of atlas_hydro_tools.py library on the simulated EZO bus of atlas_hydro_sim.py.
+Compatibility: python2 and python3 (allocations peak measured with python3 only).
+
+Measures, for each operation and each mix of EZO modules, the wall-clock time of one cycle (median, min and max over the repeated cycles), the I2C transactions made per cycle (commands sent, responses read, probes; each one being at least one system call on a real bus), the sleeps per cycle (count and total slept time) and the memory allocated per cycle (peak of traced allocations and net number of allocated blocks). Simulated EZO modules have no noise and fixed processing times, so that results are reproducible and comparable between two versions of the library.
+
+Usage:
+    python atlas_hydro_bench.py [--ops OPS] [--mixes MIXES] [--rt {on,off,both}] [--poll] [--repeat N] [--json PATH] [--baseline PATH]
+
+            --ops: comma separated operations among "read", "seq", "sim", "read_all", "scan", "addr_reset" (all by default).
+                read: read() of the first module of the mix which is not RTD (RTD if alone).
+                seq, sim: read_multi() of all modules of the mix in "seq" or "sim" mode.
+                read_all: read_all() with default mode.
+                scan, addr_reset: scan() and addr_reset(), made once per mix whatever --rt. Before each addr_reset() cycle, the EZO modules are moved off their' factory default addresses (addr_change(), neither timed nor counted) so that every cycle moves all of them back.
+            --mixes: semicolon separated mixes of comma separated sensors (eg. "ph;rtd,ph,ec"). Default: 1 to 5 modules, with and without RTD (see _mixes).
+            --rt: temperature compensation of read operations: "on", "off" or "both" (default).
+            --poll: activates ready-polling of EZO modules (please refer to AtlasHydroTools constructor description).
+            --repeat: number of measured cycles per operation (3 by default).
+            --json: path of a JSON file where results are saved (to be used later as baseline).
+            --baseline: path of a JSON file of previous results. The relative difference of the median cycle time is printed for every operation measured in both.
+
+Example (baseline before an optimisation, then comparison):
+    python atlas_hydro_bench.py --json before.json
+    python atlas_hydro_bench.py --baseline before.json
+
+NB: raises BenchError if a benchmarked operation made no I2C transaction, as its' measure would be meaningless.
+
+'''
+
+import argparse
+import json
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # python2
+    tracemalloc = None
+
+from atlas_hydro_tools import AtlasHydroTools
+from atlas_hydro_sim import SimBus
+
+_ops = ["read", "seq", "sim", "read_all", "scan", "addr_reset"]  # benchmarked operations, in report order.
+_once = ["scan", "addr_reset"]  # operations not depending on temperature compensation.
+_offset = 80  # addresses of the EZO modules moved off their' factory default addresses (97-102) before an addr_reset() cycle: 17-22.
+_mixes = [("ph",), ("rtd", "ph"), ("ph", "ec", "do"), ("rtd", "ph", "ec"), ("ph", "ec", "do", "orp"), ("rtd", "ph", "ec", "do", "orp")]  # default mixes of EZO modules.
+
+
+class _SleepCounter(object):  # replaces time.sleep during the benchmark, counting sleeps and slept time.
+
+    def __init__(self):
+        self._sleep = time.sleep
+        self.count = 0
+        self.slept = 0.0
+
+    def __call__(self, seconds):
+        self.count += 1
+        self.slept += seconds
+        self._sleep(seconds)
+
+
+def _prepare(tools, op):  # untimed setup of a cycle.
+    if op == "addr_reset":
+        for addr in list(tools.addresses()):
+            tools.addr_change(addr, addr - _offset)
+
+
+def _cycle(tools, op, rt):
+    if op == "read":
+        sensors = tools.sensors()
+        sensor = sensors[1] if sensors[0] == "rtd" and len(sensors) > 1 else sensors[0]
+        tools.read(sensor, rt)
+    elif op in ["seq", "sim"]:
+        tools.read_multi(list(tools.addresses()), op, rt)
+    elif op == "read_all":
+        tools.read_all(rt=rt)
+    elif op == "scan":
+        tools.scan()
+    elif op == "addr_reset":
+        tools.addr_reset()
+
+
+def bench(op, mix, rt=True, poll=False, repeat=3):
+    sleeper = _SleepCounter()
+    time.sleep = sleeper
+    try:
+        return _bench(op, mix, rt, poll, repeat, sleeper)
+    finally:
+        time.sleep = sleeper._sleep
+
+
+def _bench(op, mix, rt, poll, repeat, sleeper):
+    bus = SimBus(sensors=mix)
+    tools = AtlasHydroTools(poll=poll, transport=bus)
+
+    times = []
+    transactions = dict((kind, 0) for kind in bus.transactions)
+    sleeps, slept = 0, 0.0
+    for n in range(repeat):
+        _prepare(tools, op)
+        start_transactions = dict(bus.transactions)
+        start_count, start_slept = sleeper.count, sleeper.slept
+        start = time.time()
+        _cycle(tools, op, rt)
+        times.append(time.time() - start)
+        for kind in transactions:
+            transactions[kind] += bus.transactions[kind] - start_transactions[kind]
+        sleeps += sleeper.count - start_count
+        slept += sleeper.slept - start_slept
+    if not any(transactions.values()):
+        raise BenchError
+    for kind in transactions:
+        transactions[kind] /= float(repeat)
+    sleeps /= float(repeat)
+    slept /= float(repeat)
+
+    # allocations, measured on one more cycle (tracing slows the cycle down)
+    alloc_peak = None
+    if tracemalloc is not None:
+        _prepare(tools, op)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        _cycle(tools, op, rt)
+        alloc_peak = (tracemalloc.get_traced_memory()[1] - base) / 1024.0
+        tracemalloc.stop()
+    blocks = None
+    if hasattr(sys, "getallocatedblocks"):
+        _prepare(tools, op)
+        before = sys.getallocatedblocks()
+        _cycle(tools, op, rt)
+        blocks = sys.getallocatedblocks() - before
+
+    times.sort()
+    return {"op": op, "mix": ",".join(mix), "rt": rt if op not in _once else None, "poll": poll,
+            "median": times[len(times) // 2], "min": times[0], "max": times[-1],
+            "transactions": transactions, "sleeps": sleeps, "slept": slept,
+            "alloc_peak_kib": alloc_peak, "alloc_blocks": blocks}
+
+
+def _key(result):
+    return result["op"], result["mix"], result["rt"], result["poll"]
+
+
+def _report(result, baseline=None):
+    tx = result["transactions"]
+    line = "%-10s %-18s %-4s %8.1f %8.1f %8.1f %6.1f %6.1f %6.1f %6.1f %8.1f" % (
+        result["op"], result["mix"], {True: "on", False: "off", None: "-"}[result["rt"]],
+        result["median"] * 1000, result["min"] * 1000, result["max"] * 1000,
+        tx["send"], tx["read"], tx["probe"], result["sleeps"], result["slept"] * 1000)
+    line += " %9s" % ("%.1f" % result["alloc_peak_kib"] if result["alloc_peak_kib"] is not None else "-")
+    line += " %7s" % (result["alloc_blocks"] if result["alloc_blocks"] is not None else "-")
+    if baseline is not None and _key(result) in baseline:
+        before = baseline[_key(result)]["median"]
+        line += " %+7.1f%%" % ((result["median"] - before) / before * 100 if before else 0.0)
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of atlas_hydro_tools.py on a simulated EZO bus.")
+    parser.add_argument("--ops", default=",".join(_ops))
+    parser.add_argument("--mixes", default=";".join(",".join(mix) for mix in _mixes))
+    parser.add_argument("--rt", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--poll", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args(argv)
+
+    ops = [op for op in args.ops.split(",") if op]
+    for op in ops:
+        if op not in _ops:
+            parser.error("unknown operation: " + op)
+    mixes = [tuple(mix.split(",")) for mix in args.mixes.split(";") if mix]
+    rts = {"on": [True], "off": [False], "both": [True, False]}[args.rt]
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = dict((_key(result), result) for result in json.load(file))
+
+    results = []
+    print("%-10s %-18s %-4s %8s %8s %8s %6s %6s %6s %6s %8s %9s %7s%s" % (
+        "op", "mix", "rt", "med ms", "min ms", "max ms", "send", "read", "probe", "sleeps", "slept ms", "alloc KiB", "blocks",
+        "  vs base" if baseline is not None else ""))
+    for op in ops:
+        for mix in mixes:
+            for rt in (rts[:1] if op in _once else rts):
+                result = bench(op, mix, rt, args.poll, args.repeat)
+                _report(result, baseline)
+                results.append(result)
+
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=1)
+
+
+class BenchError(Exception):
+    def __init__(self, msg="ERROR: benchmarked operation made no I2C transaction. Its' measure would be meaningless"):
+        super(BenchError, self).__init__(msg)
+
+
+if __name__ == '__main__':
+    main()
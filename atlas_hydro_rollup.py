@@ -0,0 +1,227 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Incremental rolling statistics of the readings of atlas_hydro_tools.py library.
+Compatibility: python2 and python3.
+
+HydroRollup keeps, for each sensor and each window length, the count, mean, standard deviation, minimum and maximum of the readings over:
+    - a sliding window: the last window seconds. The window is split in panes (window / panes seconds each) holding their own statistics, merged when queried. The window moves pane by pane.
+    - tumbling windows: consecutive windows aligned on multiples of window seconds since the epoch (eg. minutes, hours and days in UTC). The last completed window and the current (partial) one are kept.
+Adding a reading updates one pane and one tumbling window per window length (Welford's algorithm), in constant time. Memory only depends on the numbers of sensors, windows and panes, not on the number of readings, so that dashboards can query aggregates at any moment without scanning the history.
+
+Readings whose status is not STATUS_OK (error values, please refer to AtlasHydroTools._read() and Reading class descriptions) are not aggregated, they are counted as errors.
+
+Timestamps are seconds since the epoch. Readings given without timestamp (and readings of AtlasHydroTools sinks) are timestamped with the monotonic clock (_clock()) plus an offset measured when the HydroRollup object is constructed, so that they never go backward.
+
+Example:
+    rollup = HydroRollup(windows=(60, 3600, 86400))
+    tentacle = AtlasHydroTools()
+    tentacle.sink_add(rollup.sink)  # or rollup.add_all(tentacle.read_all(form="record"))
+    tentacle.read_all()
+    print(rollup.stats("ph", 3600))  # pH over the last hour
+    print(rollup.stats("ph", 86400, "tumbling"))  # pH of yesterday (UTC)
+
+LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
+
+    HydroRollup(windows=(60, 3600, 86400), panes=60): Constructor of the class.
+            windows: List of numbers argument, default value: (60, 3600, 86400). Window lengths in seconds (one minute, one hour and one day by default).
+            panes: Integer argument, default value: 60. Number of panes of the sliding windows. More panes make the sliding window move more smoothly, with more memory and slower queries.
+
+    add(sensor, value, timestamp=None, status=STATUS_OK): Adds value reading of sensor.
+            sensor: String argument, no default value. Sensor name (see AtlasHydroTools.sensors()) or any other key.
+            value: Float argument, no default value. Reading.
+            timestamp: Float argument, default value: None. Seconds since the epoch at which the reading was made, now if None. Readings older than the current tumbling window or than the sliding window are ignored.
+            status: Integer argument, default value: STATUS_OK. Status code of the reading (see Reading class in atlas_hydro_tools.py), counted as error if not STATUS_OK.
+
+    add_all(records): Adds the readings of records list (AtlasHydroTools.read_multi() "record" form, eg. AtlasHydroTools.read_all(form="record") result) with their' sensor name, status code and timestamp.
+
+    sink(sensor, addr, value, timestamp, status): Adds a reading of AtlasHydroTools (to be given to AtlasHydroTools.sink_add() function). timestamp is the _clock() time of the reading.
+
+    stats(sensor, window, kind="sliding", now=None): Returns the statistics of sensor readings over window as a dictionary {"count": readings, "errors": error values, "mean", "stddev" (sample standard deviation), "min", "max", "start", "end"}. mean, stddev, min and max are None without reading. start and end are the bounds (seconds since the epoch) of the aggregated period.
+            window: Number argument, no default value. One of the window lengths given to the constructor.
+            kind: String argument, default value: "sliding". "sliding": last window seconds (from the start of the oldest pane). "tumbling": last completed tumbling window. "current": current tumbling window, from its' start to now.
+            now: Float argument, default value: None. Time of the query in seconds since the epoch, now if None.
+        NB: raises RollupError if window or kind is unknown.
+
+    snapshot(now=None): Returns the statistics of all sensors, windows and kinds as a dictionary {sensor: {window: {kind: statistics}}}.
+
+    sensors(): Returns the list of sensors with statistics.
+
+    reset(sensor=None): Forgets the statistics of sensor (of all sensors if None).
+
+'''
+
+import math
+import threading
+import time
+
+from atlas_hydro_tools import STATUS_OK, _clock
+
+_kinds = ["sliding", "tumbling", "current"]
+
+
+class _Welford(object):  # count, mean, sum of squared deviations, min, max and errors of a set of readings.
+
+    __slots__ = ("index", "count", "mean", "m2", "min", "max", "errors")
+
+    def __init__(self, index=None):
+        self.index = index  # number of the pane or tumbling window.
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.errors = 0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):  # parallel algorithm of Chan et al.
+        if other.count:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.count = count
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.errors += other.errors
+
+    def result(self, start, end):
+        empty = self.count == 0
+        return {"count": self.count, "errors": self.errors,
+                "mean": None if empty else self.mean,
+                "stddev": None if empty else (math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0),
+                "min": self.min, "max": self.max, "start": start, "end": end}
+
+
+class _Window(object):  # sliding and tumbling statistics of one sensor over one window length.
+
+    def __init__(self, length, panes):
+        self.length = float(length)
+        self.pane = self.length / panes
+        self.panes = [_Welford() for n in range(panes)]  # ring of panes, pane number modulo panes.
+        self.current = _Welford()  # current tumbling window.
+        self.last = _Welford()  # last completed tumbling window.
+
+    def add(self, value, timestamp, error):
+        index = int(timestamp // self.pane)
+        pane = self.panes[index % len(self.panes)]
+        if pane.index != index:
+            if pane.index is not None and pane.index > index:  # older than the sliding window.
+                pane = None
+            else:
+                pane.__init__(index)
+        window = int(timestamp // self.length)
+        if self.current.index is None or window > self.current.index:
+            self.last = self.current if self.current.index == window - 1 else _Welford(window - 1)
+            self.current = _Welford(window)
+        tumbling = self.current if window == self.current.index else None  # None: older than the current tumbling window.
+        for stats in [pane, tumbling]:
+            if stats is not None:
+                if error:
+                    stats.errors += 1
+                else:
+                    stats.add(value)
+
+    def sliding(self, now):
+        index = int(now // self.pane)
+        merged = _Welford()
+        for pane in self.panes:
+            if pane.index is not None and index - len(self.panes) < pane.index <= index:
+                merged.merge(pane)
+        return merged.result((index - len(self.panes) + 1) * self.pane, now)
+
+    def tumbling(self, now, kind):
+        window = int(now // self.length)
+        if kind == "current":
+            stats = self.current if self.current.index == window else _Welford()
+            return stats.result(window * self.length, now)
+        if self.current.index == window - 1:  # current window completed since the last reading.
+            stats = self.current
+        elif self.last.index == window - 1:
+            stats = self.last
+        else:
+            stats = _Welford()
+        return stats.result((window - 1) * self.length, window * self.length)
+
+
+class HydroRollup(object):
+
+    # ========== CONSTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, windows=(60, 3600, 86400), panes=60):
+        self.windows = list(windows)
+        self.panes = panes
+        self._offset = time.time() - _clock()  # conversion of _clock() times to seconds since the epoch, fixed for this object.
+        self._lock = threading.Lock()
+        self._stats = {}  # {sensor: {window length: _Window}}
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _now(self, now):
+        return self._offset + _clock() if now is None else now
+
+    def _window(self, sensor, window):
+        try:
+            return self._stats[sensor][window]
+        except KeyError:
+            if window not in self.windows:
+                raise RollupError
+            return _Window(window, self.panes)  # sensor without reading.
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def add(self, sensor, value, timestamp=None, status=STATUS_OK):
+        timestamp = self._now(timestamp)
+        error = status != STATUS_OK
+        with self._lock:
+            windows = self._stats.get(sensor)
+            if windows is None:
+                windows = self._stats[sensor] = dict((window, _Window(window, self.panes)) for window in self.windows)
+            for window in windows.values():
+                window.add(value, timestamp, error)
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record.sensor, record.value, self._offset + record.timestamp, record.status)
+
+    def sink(self, sensor, addr, value, timestamp, status):
+        self.add(sensor, value, self._offset + timestamp, status)
+
+    def stats(self, sensor, window, kind="sliding", now=None):
+        if kind not in _kinds:
+            raise RollupError
+        now = self._now(now)
+        with self._lock:
+            window = self._window(sensor, window)
+            if kind == "sliding":
+                return window.sliding(now)
+            return window.tumbling(now, kind)
+
+    def snapshot(self, now=None):
+        now = self._now(now)
+        return dict((sensor, dict((window, dict((kind, self.stats(sensor, window, kind, now)) for kind in _kinds)) for window in self.windows)) for sensor in self.sensors())
+
+    def sensors(self):
+        return sorted(self._stats)
+
+    def reset(self, sensor=None):
+        with self._lock:
+            if sensor is None:
+                self._stats = {}
+            else:
+                self._stats.pop(sensor, None)
+
+
+class RollupError(Exception):
+    def __init__(self, msg="ERROR: incorrect stats() argument. window should be one of the window lengths given to the constructor and kind one of \"sliding\", \"tumbling\" or \"current\""):
+        super(RollupError, self).__init__(msg)
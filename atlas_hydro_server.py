@@ -0,0 +1,362 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Unix domain socket read service for atlas_hydro_tools.py library.
+Compatibility: python2 and python3.
+
+HydroServer owns the bus through one AtlasHydroTools object and serves read requests of local clients over a Unix domain socket. Requests are coalesced: all requests received while the EZO modules are being queried are served together by the next physical query, in which every requested EZO module is queried only once (all at once, see AtlasHydroTools._query_multi()), whatever the number of requests asking for it. A request for EZO modules all being queried right now joins this query instead of waiting for the next one. The bus load then depends on the number of EZO modules, not on the number of clients.
+
+Protocol: one JSON object per line in both directions, any number of requests per connection (answered in order).
+    Requests: {"op": "read", "addr": addr, "rt": true, "temp": null}, {"op": "read_multi", "addr": [addr, ...], "rt": true, "temp": null}, {"op": "read_all", "rt": true, "temp": null}, {"op": "modules"} or {"op": "stats"}. "rt" and "temp" are optional. "temp" is the temperature compensation value, the last temperature measured by the RTD EZO module (or default_temp if never measured) if null. An optional "id" is sent back in the response.
+    Responses: {"ok": true, "result": reading(s), "wait": seconds, "service": seconds, "batch": requests} or {"ok": false, "error": exception name, "message": exception message}. "wait" is the time the request waited for its' query to start, "service" the time from then (or from its' arrival if it joined a running query) to its' readings, "batch" the number of requests served by the same physical query.
+    "modules" returns {"addresses": [...], "sensors": [...]}, "stats" returns the counters of the server: {"requests", "queries" (physical queries), "modules" (EZO modules queried), "joined" (requests that joined a running query)}.
+
+Example:
+    python atlas_hydro_server.py /tmp/atlas_hydro.sock  # server
+
+    print(request("read", addr="ph"))  # client
+    print(request("read_all")["result"])
+
+LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
+
+    # ========== SERVER CLASS ==========#
+
+    HydroServer(path=None, silent=True, keep_awake=True, poll=True, cache=None, bus=1, transport="smbus"): Constructs the AtlasHydroTools object owning the bus and binds the socket.
+            path: String argument, default value: None. Path of the socket. "/tmp/atlas_hydro_bus{bus}.sock" if None. A stale socket left at this path (no server accepting connections) is removed.
+            silent, keep_awake, poll, cache, bus, transport: see respective descriptions in AtlasHydroTools constructor. Ready-polling is activated by default.
+        NB.1: the AtlasHydroTools object is constructed in operation mode: errors are answered as error values (see AtlasHydroTools._read() description), except addresses of wrong type or range which are answered as errors. An exception raised while querying a group of EZO modules is only answered to the requests asking for them.
+        NB.2: raises ServerError, before the bus is opened, if another server accepts connections on path.
+        NB.3: the connected EZO modules are the ones detected by the constructor. Client threads only resolve addresses against this list, the AtlasHydroTools object is only used by the query thread.
+
+    serve_forever(): Serves requests until close() is called. Blocking.
+
+    start(): Runs serve_forever() function in a background thread. Returns immediately.
+
+    close(): Stops serving, removes the socket and releases the bus. Requests waiting for a query are answered with ServerError. Called by the destructor.
+
+    tools(): Returns the AtlasHydroTools object owning the bus.
+
+    _address(addr): Returns the integer address of addr EZO module (see description in AtlasHydroTools._check_addr() function), None if not connected. Raises AddrTypeError or AddrRangeError.
+
+    _keys(addr, rt, temp): Returns the query keys (address, rt, temp) of addr list of EZO modules (error value for not connected ones).
+
+    _submit(keys): Adds keys to the running query if it already queries them all, to the next query otherwise, and waits for their readings. Returns readings and the timing fields of the response. Raises ServerError if the server is closed.
+
+    _work(): Background thread making the physical queries, one after the other. When the server is closed, the running query is completed and the requests waiting for the next one fail with ServerError.
+
+    _handle(line): Answers one request line. Returns the response as a dictionary.
+
+    # ========== CLIENT FUNCTION ==========#
+
+    request(op, path=None, bus=1, **args): Sends one request to a HydroServer and returns its' response as a dictionary.
+            op: String argument, no default value. One of ["read", "read_multi", "read_all", "modules", "stats"].
+            path, bus: see respective descriptions in HydroServer constructor.
+            args: request fields (addr, rt, temp, id).
+
+'''
+
+import os
+import sys
+import json
+import socket
+import threading
+
+try:
+    import socketserver
+except ImportError:  # python2
+    import SocketServer as socketserver
+
+from atlas_hydro_tools import AtlasHydroTools, AddrTypeError, AddrRangeError, STATUS_OK, _clock
+
+_sensors = ["rtd", "ph", "ec", "do", "orp"]  # EZO modules types.
+_closed_msg = "ERROR: HydroServer closed before the request was served"
+
+
+def _default_path(bus):
+    return "/tmp/atlas_hydro_bus" + str(bus) + ".sock"
+
+
+class _Batch(object):  # requests served by one physical query of their EZO modules.
+
+    def __init__(self):
+        self.keys = set()  # (address, rt, temp) of the EZO modules to be queried.
+        self.requests = 0
+        self.results = {}  # {key: reading}
+        self.errors = {}  # {key: exception raised by the query of its' group}
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+
+class _Handler(socketserver.StreamRequestHandler):  # one per client connection, in its' own thread.
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            if line.strip():
+                self.wfile.write((json.dumps(self.server.hydro._handle(line)) + "\n").encode("utf-8"))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+
+class HydroServer(object):
+
+    # ========== CONSTRUCTOR/DESTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, path=None, silent=True, keep_awake=True, poll=True, cache=None, bus=1, transport="smbus"):
+        self._path = path if path is not None else _default_path(bus)
+        self.silent = silent
+        self._closed = True  # nothing to close if the constructor fails.
+        if os.path.exists(self._path):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                client.connect(self._path)
+                live = True
+            except (IOError, OSError):  # stale socket of a dead server.
+                live = False
+            finally:
+                client.close()
+            if live:
+                raise ServerError
+            os.unlink(self._path)
+
+        self._tools = AtlasHydroTools("op", silent, keep_awake, poll, cache, True, bus, transport)
+        self._modules = dict(zip(self._tools.addresses(), self._tools.sensors()))  # {address: sensor} of connected EZO modules, read by client threads.
+        self._no_rt = list(self._tools._no_rt)
+
+        self._lock = threading.Condition()  # protects _next, _current, _temp and _counters.
+        self._next = _Batch()  # requests waiting for the next physical query.
+        self._current = None  # batch being queried.
+        self._temp = None  # last valid temperature measured by the RTD EZO module.
+        self._counters = {"requests": 0, "queries": 0, "modules": 0, "joined": 0}
+        self._closed = False
+
+        self._worker = threading.Thread(target=self._work, name="HydroServer bus")
+        self._worker.daemon = True
+        self._worker.start()
+
+        self._server = _UnixServer(self._path, _Handler)
+        self._server.hydro = self
+        self._serving = False
+
+        if not silent:
+            print("Serving", self._tools.sensors(), "readings on", self._path)
+
+    def __del__(self):
+        self.close()
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _address(self, addr):
+        if type(addr).__name__ == "unicode":  # python2 JSON strings.
+            addr = str(addr)
+        if isinstance(addr, bool):
+            raise AddrTypeError
+        elif isinstance(addr, int):
+            if addr not in range(1, 128):
+                raise AddrRangeError
+            return addr if addr in self._modules else None
+        elif isinstance(addr, str):
+            if addr not in _sensors:
+                raise AddrRangeError
+            for address, sensor in self._modules.items():
+                if sensor == addr:
+                    return address
+            return None
+        raise AddrTypeError
+
+    def _keys(self, addr, rt, temp):
+        if temp is None:
+            with self._lock:
+                temp = self._temp if self._temp is not None else AtlasHydroTools.default_temp
+        keys = []
+        for address in addr:
+            address = self._address(address)
+            if address is None:
+                keys.append(-100.0)  # error value of a not connected EZO module, no query.
+            elif rt and self._modules[address] not in self._no_rt:
+                keys.append((address, True, float(temp)))
+            else:
+                keys.append((address, False, None))
+        return keys
+
+    def _submit(self, keys):
+        arrival = _clock()
+        wanted = set(key for key in keys if isinstance(key, tuple))
+        with self._lock:
+            if self._closed:
+                raise ServerError(_closed_msg)
+            self._counters["requests"] += 1
+            if self._current is not None and wanted <= self._current.keys:  # EZO modules being queried right now, joining the running query.
+                batch = self._current
+                self._counters["joined"] += 1
+            else:
+                batch = self._next
+                batch.keys.update(wanted)
+                self._lock.notify()
+            batch.requests += 1
+        if wanted:
+            batch.done.wait()
+            for key in wanted:
+                if key in batch.errors:
+                    raise batch.errors[key]
+            started = max(batch.started, arrival)
+            timing = {"wait": started - arrival, "service": batch.finished - started, "batch": batch.requests}
+        else:
+            timing = {"wait": 0.0, "service": 0.0, "batch": 1}
+        readings = [batch.results[key] if isinstance(key, tuple) else key for key in keys]
+        return readings, timing
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._next.keys and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    batch, self._next = self._next, _Batch()
+                    break
+                batch = self._current = self._next
+                self._next = _Batch()
+
+            batch.started = _clock()
+            tools = self._tools
+            groups = {}  # {(rt, temp): addresses}, EZO modules queried all at once with the same compensation.
+            free = []  # EZO modules without temperature compensation, queried with any group.
+            for address, rt, temp in batch.keys:
+                if not rt and self._modules[address] in self._no_rt:
+                    free.append(address)
+                else:
+                    groups.setdefault((rt, temp), []).append(address)
+            if free:
+                groups.setdefault(next(iter(groups)) if groups else (False, None), []).extend(free)
+            for (rt, temp), addr in groups.items():
+                keys = [(address, False, None) if address in free else (address, rt, temp) for address in addr]
+                try:
+                    readings = tools._query_multi(addr, rt, temp if temp is not None else tools.default_temp)
+                except Exception as error:  # only the requests asking for this group fail.
+                    for key in keys:
+                        batch.errors[key] = error
+                    continue
+                for key, reading in zip(keys, readings):  # measurement tuples (see AtlasHydroTools._read()).
+                    batch.results[key] = reading[0]
+                    if self._modules[key[0]] == "rtd" and reading[1] == STATUS_OK and tools.minH2Otemp < reading[0] < tools.maxH2Otemp:
+                        with self._lock:
+                            self._temp = reading[0]
+
+            with self._lock:
+                self._current = None
+                self._counters["queries"] += 1
+                self._counters["modules"] += len(batch.keys)
+            batch.finished = _clock()
+            batch.done.set()
+
+        for key in batch.keys:  # requests queued for a query which will never be made.
+            batch.errors[key] = ServerError(_closed_msg)
+        batch.done.set()
+
+    def _order(self, addr):  # order of EZO modules in the responses, the one of AtlasHydroTools.addresses().
+        return _sensors.index(self._modules[addr])
+
+    def _handle(self, line):
+        response = {}
+        try:
+            req = json.loads(line.decode("utf-8") if isinstance(line, bytes) else line)
+            if "id" in req:
+                response["id"] = req["id"]
+            op = req.get("op")
+            rt = req.get("rt", True)
+            temp = req.get("temp")
+            if op == "read":
+                readings, timing = self._submit(self._keys([req["addr"]], rt, temp))
+                response.update(timing, result=readings[0])
+            elif op == "read_multi":
+                readings, timing = self._submit(self._keys(req["addr"], rt, temp))
+                response.update(timing, result=readings)
+            elif op == "read_all":
+                readings, timing = self._submit(self._keys(sorted(self._modules, key=self._order), rt, temp))
+                response.update(timing, result=readings)
+            elif op == "modules":
+                addresses = sorted(self._modules, key=self._order)
+                response["result"] = {"addresses": addresses, "sensors": [self._modules[address] for address in addresses]}
+            elif op == "stats":
+                with self._lock:
+                    response["result"] = dict(self._counters)
+            else:
+                raise ValueError("unknown op: " + str(op))
+            response["ok"] = True
+        except Exception as error:
+            response.update(ok=False, error=type(error).__name__, message=str(error))
+        return response
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def serve_forever(self):
+        self._serving = True
+        try:
+            self._server.serve_forever()
+        finally:
+            self._serving = False
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="HydroServer")
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        if getattr(self, "_closed", True):
+            return
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        if self._serving:
+            self._server.shutdown()
+        self._server.server_close()
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._worker.join()
+        self._tools.close()  # releases the bus at once, whatever the references left to the object.
+        self._tools = None
+
+    def tools(self):
+        return self._tools
+
+
+def request(op, path=None, bus=1, **args):
+    args["op"] = op
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path if path is not None else _default_path(bus))
+        client.sendall((json.dumps(args) + "\n").encode("utf-8"))
+        response = b""
+        while not response.endswith(b"\n"):
+            data = client.recv(4096)
+            if not data:
+                break
+            response += data
+    finally:
+        client.close()
+    return json.loads(response.decode("utf-8"))
+
+
+# ========== LIBRARY RELATED EXCEPTIONS ==========#
+
+class ServerError(Exception):
+    def __init__(self, msg="ERROR: another HydroServer is serving on this socket path"):
+        super(ServerError, self).__init__(msg)
+
+
+if __name__ == '__main__':
+    server = HydroServer(sys.argv[1] if len(sys.argv) > 1 else None, silent=False)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
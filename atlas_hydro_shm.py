@@ -0,0 +1,332 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Shared-memory readings broker for atlas_hydro_tools.py library.
+Compatibility: python2 and python3.
+
+When several processes need the measurements of the same EZO modules (control loop, logger, dashboard, etc...), each of them constructing its' own AtlasHydroTools object makes them all scan and query the same I2C bus: transactions of different processes get interleaved (the slave address selection and the command writing are not atomic across processes) and responses are corrupted. With this module only one process, the broker, owns the bus. It measures the EZO modules on a fixed schedule (see AtlasHydroTools.stream()) and publishes the latest timestamped reading of each sensor in a shared-memory segment (memory mapped file). Any number of client processes read them from memory, in microseconds and without any I2C transaction, through the same read_* functions as AtlasHydroTools.
+
+Segment layout (little endian):
+    header: magic b"AHT1" (4 bytes), layout version (uint32), number of slots (uint32), broker pid (uint32), broker cycle period in seconds (float64), broker state (uint32: 0 publishing, 1 stopped, 2 failed).
+    one slot per sensor type, in ["rtd", "ph", "ec", "do", "orp"] order: sequence number (uint32), I2C address (int32, 0 if no such EZO module is published), status code of the reading (uint32, see Reading class in atlas_hydro_tools.py), reading (float64), time.time() timestamp of the measurement cycle (float64).
+Each slot is a seqlock: the broker makes the sequence number odd before writing the slot and even again once written, a client reads the slot again if the sequence number was odd or changed while reading. Readers never block the broker and never take any lock. A client retries for at most _slot_timeout seconds (spinning first, then sleeping with an exponential backoff), after which the slot is considered corrupted (broker killed while writing it) and read as EZOError.
+
+Example:
+    # broker process (only one per bus)
+    broker = HydroBroker(rate=1.0)
+    broker.run()
+
+    # client processes
+    tentacle = HydroClient()
+    print(tentacle.read_ph(), tentacle.age("ph"))
+
+LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
+
+    # ========== BROKER CLASS ==========#
+
+    HydroBroker(path=None, rate=1.0, sensors=None, rt=True, silent=True, keep_awake=True, poll=True, cache=None, bus=1, transport="smbus"): Constructs the AtlasHydroTools object owning the bus and creates the shared-memory segment.
+            path: String argument, default value: None. Path of the segment file. "/dev/shm/atlas_hydro_bus{bus}" if None.
+            rate, sensors, rt: see respective descriptions in AtlasHydroTools.stream() function.
+            silent, keep_awake, poll, cache, bus, transport: see respective descriptions in AtlasHydroTools constructor. Ready-polling is activated by default.
+        NB.1: the AtlasHydroTools object is constructed in operation mode, so that the published readings are the error values of AtlasHydroTools in case of errors.
+        NB.2: raises BrokerError if another broker already owns the segment (exclusive lock on the segment file). If the AtlasHydroTools constructor raises an exception, the segment and its' lock are released before it is raised.
+
+    run(cycles=None): Measures and publishes readings until stop() is called or cycles cycles were made (never stops if None). Blocking.
+        NB: if the measurement raises an exception, the broker state is set to failed and -1000.0 (EZOError) is published for every sensor before the exception is raised, so that clients don't keep returning the last readings until they get too old.
+        NB.2: readings are published with their' status code, so that clients tell error values from identical valid readings (eg. a -100.0 mV ORP reading).
+
+    start(): Runs run() function in a background thread. Returns immediately.
+
+    stop(): Stops the publishing after the current cycle and waits for the background thread if any.
+
+    close(): Stops the publishing, releases the segment (kept on disk for the clients, which then see readings getting older) and the bus. Called by the destructor.
+
+    tools(): Returns the AtlasHydroTools object owning the bus.
+
+    # ========== CLIENT CLASS ==========#
+
+    HydroClient(path=None, mode="op", max_age=None, bus=1): Opens the shared-memory segment of a broker.
+            path: String argument, default value: None. See description in HydroBroker constructor.
+            mode: Not case sensitive string argument, default value: "op". See description in AtlasHydroTools constructor. In development mode EZOnotConnected, EZOnotReady or EZOError is raised instead of returning -100.0, -200.0 or -1000.0.
+            max_age: Float argument, default value: None. Maximum age in seconds of a reading. Older readings (eg. broker stopped) are returned as -200.0 (EZOnotReady). Three broker cycle periods if None.
+            bus: Integer argument, default value: 1. Bus number used in the default path.
+        NB: raises BrokerError if the segment doesn't exist or is not a broker segment.
+
+    read(addr, rt=True, temp=default_temp), read_t(), read_ph(rt=False, temp=default_temp), read_ec(rt=False, temp=default_temp), read_do(rt=False, temp=default_temp), read_orp(), read_all(mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp): Latest published readings, same arguments and error values as the AtlasHydroTools functions with the same names.
+        NB: temperature compensation and read mode arguments are only kept for compatibility and are ignored: they are decided by the broker. Errors are decided by the published status code, not by the reading value.
+
+    age(addr): Returns the age in seconds of the latest published reading of addr EZO module (None if not published).
+            addr: see description in AtlasHydroTools._check_addr() function.
+
+    state(): Returns the state of the broker: "publishing", "stopped" (not started yet, or stopped) or "failed" (see HydroBroker.run() function). Readings of a failed broker are returned as -1000.0 (EZOError).
+
+    addresses(), sensors(): Lists of published EZO modules addresses' and names', in ["rtd", "ph", "ec", "do", "orp"] order.
+
+    close(): Closes the segment.
+
+'''
+
+import os
+import mmap
+import time
+import fcntl
+import struct
+import threading
+
+from atlas_hydro_tools import AtlasHydroTools, EZOnotConnected, EZOnotReady, EZOError, STATUS_OK, STATUS_NOT_CONNECTED, STATUS_NOT_READY, STATUS_ERROR
+
+_magic = b"AHT1"  # segment files start with this magic.
+_version = 3  # layout version.
+_header = struct.Struct("<4sIIIdI")  # magic, layout version, number of slots, broker pid, broker cycle period, broker state.
+_state = struct.Struct("<I")  # broker state, last field of the header.
+_states = ["publishing", "stopped", "failed"]  # broker states, by value.
+_seq = struct.Struct("<I")  # sequence number of a slot.
+_slot = struct.Struct("<IiIdd")  # sequence number, address, status code, reading, timestamp.
+_payload = struct.Struct("<iIdd")  # slot without its' sequence number.
+_errors = {STATUS_NOT_CONNECTED: EZOnotConnected, STATUS_NOT_READY: EZOnotReady}  # exceptions of the status codes, EZOError for the others.
+_sensors = ["rtd", "ph", "ec", "do", "orp"]  # one slot per sensor type, in this order.
+_size = _header.size + _slot.size * len(_sensors)
+_slot_timeout = .05  # maximum time (in seconds) spent reading a slot being written (0.05 sec (50ms) by default).
+_slot_spins = 100  # slot reads retried at once before sleeping (100 by default).
+
+
+def _default_path(bus):
+    return "/dev/shm/atlas_hydro_bus" + str(bus)
+
+
+class HydroBroker(object):
+
+    # ========== CONSTRUCTOR/DESTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, path=None, rate=1.0, sensors=None, rt=True, silent=True, keep_awake=True, poll=True, cache=None, bus=1, transport="smbus"):
+        self._path = path if path is not None else _default_path(bus)
+        self._rate = rate
+        self._rt = rt
+        self._sensors = sensors
+        self.silent = silent
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(self._fd)
+            self._fd = None
+            raise BrokerError
+        self._mm = None
+        self._tools = None
+        try:
+            os.ftruncate(self._fd, _size)
+            self._mm = mmap.mmap(self._fd, _size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            self._mm[:] = b"\00" * _size
+            self._seqs = [0] * len(_sensors)  # sequence numbers of the slots, only written by this object.
+            _header.pack_into(self._mm, 0, _magic, _version, len(_sensors), os.getpid(), 1.0 / rate, _states.index("stopped"))
+
+            self._tools = AtlasHydroTools("op", silent, keep_awake, poll, cache, True, bus, transport)
+            for addr in self._tools.addresses():  # connected EZO modules are published right away, not ready until first measured.
+                self._publish(addr, -200.0, STATUS_NOT_READY, 0.0)
+        except Exception:
+            self._release()
+            raise
+
+        if not silent:
+            print("Broker publishing", self._tools.sensors(), "readings to", self._path)
+
+    def __del__(self):
+        self.close()
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _publish(self, addr, reading, status, timestamp):  # writes reading of EZO module with addr address and its' status code in its' sensor slot (seqlock).
+        i = _sensors.index(self._tools.sensors()[self._tools.addresses().index(addr)])
+        offset = _header.size + i * _slot.size
+        self._seqs[i] += 1
+        _seq.pack_into(self._mm, offset, self._seqs[i] & 0xffffffff)  # odd: slot being written.
+        _payload.pack_into(self._mm, offset + _seq.size, addr, status, reading, timestamp)
+        self._seqs[i] += 1
+        _seq.pack_into(self._mm, offset, self._seqs[i] & 0xffffffff)  # even: slot consistent.
+
+    def _set_state(self, state):
+        _state.pack_into(self._mm, _header.size - _state.size, _states.index(state))
+
+    def _release(self):  # releases the segment and its' lock, then the bus.
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        os.close(self._fd)  # releases the lock.
+        self._fd = None
+        if self._tools is not None:
+            self._tools.close()  # releases the bus at once, whatever the references left to the object.
+            self._tools = None
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def run(self, cycles=None):
+        self._stop.clear()
+        self._set_state("publishing")
+        try:
+            records = self._tools.stream(self._rate, self._sensors, self._rt, cycles, 1)
+            try:
+                for record in records:
+                    for addr, reading, status in zip(record["addresses"], record["readings"], record["statuses"]):
+                        self._publish(addr, reading, status, record["timestamp"])
+                    if self._stop.is_set():
+                        break
+            finally:
+                records.close()
+        except Exception:
+            self._set_state("failed")
+            for addr in self._tools.addresses():
+                self._publish(addr, -1000.0, STATUS_ERROR, time.time())
+            raise
+        self._set_state("stopped")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="HydroBroker")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        if getattr(self, "_fd", None) is None:
+            return
+        self.stop()
+        self._release()
+
+    def tools(self):
+        return self._tools
+
+
+class HydroClient(object):
+
+    default_temp = AtlasHydroTools.default_temp
+
+    # ========== CONSTRUCTOR/DESTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, path=None, mode="op", max_age=None, bus=1):
+        self._path = path if path is not None else _default_path(bus)
+        self.mode = "dev" if mode == "dev" else "op"
+        try:
+            with open(self._path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), _size, mmap.MAP_SHARED, mmap.PROT_READ)
+        except (IOError, OSError, ValueError):
+            raise BrokerError("ERROR: no broker segment at " + self._path + ". Please start a HydroBroker first")
+        magic, version, slots, pid, period, state = _header.unpack_from(self._mm, 0)
+        if magic != _magic or version != _version or slots != len(_sensors):
+            self._mm.close()
+            raise BrokerError("ERROR: " + self._path + " is not a broker segment")
+        self.max_age = max_age if max_age is not None else 3 * period
+
+    def __del__(self):
+        if getattr(self, "_mm", None) is not None:
+            self.close()
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _slot(self, i):  # returns (address, status code, reading, timestamp) of slot i, read consistently (seqlock), None if the slot stays inconsistent.
+        offset = _header.size + i * _slot.size
+        deadline = time.time() + _slot_timeout
+        backoff = .00001
+        attempts = 0
+        while True:
+            seq = _seq.unpack_from(self._mm, offset)[0]
+            if not seq & 1:  # odd: broker writing the slot.
+                slot = _payload.unpack_from(self._mm, offset + _seq.size)
+                if _seq.unpack_from(self._mm, offset)[0] == seq:
+                    return slot
+            attempts += 1
+            if attempts > _slot_spins:
+                if time.time() > deadline:
+                    return None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, .001)
+
+    def _find(self, addr):  # returns slot index of addr EZO module, None if not published.
+        if isinstance(addr, str):
+            if addr.lower() in _sensors:
+                i = _sensors.index(addr.lower())
+                slot = self._slot(i)
+                if slot is None or slot[0] != 0:  # inconsistent slot found, read as EZOError.
+                    return i
+            return None
+        for i in range(len(_sensors)):
+            slot = self._slot(i)
+            if slot is not None and slot[0] == addr and addr != 0:
+                return i
+        return None
+
+    def _error(self, error, value):
+        if self.mode == "dev":
+            raise error
+        return value
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def read(self, addr, rt=True, temp=default_temp):
+        i = self._find(addr)
+        if i is None:
+            return self._error(EZOnotConnected, -100.0)
+        slot = self._slot(i)
+        if slot is None or self.state() == "failed":
+            return self._error(EZOError, -1000.0)
+        address, status, reading, timestamp = slot
+        if timestamp == 0.0 or time.time() - timestamp > self.max_age:
+            return self._error(EZOnotReady, -200.0)
+        if status != STATUS_OK:
+            return self._error(_errors.get(status, EZOError), reading)
+        return reading
+
+    def read_t(self):
+        if self._find("rtd") is None:
+            return -100.0
+        return self.read("rtd")
+
+    def read_ph(self, rt=False, temp=default_temp):
+        return self.read("ph")
+
+    def read_ec(self, rt=False, temp=default_temp):
+        return self.read("ec")
+
+    def read_do(self, rt=False, temp=default_temp):
+        return self.read("do")
+
+    def read_orp(self):
+        return self.read("orp")
+
+    def read_all(self, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp):
+        return [self.read(sensor) for sensor in self.sensors()]
+
+    def age(self, addr):
+        i = self._find(addr)
+        slot = self._slot(i) if i is not None else None
+        if slot is None:
+            return None
+        return time.time() - slot[3]
+
+    def addresses(self):
+        return [slot[0] for slot in [self._slot(i) for i in range(len(_sensors))] if slot is not None and slot[0] != 0]
+
+    def sensors(self):
+        return [_sensors[i] for i in range(len(_sensors)) if (self._slot(i) or (0,))[0] != 0]
+
+    def state(self):
+        state = _state.unpack_from(self._mm, _header.size - _state.size)[0]
+        return _states[state] if state < len(_states) else "failed"
+
+    def close(self):
+        self._mm.close()
+        self._mm = None
+
+
+# ========== LIBRARY RELATED EXCEPTIONS ==========#
+
+class BrokerError(Exception):
+    def __init__(self, msg="ERROR: the bus is already owned by another HydroBroker (segment file locked)"):
+        super(BrokerError, self).__init__(msg)
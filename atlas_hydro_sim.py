@@ -0,0 +1,351 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Simulated EZO modules bus for atlas_hydro_tools.py library.
+Compatibility: python2 and python3.
+
+SimBus is an in-process I2C bus (MemoryTransport) on which simulated RTD, pH, EC, DO and ORP EZO modules (SimEZO) answer the commands sent by AtlasHydroTools as the real ones do: processing delay per command, status byte of the response (1 = done, 2 = syntax error, 254 = still processing, 255 = no data), sleep mode, LED and I2C address change. Faults (not answering module, syntax errors, slow or corrupted responses) can be injected to check the errors management. The library can then be used, measured and regression-tested on any computer, without Raspberry Pi, Tentacle hat or EZO module.
+
+Delays are real (the simulated module is ready processing_time after the command was sent, measured with the same clock as AtlasHydroTools), so that timings measured on the simulated bus are the ones of the library.
+
+Example:
+    bus = SimBus(sensors=("rtd", "ph", "ec"))
+    tentacle = AtlasHydroTools(transport=bus)
+    print(tentacle.read_all("sim"))
+    bus.module("ph").inject("nack")
+    print(tentacle.read_ph())  # -1000.0 (EZOError) in operation mode
+
+LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
+
+    # ========== SIMULATED EZO MODULE CLASS ==========#
+
+    SimEZO(sensor, value=None, version="2.10", address=None, noise=0.0, seed=None): Simulated EZO module.
+            sensor: Non case sensitive string argument, no default value. Type of the EZO module among ["rtd", "ph", "ec", "do", "orp"].
+            value: Float or function argument, default value: None. Measured value returned by "R" and "RT" commands. If a function (without argument) is given, it is called at every measurement (drifts, steps, etc...). None: typical value of the sensor type (see _values).
+            version: String argument, default value: "2.10". Firmware version returned by "I" command.
+            address: Integer argument, default value: None. I2C address of the module. None: factory default address of the sensor type.
+            noise: Float argument, default value: 0.0. Standard deviation of a gaussian noise added to the measured value.
+            seed: Integer argument, default value: None. Seed of the noise random generator (for reproducible measurements).
+
+    command(cmd): Receives cmd command (String argument, terminating null character allowed) sent to the module. Supported commands (non case sensitive): "R", "RT,temp" (pH, EC, DO), "T,temp" and "T,?" (pH, EC, DO), "I", "Sleep", "L,0", "L,1", "L,?", "C,n" (n in 0-99), "C,?", "O,param,0", "O,param,1" and "O,?" (EC, DO) and "I2C,addr". Any other command is answered with status 2 (syntax error).
+        NB.1: a sleeping module is woken up by any command, which is not processed (status 255 until the next command).
+        NB.2: "I2C,addr" reboots the module at its' new address, it doesn't answer on any address for reboot_time.
+        NB.3: in continuous mode ("C,n"), the module makes a reading every n seconds, the first one "R" processing time after the command. Its' response is the latest reading unless a command was sent since, until the next reading. "Sleep" and "I2C,addr" leave continuous mode. Set continuous_support to False to simulate a module answering "C" commands with status 2.
+        NB.4: EC and DO modules answer readings with their enabled output parameters (outputs attribute, in the order of _parameters), comma separated. Only the first one ("EC" or "mg") is enabled at construction (real EC modules output all four by factory default). TDS, salinity, specific gravity and % saturation are derived from the measured value.
+
+    response(length=16): Returns the response of the module to the last command as a list of length integers: status byte then ASCII characters of the response padded with null characters.
+
+    inject(fault, count=1): Injects a fault in the next count commands. count=-1: permanent fault (until clear() is called).
+            fault: String argument, no default value. One of:
+                "nack": the module doesn't answer (IOError raised by the bus, as for a not connected module).
+                "syntax": the command is answered with status 2.
+                "slow": the command takes slow_factor times its' processing time.
+                "garbage": the response is not a number (status 1).
+
+    clear(): Removes all injected faults.
+
+    processing_time(cmd): Returns processing time (in seconds) of cmd command name ("R", "RT", "I", etc...).
+
+    # ========== SIMULATED BUS CLASS ==========#
+
+    SimBus(bus=1, sensors=("rtd", "ph", "ec")): Simulated I2C bus, to be given to AtlasHydroTools constructor as transport argument.
+            bus: Integer argument, default value: 1. Not used, kept for compatibility with other transports.
+            sensors: List of strings argument, default value: ("rtd", "ph", "ec"). Types of the simulated EZO modules created on their factory default addresses (setup of an Atlas Scientific Tentacle T3 hat with RTD, pH and EC EZO modules by default).
+
+    add(module): Adds SimEZO module to the bus at its' address. Returns the module.
+        NB: as on a real bus, a module added (or moved with "I2C,addr" command) to an address already taken doesn't replace the module there: both modules receive the commands sent to the address and their responses are mixed (bytes ANDed, as on the open drain I2C bus), which corrupts the readings. See collisions() function.
+
+    modules(): Returns the list of SimEZO modules on the bus.
+
+    module(addr): Returns the SimEZO module with addr address (integer) or of addr sensor type (string among ["rtd", "ph", "ec", "do", "orp"]). Raises KeyError if none.
+
+    collisions(): Returns the sorted list of addresses shared by several modules.
+
+    transactions: Dictionary attribute. Number of I2C transactions made on the bus since its' construction: {"send": commands, "read": responses reads, "probe": probes}.
+
+    send(addr, cmd), read(addr, length=16), probe(addr), close(): Transport functions. Please refer to I2C TRANSPORT CLASSES description in atlas_hydro_tools.py header.
+
+'''
+
+import errno
+import random
+
+from atlas_hydro_tools import AtlasHydroTools, MemoryTransport, _clock
+
+
+class SimEZO(object):
+
+    # factory default addresses of the EZO modules.
+    _addresses = {"rtd": AtlasHydroTools._def_rtd_add, "ph": AtlasHydroTools._def_ph_add, "ec": AtlasHydroTools._def_ec_add,
+                  "do": AtlasHydroTools._def_do_add, "orp": AtlasHydroTools._def_orp_add}
+    _names = {"rtd": "RTD", "ph": "pH", "ec": "EC", "do": "DO", "orp": "ORP"}  # names returned by "I" command.
+    _values = {"rtd": 21.5, "ph": 7.0, "ec": 1413.0, "do": 8.26, "orp": 225.0}  # typical measured values.
+    _decimals = {"rtd": 3, "ph": 3, "ec": 2, "do": 2, "orp": 1}  # decimals of the measured values.
+    _no_rt = ["rtd", "orp"]  # EZO modules that do not have temperature correction function.
+
+    # typical processing times (in seconds) of read commands per EZO module type, a bit shorter than AtlasHydroTools default timeouts.
+    _read_times = {"rtd": {"R": .55},
+                   "ph": {"R": .8, "RT": .85},
+                   "ec": {"R": .55, "RT": .8},
+                   "do": {"R": .55, "RT": .8},
+                   "orp": {"R": .8}}
+    _parameters = {"ec": ["EC", "TDS", "S", "SG"], "do": ["mg", "%"]}  # output parameters of EC and DO modules, in their responses order.
+    continuous_support = True  # "C" commands supported (True by default).
+    command_time = .3  # processing time (in seconds) of other commands ("I", "T", "L") (0.3 sec (300ms) by default).
+    reboot_time = .5  # time (in seconds) during which the module doesn't answer after an I2C address change (0.5 sec (500ms) by default).
+    slow_factor = 3.0  # factor applied to the processing time by "slow" fault (3.0 by default).
+
+    def __init__(self, sensor, value=None, version="2.10", address=None, noise=0.0, seed=None):
+        self.sensor = sensor.lower()
+        if self.sensor not in self._names:
+            raise ValueError("unknown EZO module type: " + str(sensor))
+        self.value = value if value is not None else self._values[self.sensor]
+        self.version = version
+        self.address = address if address is not None else self._addresses[self.sensor]
+        self.noise = noise
+        self._random = random.Random(seed)
+
+        self.temp = AtlasHydroTools.default_temp  # temperature compensation value (in °C).
+        self.led = True
+        self.asleep = False
+        self.commands = 0  # number of commands received.
+        self.continuous = 0  # seconds between two readings in continuous mode, 0 if not in continuous mode.
+        self.outputs = self._parameters.get(self.sensor, [])[:1]  # enabled output parameters ("O" commands).
+
+        self._status = 255  # status byte of the response to last command.
+        self._data = ""  # response to last command.
+        self._ready_at = 0.0  # _clock() time at which last command is processed.
+        self._offline_until = 0.0  # _clock() time until which the module doesn't answer (reboot).
+        self._faults = []  # [fault, remaining commands] of injected faults.
+        self._command_at = 0.0  # _clock() time of the last command.
+        self._continuous_start = 0.0  # _clock() time of the "C,n" command.
+        self._tick = None  # number of the latest reading in continuous mode.
+        self._latest = ""  # latest reading in continuous mode.
+
+    def _fault(self, fault):  # returns True and consumes one occurrence if fault is injected.
+        for entry in self._faults:
+            if entry[0] == fault:
+                if entry[1] > 0:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        self._faults.remove(entry)
+                return True
+        return False
+
+    def _check(self):  # raises IOError if the module doesn't answer (rebooting or "nack" fault). Called by SimBus before every transaction.
+        if _clock() < self._offline_until or self._fault("nack"):
+            raise IOError(errno.EREMOTEIO, "Remote I/O error")
+
+    def _measure(self):
+        value = self.value() if callable(self.value) else self.value
+        if self.noise:
+            value += self._random.gauss(0.0, self.noise)
+        if self.sensor not in self._parameters:
+            return str(round(value, self._decimals[self.sensor]))
+        fields = {"EC": round(value, 2), "TDS": round(value * .54, 1), "S": round(value * .000488, 2), "SG": round(1.0 + value * .0000005, 3),
+                  "mg": round(value, 2), "%": round(value / .0826, 1)}  # derived with typical factors (TDS factor .54, 8.26 mg/L at 100% saturation).
+        return ",".join(str(fields[param]) for param in self._parameters[self.sensor] if param in self.outputs)
+
+    def _answer(self, status, data="", delay=0.0):
+        self._status = status
+        self._data = data
+        if self._fault("slow"):
+            delay *= self.slow_factor
+        self._ready_at = _clock() + delay
+
+    def processing_time(self, cmd):
+        return self._read_times[self.sensor].get(cmd, self.command_time)
+
+    def _continuous_reading(self):  # returns the latest reading in continuous mode if newer than the last command, None otherwise.
+        if not self.continuous:
+            return None
+        first = self._continuous_start + self.processing_time("R")
+        now = _clock()
+        if now < first:
+            return None
+        tick = int((now - first) // self.continuous)
+        if first + tick * self.continuous < self._command_at:
+            return None
+        if tick != self._tick:
+            self._tick = tick
+            self._latest = self._measure()
+        return self._latest
+
+    def command(self, cmd):
+        self.commands += 1
+        self._command_at = _clock()
+        cmd = cmd.rstrip("\00")
+        args = cmd.split(",")
+        name = args[0].upper()
+
+        if self.asleep:
+            self.asleep = False
+            self._answer(255)
+            return
+
+        if self._fault("syntax"):
+            self._answer(2, "", self.command_time)
+            return
+
+        if (name == "R" and len(args) == 1) or (name == "RT" and len(args) == 2 and self.sensor not in self._no_rt):
+            try:
+                if name == "RT":
+                    self.temp = float(args[1])
+            except ValueError:
+                self._answer(2, "", self.command_time)
+                return
+            data = "?" if self._fault("garbage") else self._measure()
+            self._answer(1, data, self.processing_time(name))
+        elif name == "T" and len(args) == 2 and self.sensor not in self._no_rt:
+            if args[1] == "?":
+                self._answer(1, "?T," + str(self.temp), self.command_time)
+            else:
+                try:
+                    self.temp = float(args[1])
+                    self._answer(1, "", self.command_time)
+                except ValueError:
+                    self._answer(2, "", self.command_time)
+        elif name == "I" and len(args) == 1:
+            self._answer(1, "?I," + self._names[self.sensor] + "," + self.version, self.command_time)
+        elif name == "C" and len(args) == 2 and self.continuous_support and (args[1] == "?" or (args[1].isdigit() and int(args[1]) <= 99)):
+            if args[1] == "?":
+                self._answer(1, "?C," + str(self.continuous), self.command_time)
+            else:
+                self.continuous = int(args[1])
+                self._continuous_start = _clock()
+                self._tick = None
+                self._answer(1, "", self.command_time)
+        elif name == "O" and self.sensor in self._parameters and ((len(args) == 2 and args[1] == "?") or (len(args) == 3 and args[1].upper() in [param.upper() for param in self._parameters[self.sensor]] and args[2] in ["0", "1"])):
+            if args[1] == "?":
+                self._answer(1, "?O," + (",".join(self.outputs) if self.outputs else "No output"), self.command_time)
+            else:
+                enabled = [param.upper() for param in self.outputs if param.upper() != args[1].upper()]
+                if args[2] == "1":
+                    enabled.append(args[1].upper())
+                self.outputs = [param for param in self._parameters[self.sensor] if param.upper() in enabled]
+                self._answer(1, "", self.command_time)
+        elif name == "SLEEP" and len(args) == 1:
+            self.continuous = 0
+            self.asleep = True
+            self._answer(255)
+        elif name == "L" and len(args) == 2 and args[1] in ["0", "1", "?"]:
+            if args[1] == "?":
+                self._answer(1, "?L," + str(int(self.led)), self.command_time)
+            else:
+                self.led = args[1] == "1"
+                self._answer(1, "", self.command_time)
+        elif name == "I2C" and len(args) == 2 and args[1].isdigit() and int(args[1]) in range(1, 128):
+            self.address = int(args[1])
+            self.continuous = 0
+            self._offline_until = _clock() + self.reboot_time
+            self._answer(255)
+        else:
+            self._answer(2, "", self.command_time)
+
+    def response(self, length=16):
+        latest = self._continuous_reading()
+        if latest is not None:
+            res = [1] + [ord(c) for c in latest]
+        elif self.asleep or self._status == 255:
+            res = [255]
+        elif _clock() < self._ready_at:
+            res = [254]
+        else:
+            res = [self._status] + [ord(c) for c in self._data]
+        return (res + [0] * length)[:length]
+
+    def inject(self, fault, count=1):
+        if fault not in ["nack", "syntax", "slow", "garbage"]:
+            raise ValueError("unknown fault: " + str(fault))
+        self._faults.append([fault, count])
+
+    def clear(self):
+        self._faults = []
+
+
+class _SimCollision(object):  # several SimEZO modules answering at the same I2C address, as on a real bus.
+
+    def __init__(self, modules):
+        self.modules = list(modules)
+
+    def _check(self):  # acknowledged if any module answers.
+        errors = 0
+        for module in self.modules:
+            try:
+                module._check()
+            except IOError:
+                errors += 1
+        if errors == len(self.modules):
+            raise IOError(errno.EREMOTEIO, "Remote I/O error")
+
+    def command(self, cmd):
+        for module in self.modules:
+            module.command(cmd)
+
+    def response(self, length=16):
+        res = [0xFF] * length
+        for module in self.modules:  # open drain bus: bytes sent at the same time are ANDed.
+            res = [a & b for a, b in zip(res, module.response(length))]
+        return res
+
+
+class SimBus(MemoryTransport):
+
+    # ========== CONSTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, bus=1, sensors=("rtd", "ph", "ec")):
+        MemoryTransport.__init__(self, bus)
+        self.transactions = {"send": 0, "read": 0, "probe": 0}  # number of I2C transactions made on the bus.
+        for sensor in sensors:
+            self.add(SimEZO(sensor))
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _device(self, addr):
+        device = MemoryTransport._device(self, addr)
+        device._check()
+        return device
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def add(self, module):
+        device = self.devices.get(module.address)
+        if device is None:
+            self.devices[module.address] = module
+        elif isinstance(device, _SimCollision):
+            device.modules.append(module)
+        else:
+            self.devices[module.address] = _SimCollision([device, module])
+        return module
+
+    def modules(self):
+        return [module for device in self.devices.values() for module in (device.modules if isinstance(device, _SimCollision) else [device])]
+
+    def module(self, addr):
+        for device in self.modules():
+            if device.address == addr or device.sensor == str(addr).lower():
+                return device
+        raise KeyError(addr)
+
+    def collisions(self):
+        return sorted(addr for addr, device in self.devices.items() if isinstance(device, _SimCollision))
+
+    def send(self, addr, cmd):
+        self.transactions["send"] += 1
+        device = self._device(addr)
+        device.command(cmd)
+        modules = device.modules if isinstance(device, _SimCollision) else [device]
+        moved = [module for module in modules if module.address != addr]  # I2C address changed by the command, the modules leave addr.
+        if moved:
+            del self.devices[addr]
+            for module in modules:
+                self.add(module)
+
+    def read(self, addr, length=16):
+        self.transactions["read"] += 1
+        return MemoryTransport.read(self, addr, length)
+
+    def probe(self, addr):
+        self.transactions["probe"] += 1
+        MemoryTransport.probe(self, addr)
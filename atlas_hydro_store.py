@@ -0,0 +1,319 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Memory-mapped time-series store of the readings of atlas_hydro_tools.py library.
+Compatibility: python2 and python3.
+
+HydroStore keeps the history of the readings of each EZO module (keyed by sensor name, see AtlasHydroTools.sensors(), or by address for unknown modules) in append-only segment files of fixed-width binary columns: timestamp, value, status code and record checksum. Segment files are memory-mapped: appending a reading is a few bytes written in memory (no file reopened, no text formatted) and range queries return the columns as arrays by binary search on the timestamps, without parsing anything.
+
+Segment file layout (little endian): 64 bytes header (magic "AHSTORE1", capacity and number of records hint as unsigned 32 bits integers), then capacity timestamps (float64), capacity values (float64), capacity status codes (uint16) and capacity CRC32 checksums (uint32) of the records.
+
+Timestamps are seconds since the epoch taken from the monotonic clock (_clock()) plus an offset measured when the store is opened: they never go backward within a segment, whatever time adjustments are made while acquiring. Appending continues the last segment of a key while it is not full (and its' last record is not newer than the appended one), a new segment is started otherwise, the time index being the first and last timestamps of every segment. Segments are memory-mapped only while appended or queried: a store keeps one mapping per key appended, whatever the number of segment files.
+
+Status codes: status codes of the readings given by AtlasHydroTools (STATUS_OK = 0 for a valid reading, please refer to Reading class description in atlas_hydro_tools.py), so that error values are told from identical valid readings (eg. -100.0 mV ORP reading).
+
+Crash safety: a record is valid if its' checksum matches. When a segment is opened, the number of records is recovered from the header hint and the checksums, so that a record partially written when the process was killed or the computer lost power is dropped without affecting the other ones. Records written in memory are on the disk once written back by the operating system (after a process crash too) or after flush(): a power loss loses the records not flushed yet, flush() (or flush_every argument) bounds this loss.
+
+Example:
+    store = HydroStore("/var/lib/hydro")
+    tentacle = AtlasHydroTools()
+    tentacle.sink_add(store.sink)  # every reading of tentacle is stored
+    tentacle.read_all()
+    timestamps, values, statuses = store.query("ph", time.time() - 3600)  # last hour
+
+LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
+
+    # ========== STORE CLASS ==========#
+
+    HydroStore(path, capacity=65536, flush_every=None): Opens (creating it if needed) the store in path directory, recovering the records of existing segment files (each one is mapped to be indexed, then unmapped).
+            path: String argument, no default value. Directory of the store. Each key has its' own sub-directory of segment files.
+            capacity: Integer argument, default value: 65536. Number of records of new segment files (22 bytes per record, 1.4 MB per segment by default). Raises ValueError if not a positive integer.
+            flush_every: Integer argument, default value: None. Number of records after which the segments are flushed to the disk (see flush() function). Never flushed by the store itself if None.
+        NB: raises ValueError if a segment file is not a valid segment (eg. empty or truncated file), after closing the segments already opened.
+
+    append(key, timestamp, value, status=STATUS_OK): Appends a record to key history. O(1).
+            key: String argument, no default value. Sensor name (eg. "ph") or address of the EZO module.
+            timestamp: Float argument, no default value. Seconds since the epoch. Should not be older than the last record of key appended by this object.
+            value: Float argument, no default value. Reading.
+            status: Integer argument, default value: STATUS_OK. Status code of the record.
+
+    sink(sensor, addr, value, timestamp, status): Appends a reading of AtlasHydroTools with its' status code (to be given to AtlasHydroTools.sink_add() function). timestamp is the _clock() time of the reading, converted to seconds since the epoch.
+
+    query(key, start=None, end=None): Returns the timestamps, values and status codes of key records with start <= timestamp < end, as three arrays (array module, types "d", "d" and "H"). No bound if None.
+
+    last(key): Returns the last record of key as a (timestamp, value, status) tuple, None if no record.
+
+    count(key): Returns the number of records of key.
+
+    keys(): Returns the list of keys of the store.
+
+    flush(): Writes the records of the current segments to the disk (msync).
+
+    close(): Flushes and closes all segments. Called by the destructor.
+        NB: functions called after close() raise StoreError.
+
+    # ========== SEGMENT CLASS ==========#
+
+    _Segment(path, capacity=None): One memory-mapped segment file. Created with capacity records if capacity is given, opened (and its' records recovered) otherwise. Mapped again by the functions reading or writing records after close().
+
+'''
+
+import array
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from atlas_hydro_tools import STATUS_OK, _clock
+
+_magic = b"AHSTORE1"  # segment file signature.
+_header = struct.Struct("<8sII")  # magic, capacity, number of records hint.
+_header_size = 64
+_record = struct.Struct("<ddH")  # timestamp, value, status code (checksummed bytes of a record).
+
+
+def _array(typecode, data):  # array of little endian data.
+    values = array.array(typecode)
+    if hasattr(values, "frombytes"):
+        values.frombytes(data)
+    else:  # python2
+        values.fromstring(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class _Segment(object):
+
+    def __init__(self, path, capacity=None):
+        self.path = path
+        if capacity is not None:
+            with open(path, "wb") as f:
+                f.write(_header.pack(_magic, capacity, 0))
+                f.truncate(_header_size + 22 * capacity)  # sparse file, disk space used as records are written.
+        self._file = self._map = None
+        self._open()
+        magic, self.capacity, hint = _header.unpack_from(self._map, 0) if len(self._map) >= _header_size else (None, 0, 0)
+        if magic != _magic or len(self._map) < _header_size + 22 * self.capacity:  # not a segment, or truncated.
+            self.close()
+            raise ValueError("not a HydroStore segment: " + path)
+        self._ts = _header_size  # offsets of the columns.
+        self._values = self._ts + 8 * self.capacity
+        self._status = self._values + 8 * self.capacity
+        self._crc = self._status + 2 * self.capacity
+        self.count = self._recover(min(hint, self.capacity))
+        self.first = self.timestamp(0) if self.count else None
+        self.last = self.timestamp(self.count - 1) if self.count else None
+
+    def _open(self):
+        if self._map is None:
+            self._file = open(self.path, "r+b")
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0)
+            except (OSError, ValueError):  # empty file.
+                self._file.close()
+                self._file = None
+                raise ValueError("not a HydroStore segment: " + self.path)
+
+    def _valid(self, i):
+        timestamp, value, code = self.record(i)
+        return struct.unpack_from("<I", self._map, self._crc + 4 * i)[0] == zlib.crc32(_record.pack(timestamp, value, code)) & 0xffffffff
+
+    def _recover(self, count):
+        while count > 0 and not self._valid(count - 1):  # last records partially written.
+            count -= 1
+        while count < self.capacity and self._valid(count):  # records written after the last hint update.
+            count += 1
+        return count
+
+    def timestamp(self, i):
+        return struct.unpack_from("<d", self._map, self._ts + 8 * i)[0]
+
+    def record(self, i):
+        self._open()
+        return (struct.unpack_from("<d", self._map, self._ts + 8 * i)[0],
+                struct.unpack_from("<d", self._map, self._values + 8 * i)[0],
+                struct.unpack_from("<H", self._map, self._status + 2 * i)[0])
+
+    def append(self, timestamp, value, code):
+        self._open()
+        i = self.count
+        struct.pack_into("<d", self._map, self._ts + 8 * i, timestamp)
+        struct.pack_into("<d", self._map, self._values + 8 * i, value)
+        struct.pack_into("<H", self._map, self._status + 2 * i, code)
+        struct.pack_into("<I", self._map, self._crc + 4 * i, zlib.crc32(_record.pack(timestamp, value, code)) & 0xffffffff)  # written last, validates the record.
+        self.count = i + 1
+        struct.pack_into("<I", self._map, 12, self.count)
+        if self.first is None:
+            self.first = timestamp
+        self.last = timestamp
+
+    def search(self, timestamp):  # index of the first record with a timestamp greater than or equal to timestamp.
+        self._open()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def columns(self, i, j):
+        self._open()
+        return (_array("d", self._map[self._ts + 8 * i:self._ts + 8 * j]),
+                _array("d", self._map[self._values + 8 * i:self._values + 8 * j]),
+                _array("H", self._map[self._status + 2 * i:self._status + 2 * j]))
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._file = self._map = None
+
+
+class HydroStore(object):
+
+    # ========== CONSTRUCTOR/DESTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, path, capacity=65536, flush_every=None):
+        if isinstance(capacity, bool) or not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError("capacity should be a positive integer: " + repr(capacity))
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self._offset = time.time() - _clock()  # conversion of _clock() times to seconds since the epoch, fixed for this object.
+        self._lock = threading.Lock()
+        self._segments = {}  # {key: [segments in time order]}
+        self._current = {}  # {key: segment appended by this object, kept mapped}
+        self._unflushed = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        try:
+            for key in sorted(os.listdir(path)):
+                if os.path.isdir(os.path.join(path, key)):
+                    segments = self._segments[key] = []
+                    for name in sorted(os.listdir(os.path.join(path, key))):
+                        if name.endswith(".seg"):
+                            segments.append(_Segment(os.path.join(path, key, name)))
+                            segments[-1].close()  # indexed, mapped again when appended or queried.
+        except Exception:
+            self.close()  # segments already opened released before the error is raised.
+            raise
+
+    def __del__(self):
+        self.close()
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def _check(self):
+        if self._segments is None:
+            raise StoreError
+
+    def _release(self, key, segment):  # unmaps a segment read by a query, unless it is appended.
+        if self._current.get(key) is not segment:
+            segment.close()
+
+    def _new_segment(self, key):
+        directory = os.path.join(self.path, key)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        segments = self._segments.setdefault(key, [])
+        number = int(os.path.basename(segments[-1].path)[:-4]) + 1 if segments else 0
+        segment = _Segment(os.path.join(directory, "%08d.seg" % number), self.capacity)
+        if key in self._current:
+            self._current[key].close()  # full (or newer than the appended record), unmapped.
+        segments.append(segment)
+        self._current[key] = segment
+        return segment
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def append(self, key, timestamp, value, status=STATUS_OK):
+        key = str(key)
+        with self._lock:
+            self._check()
+            segment = self._current.get(key)
+            if segment is None and self._segments.get(key):
+                segment = self._current[key] = self._segments[key][-1]  # continues the last segment of a previous object.
+            if segment is None or segment.count == segment.capacity or (segment.last is not None and timestamp < segment.last):
+                segment = self._new_segment(key)
+            segment.append(timestamp, value, status)
+            if self.flush_every is not None:
+                self._unflushed += 1
+                if self._unflushed >= self.flush_every:
+                    self._unflushed = 0
+                    for current in self._current.values():
+                        current.flush()
+
+    def sink(self, sensor, addr, value, timestamp, status):
+        self.append(sensor, self._offset + timestamp, value, status)
+
+    def query(self, key, start=None, end=None):
+        key = str(key)
+        timestamps, values, statuses = array.array("d"), array.array("d"), array.array("H")
+        with self._lock:
+            self._check()
+            for segment in self._segments.get(key, []):
+                if not segment.count or (start is not None and segment.last < start) or (end is not None and segment.first >= end):  # time index.
+                    continue
+                i = segment.search(start) if start is not None else 0
+                j = segment.search(end) if end is not None else segment.count
+                columns = segment.columns(i, j)
+                timestamps.extend(columns[0])
+                values.extend(columns[1])
+                statuses.extend(columns[2])
+                self._release(key, segment)
+        return timestamps, values, statuses
+
+    def last(self, key):
+        key = str(key)
+        with self._lock:
+            self._check()
+            for segment in reversed(self._segments.get(key, [])):
+                if segment.count:
+                    record = segment.record(segment.count - 1)
+                    self._release(key, segment)
+                    return record
+        return None
+
+    def count(self, key):
+        with self._lock:
+            self._check()
+            return sum(segment.count for segment in self._segments.get(str(key), []))
+
+    def keys(self):
+        with self._lock:
+            self._check()
+            return sorted(self._segments)
+
+    def flush(self):
+        with self._lock:
+            self._check()
+            for segment in self._current.values():
+                segment.flush()
+            self._unflushed = 0
+
+    def close(self):
+        if getattr(self, "_segments", None) is None:
+            return
+        self.flush()
+        with self._lock:
+            for segments in self._segments.values():
+                for segment in segments:
+                    segment.close()
+            self._segments = None
+            self._current = {}
+
+
+class StoreError(Exception):
+    def __init__(self, msg="ERROR: the store is closed. Please open a new HydroStore object"):
+        super(StoreError, self).__init__(msg)
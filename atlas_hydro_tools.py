@@ -20,57 +20,212 @@ LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
 
     # ========== CONSTRUCTOR/DESTRUCTOR ==========#
 
-     __init__(mode="op", silent=True, keep_awake=True): Constructor of the class. Initialises the communication protocols and default values. Detecting connected EZO modules and stores their names, I2C addresses, units and versions.
+     __init__(mode="op", silent=True, keep_awake=True, poll=False, cache=None, autoscan=True, bus=1, transport="smbus", background=False): Constructor of the class. Initialises the communication protocols and default values. Detecting connected EZO modules and stores their names, I2C addresses, units and versions.
             mode: Not case sensitive string argument, default value: "op". Defining the way the class deals with certain errors. Argument can be "op" for operation or "dev" for development. In development mode all errors are raised for debugging purposes. In operation mode certain error such ones triggered by a faulty EZO module response, addressing a not connected EZO module, etc... are resulting in aberrant negative read values that can still be flagged but avoiding code interruptions. Please refer to _read() function description bellow for more information.
             silent: Boolean argument, default value=False. Determines if functions print out certain information useful for debugging purposes. silent=True: print-out disabled, silent=False: print-out enabled
-            keep_awake: Boolean argument, default value: True. Argument controlling the putting to sleep of EZO modules at the end of the code execution. True: EZO modules are kept awake (not put to sleep). False: All connected EZO modules are put to sleep by the destructor.
-        used functions: scan()
-
-    __del__(keep awake=True): Destructor of the class.
+            keep_awake: Boolean argument, default value: True. Argument controlling the putting to sleep of EZO modules at the end of the code execution. True: EZO modules are kept awake (not put to sleep). False: All connected EZO modules are put to sleep by close() (or the destructor).
+            poll: Boolean argument, default value: False. Activates ready-polling of EZO modules. True: after a short first interval, the status byte of the EZO module response (1 = done, 254 = still processing, 255 = no data) is checked with a growing interval and the measurement is read as soon as the module is ready, with a hard deadline. False: the full worst-case timeout is slept before reading. Please refer to poll_config() function description bellow for more information.
+            cache: String argument, default value: None. Path of a bus topology cache file (JSON). If given and the file exists, only the cached addresses are woken up and probed and the connected EZO modules are identified against the cached types and versions (much faster than a full scan). A full scan() is made if the file is missing or invalid, or if any cached EZO module doesn't answer or doesn't match (including a module of unknown type at a cached address). The file is (re)written after every scan() and addr_change().
+            autoscan: Boolean argument, default value: True. If False, neither scan() nor the bus topology cache check is made by the constructor and no EZO module is known until scan() is called (used by AsyncAtlasHydroTools, see atlas_hydro_async.py).
+            bus: Integer argument, default value: 1. Number of the I2C bus (/dev/i2c-bus) the EZO modules are connected to. 1 on the Raspberry Pi 3 B+, 0 on some older models. Please refer to MultiBusHydroTools class bellow for several buses.
+            transport: String argument or transport object, default value: "smbus". I2C backend used to communicate with the EZO modules of bus. Can be a non-case sensitive string among ["smbus", "smbus2", "raw"] or an already constructed transport object offering send(), read(), probe() and close() functions (please refer to I2C TRANSPORT CLASSES bellow), TransportError raised otherwise. The transport is closed by close() (or the destructor).
+            background: Boolean argument, default value: False. If True (and autoscan=True), the connected EZO modules are discovered by a background thread and the constructor returns at once (please refer to wait_ready() function description bellow).
+        used functions: _load_topology(), scan(), _discover()
+        NB: raises TransportError if transport is not one of the above or if the python module needed by the transport is not installed.
+
+    __del__(keep awake=True): Destructor of the class. Calls close().
             keep_awake:  Boolean argument, default value: True. See description in Constructor above. Value transited by constructor at code termination if the destructor is not called separately.
 
+    close(): Waits for the background discovery and shuts down the submit_read() thread pool, restores the continuous mode of EZO modules changed by continuous(), puts EZO modules to sleep if keep_awake is False and closes the transport. Only the first call has an effect. No function using the bus can be called afterwards.
+        NB: should be called explicitly when done (or the object used as a context manager: with AtlasHydroTools() as tentacle: ...): while the background discovery thread or the submit_read() thread pool hold a reference to the object, the destructor is never called.
+
     # ========== PRIVATE FUNCTIONS ==========#
 
+    _identify(info): Parses the response to the "I" command of an EZO module. Returns its name, version and unit as a tuple. Returns ("Unknown Sensor", -1.0, "u") if info is not a valid EZO module response or the response of an EZO module of another type (eg. RGB).
+            info: String argument, no default value. Response of the EZO module to the "I" command.
+
+    _scan_wake(), _scan_probe(), _scan_identify(), _scan_collect(): Successive steps of scan() function, respectively waking up EZO modules on all addresses with "L,1" command, probing all addresses for connected modules, sending "I" command to connected modules and collecting their responses. Each step needs a timeout before the next one (see scan() function).
+        uses functions: _identify(), _order_modules(), _save_topology() (_scan_collect() only)
+
+    _order_modules(report=True): Reorders identified modules stored by scan() or _load_topology() in the following order : ["rtd", "ph", "ec", "do", "orp"] and detects presence of RTD EZO module. The lists of connected EZO modules are replaced at once.
+            report: Boolean argument, default value: True. Prints the connected EZO modules if not silent.
+
+    _discover(): Background discovery thread (see wait_ready() function). Checks the bus topology cache if any, otherwise discovers EZO modules at their factory default addresses first, then on all other addresses. Sets the ready flag when done.
+
+    _set_ready(): Sets the ready flag, wakes up the threads waiting for EZO modules being discovered and completes the future returned by ready() function.
+        uses functions: _load_topology(), _discover_addresses(), _order_modules(), _save_topology()
+
+    _discover_addresses(addresses): Wakes up, probes and identifies ("I" command) the EZO modules of addresses list. Each EZO module is added to the connected EZO modules as soon as identified. An I2C module failing to answer is recorded as "Unknown Sensor" and the other addresses are still identified.
+        uses functions: _poll(), _identify(), _order_modules()
+
+    _discovering(): Returns True if the background discovery is not done (and not called by the discovery thread itself).
+
+    _await_module(found): Waits until found function (without argument) returns True after an EZO module was discovered, or until the end of the background discovery.
+
+    _load_topology(): Identifies connected EZO modules from the bus topology cache file given to the constructor. Returns True if all cached EZO modules answered with the cached type and version, False otherwise (a full scan() is then needed).
+        uses functions: _identify(), _poll(), _order_modules()
+
+    _save_topology(): Writes connected EZO modules addresses, names, versions and units to the bus topology cache file given to the constructor.
+        NB: function impacted by class mode. In development mode writing errors will be raised. In operation mode they are ignored.
+
     _check_addr(addr): Checks given address against connected EZO modules. Returns the address of connected EZO module as integer.
             addr: Integer or String argument, no default value. addr should be and EZO module I2C address. Can be an integer in the 1-127 range or a non-case sensitive string among ["rtd", "ph", "ec", "do", "orp"]. If corresponding to a connected EZO module, its' integer address is returned.
 
-    _write(addr, rt=True, temp=default_temp): writes "read" command ("R" or "RT,temp") to EZO module with addr address. Automatically detects sensor type and uses the appropriate command ("R" or "RT")
+    _write(addr, rt=True, temp=default_temp): writes "read" command ("R" or "RT,temp") to EZO module with addr address. Automatically detects sensor type and uses the appropriate command ("R" or "RT"). Returns the integer address of the EZO module, the sent command name ("R" or "RT") and the compensation temperature sent (None for "R") as a tuple.
             addr: see description in _check_addr() function
             rt: Boolean argument, default value: True. Activates temperature compensation command "RT,temp" for pH, EC, DO sensors. If rt=False, temperature compensation will be applied with last transmitted temperature compensation value through rt=true used function, cmd() or set_t(temp) functions (see bellow for more information). If rt=True, temperature compensation will be applied with temp value.
             temp: Float argument, default value: default_temp. If rt=True, is the temperature in °C for witch the compensation will be applied. Can be a float in the range self.minH2Otemp - self.maxH2Otemp (0.0-100.0 by default). If the given value is outside this range or of wrong type, then default_temp (25°C by default) is applied for compensation.
         uses functions: _check_addr()
 
-    _read(addr): Reads measurement from EZO module after a _write() function. Returns measurement as float.
+    _error(error, addr=None): Handles known errors according to class mode. In operation mode returns the matching error value (see _read() description), in development mode raises error.
+            error: Exception class among EZOnotConnected, EZOnotReady and EZOError, no default value.
+            addr: see description in _check_addr() function. Address that triggered the error if known. EZOnotConnected for the default RTD address or "rtd" always returns -100.0 when no RTD EZO module is connected.
+        uses functions: _count_error()
+
+    _failure(error, addr, start=None, temp=None): Handles error with _error() function and returns the resulting measurement tuple (see _read() function) with the status code of the error value, so that error values are told from identical valid readings (eg. -100.0 mV ORP reading).
+            error, addr: see respective descriptions in _error() function.
+            start, temp: see respective descriptions in _read() function. start is the current _clock() time if None.
+
+    _records(addr, readings, form): Returns the measurement tuples of readings list made by read_multi() for the EZO modules of addr list (addresses as checked by read_multi()) in form "record" (list of Reading records, with their' fields, see _fields() function) or "array" (numpy structured array of READING_DTYPE type, allocated once and filled in place without any Reading record).
+
+    _parse(status, data): Converts EZO module response to a measurement. Returns measurement as float. Raises ValueError if status is not 1 (command successful) or data is not a number.
+            status, data: status byte and response as returned by _read_raw() function.
+        NB: responses of EZO modules with several output parameters (eg. "1413,763,0.69,1.000" for EC, TDS, salinity and specific gravity) are comma separated: the first parameter is returned as measurement.
+
+    _send(addr, cmd): Sends cmd command to EZO module with addr address.
+            addr: Integer argument, no default value. I2C address of the EZO module (not checked).
+            cmd: String argument, no default value. Command without its' terminating null character (eg. "T,25.0").
+
+    _read_raw(addr): Reads raw response of EZO module with addr address. Returns status byte (1 = done, 2 = syntax error, 254 = still processing, 255 = no data) as integer and response as string.
+            addr: Integer argument, no default value. I2C address of a connected EZO module (not checked).
+        uses functions: _response_length()
+
+    _response_length(addr): Returns the number of bytes read from EZO module with addr address by _read_raw() function: 32 for EC and DO EZO modules unless their output configuration is known to be a single parameter (see output() function), 16 otherwise. Kept per address once the EZO module is known.
+
+    _output_names(addr, count): Returns the names of the count output parameters of a response of EZO module with addr address, in the response order, None if unknown: when count is not the number of all its' parameters, the output configuration must have been queried or set by output() function. Never sends any command.
+
+    _fields(addr, data): Returns the output parameters of data response of EZO module with addr address as a dictionary {parameter: value} (see Reading class), {} if data is None or if the parameters can't be named (see _output_names() function).
+
+    _poll(addr, start, first=None, cmd=None): Polls EZO module with addr address until its response is ready or the polling deadline is reached. Returns status byte and response as _read_raw() function.
+            addr: see description in _read_raw() function
+            start: Float argument, no default value. _clock() time at which the command was sent to the EZO module. First check is made first seconds after start, then every poll_interval seconds multiplied by poll_backoff after each check (up to poll_max_interval) until poll_deadline seconds after start.
+            first: Float argument, default value: None. Time in seconds after start of the first check. poll_first is used if None.
+            cmd: String argument, default value: None. Name of the command sent to the EZO module ("R" or "RT"). If given, the transaction is recorded in the metrics (see _observe() function) and, in poll mode, the time the EZO module took to be ready is learned by the latency model (see _learn() function).
+        uses functions: _read_raw(), _learn(), _observe()
+
+    _read(addr, start=None, first=None, cmd=None, temp=None): Reads measurement from EZO module after a _write() function. Returns measurement as a (value, status code, _clock() time of the command, compensation temperature, response) tuple: the reading as float, STATUS_OK or the status code of the error value (see Reading class), start (or the time of the reading if None), temp and the response string of the EZO module (all its' output parameters, None for an error value).
             addr: see description in _check_addr() function
+            start: Float argument, default value: None. If given, the EZO module is polled until ready (see description in _poll() function) before being read, otherwise it is read right away.
+            first, cmd: see respective descriptions in _poll() function.
+            temp: Float argument, default value: None. Compensation temperature sent with the command as returned by _write() function.
+        uses functions: _check_addr(), _read_raw(), _poll(), _parse(), _failure()
         NB.1: if used right after a _write() function a timeout time is needed in between the two. timeout varies from 300 to 900ms depending on the EZO module and the command. Please refer to Altlas Scientific EZO modules datasheets for more information.
         NB.2: function impacted by class mode. In development mode all exceptions will be raised. In operation mode following error values will be returned as measurements:
                 -100.0: returned when addressing an EZO module with valid address(right type, right range) but there is no EZO module connected to this address.
-                -200.0: returned when EZO module have nothing to give when tried to be read from. The timeout between _write() and_read() commands is too short or _read() command was executed without prior valid _write() command.
+                -200.0: returned when EZO module have nothing to give when tried to be read from (status byte other than 1). The timeout between _write() and_read() commands is too short or _read() command was executed without prior valid _write() command.
                 -1000.0: returned when argument addr corresponds to a connected EZO module's address but is not responding correctly. EZO module was asleep OR is faulty OR its' I2C address was changed without using addr_change() function OR an undetected during debugging process error occurred.
 
-    _query(addr, rt=True, temp=default_temp): Handles the whole measurement process of an EZO module. Returns measurement as a float.
+    _timeout(addr, cmd): Returns the time in seconds to wait before reading EZO module with addr address after cmd command. Default value depends on the EZO module type and the command (see _def_latency), and is replaced by the learned latency plus a safety margin once the module latency was learned.
+            addr: Integer argument, no default value. I2C address of a connected EZO module.
+            cmd: String argument, no default value. Name of the command sent to the EZO module ("R" or "RT").
+
+    _first_check(addr, cmd): Returns the time in seconds after which the status byte of EZO module with addr address is first checked in poll mode. poll_first until the module latency was learned, then the learned latency minus a safety margin.
+            addr, cmd: see respective descriptions in _timeout() function.
+
+    _learn(addr, cmd, elapsed): Updates the latency model of EZO module with addr address for cmd command with an exponentially weighted moving average of the observed completion times.
+            addr, cmd: see respective descriptions in _timeout() function.
+            elapsed: Float argument, no default value. Observed time in seconds between the command and the EZO module being ready.
+        NB: latencies are learned in poll mode only as in sleep mode the completion time of the EZO module can not be observed. Learned latencies are also used in sleep mode (see latency_load() function).
+
+    _query(addr, rt=True, temp=default_temp): Handles the whole measurement process of an EZO module. Returns measurement as a tuple (see _read() function).
             addr, rt, temp: see respective descriptions _write() function.
-        uses functions: _write(), _read()
-        NB: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
+        uses functions: _write(), _read(), _timeout(), _first_check(), _failure()
+        NB.1: in sleep mode the timeout is slept by _poll() function. In poll mode the EZO module is read as soon as its' status byte reports the measurement is ready instead of after the whole timeout. In sleep mode, if the module is not ready after the timeout, it is polled until ready.
+        NB.2: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
+
+    _issue(pending, i, addr, rt, temp, readings): Sends read command to EZO module with addr address (see _write() function) and schedules its' reading in pending heap at the time it is due: after its' timeout in sleep mode, at its' first status byte check in poll mode. Returns True if the command was sent. If the command can't be sent, the matching error measurement is stored in readings[i] and False is returned.
+            pending: List argument, no default value. Heap of outstanding commands (due time, i, address, command name, start time, polling interval, slept time, status byte checks, compensation temperature) ordered by due time.
+            i: Integer argument, no default value. Index of the EZO module in readings.
+            addr, rt, temp: see respective descriptions _write() function.
+            readings: List argument, no default value. Measurements list of _query_multi() function.
+        uses functions: _write(), _timeout(), _first_check(), _failure()
 
-    _query_multi(addr, rt=True, temp=default_temp): Handles the whole measurement process of multiple EZO modules in one go. Returns measurements as list of floats.
+    _query_multi(addr, rt=True, temp=default_temp, on_ready=None, stop=None, readings=None): Handles the whole measurement process of multiple EZO modules in one go. Returns measurements as list of tuples (see _read() function), (-2000.0, STATUS_NOT_REPLACED, _clock() time, None, None) for an EZO module never read.
             addr: list of integers or strings, no default value. List of EZO modules I2C addresses. addr elements can be integers in the 1-127 range or not case sensitive strings in ["rtd", "ph", "ec", "do", "orp"].
             rt, temp: see respective descriptions _write() function.
-        uses functions: _write()
-        NB: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
+            on_ready: Function argument, default value: None. If given, called as on_ready(i, reading, status) as soon as the measurement of addr[i] EZO module is read (or its' command could not be sent). It can return a list of (j, rt, temp) or (j, rt, temp, due) tuples: a new read command is then sent to each addr[j] EZO module (which must not have an outstanding command) with these arguments, right away or at due _clock() time, and readings[j] is replaced by its' measurement once read (on_ready is called again).
+            stop: Event argument, default value: None. If given, commands waiting for their' due time are dropped once stop is set (the outstanding ones are still read), and readings are not given to sinks (stream() gives them cycle by cycle).
+            readings: List argument, default value: None. Measurements already made (or failed, eg. not connected EZO modules found by read_multi()) of addr EZO modules, None for the ones to be measured. Given measurements are returned as they are: their' EZO modules are neither queried nor given to on_ready and sinks, and their' errors are not counted again.
+        uses functions: _issue(), _read_raw(), _parse(), _learn(), _observe(), _failure()
+        NB.1: commands are sent to all EZO modules at once, then EZO modules are read in earliest deadline order: each one as soon as its' own timeout elapsed (sleep mode) or its' status byte reports the measurement is ready (poll mode), instead of all after the longest timeout. An EZO module still processing its' command when due is checked again after the polling interval (see poll_config() function) until the polling deadline.
+        NB.2: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
+
+    _query_speculative(addr, readings=None): Handles the measurement process of read_multi() "spec" mode. Returns measurements as list of tuples (see _read() function).
+            addr: List argument, no default value. Integer addresses of the EZO modules, including the RTD EZO module.
+            readings: List argument, default value: None. Measurements already made, see description in _query_multi() function.
+        uses functions: _query_multi()
+
+    _stream_worker(addr, period, rt, cycles, records, stop): Background thread of stream() function making the measurements and putting the records, then None (end of stream) or the raised exception, in records queue. The measurements of all cycles are made by one _query_multi() call: as soon as an EZO module is read, its' command of the next cycle is scheduled at the cycle start time, so that the commands of a cycle overlap the reading of slower EZO modules of the previous one.
+            addr: List argument, no default value. Integer addresses of the EZO modules to be read.
+            period: Float argument, no default value. Time in seconds between two cycles.
+            rt, cycles: see respective descriptions in stream() function.
+            records: Queue argument, no default value. Queue of records consumed by stream() function.
+            stop: Event argument, no default value. Set by stream() function to stop the thread.
+
+    _stream_records(addr, period, rt, cycles, buffer): Generator of stream() function. Starts _stream_worker() thread and yields the records it measures, stopping the thread when closed.
+
+    _stream_put(records, record): Puts record in records queue, dropping oldest records if the queue is full. Returns number of dropped records.
+
+    _stream_end(records, end, stop): Puts end (None at the end of the stream, or the exception raised by the measurement) in records queue after the records left, waiting for room instead of dropping them, unless stop is set (generator closed, nothing read anymore).
+
+    _stats_addr(addr): Returns the address under which the metrics of addr (see description in _check_addr() function) are recorded: the address of the connected EZO module, the factory default address of a not connected EZO module given by its' type, 0 for an incorrect address. Never raises an exception.
+
+    _stats_entry(addr): Returns the metrics of addr address (see stats() and _stats_addr() functions), creating them if needed.
+
+    _observe(addr, cmd, elapsed, slept, polls): Records a completed transaction (command sent, EZO module read) in the metrics of addr address for cmd command.
+            addr, cmd: see respective descriptions in _timeout() function.
+            elapsed: Float argument, no default value. Time in seconds between the command and the reading of the response.
+            slept: Float argument, no default value. Time in seconds slept waiting for the response.
+            polls: Integer argument, no default value. Number of status byte checks made.
+
+    _count_error(error, addr, value): Counts error in the metrics of addr address, and value if error was returned as error value.
+            error, addr: see respective descriptions in _error() function. error is None for the -2000.0 error value (reading not replaced, see read_multi() function), only the value is counted.
+            value: Float argument, no default value. Returned error value, None if error was raised.
+
+    _sleep(seconds, addr=None): Sleeps seconds. All sleeps of the class are made with this function so that they are recorded by the tracer (see trace_start() function) when tracing is enabled.
+            addr: Integer argument, default value: None. I2C address of the EZO module the sleep is waiting for, if any.
+
+    _emit(addr, value, status): Gives value reading of EZO module with addr address and its' status code to the sinks (see sink_add() function) and appends them to its' history (see history_start() function).
+
+    _measure(addr, rt=True, temp=default_temp): Makes a measurement as _query() function (traced when tracing is enabled) and gives it to the sinks. Returns measurement as a tuple (see _read() function). Used by read() and read_multi() functions.
+
+    _measure_t(): Makes a measurement of the RTD EZO module as read_t() function. Returns measurement as a tuple (see _read() function), (-100.0, STATUS_NOT_CONNECTED, _clock() time, None, None) if not connected.
+
+    _traced(name, function, *args): Calls function with args arguments and records the call as a name span of the tracer. Returns the function return value. Used only when tracing is enabled.
+
+    _addr_plan(targets): Returns the "I2C,addr" commands moving the connected EZO modules to their target addresses as two lists of (address, new address) tuples, to be sent in this order: moves of the first wave, then moves out of temporary addresses once the EZO modules moved there rebooted. Each EZO module is moved once, except one per cycle of modules taking each other's address (eg. pH and EC swapped), moved to a free temporary address first. EZO modules whose target address is taken by an I2C module not moving are not moved.
+            targets: Dictionary argument, no default value. {address: target address} of the connected EZO modules.
+        NB: temporary addresses are the lowest addresses not known to be taken, checked with a probe.
+
+    _addr_settle(addresses): Probes addresses until the EZO modules moved there answer (end of reboot) or until the polling deadline (see poll_config() function). Returns the list of addresses not answering.
+
+    _module_locks(addr): Returns a context manager holding the conversation locks of the connected EZO modules of addr list (see submit_read() function). Locks are acquired in address order so that two threads never wait for each other. Wrong or not connected addresses are ignored.
 
     # ========== PUBLIC FUNCTIONS ==========#
 
     scan(): scans all I2C addresses from 1 to 127, detects and stores connected modules types, addresses, versions and default units in private variables accessible through addresses(), sensors(), versions() and units() functions (see description bellow).
         NB.1: detects presence or absence of EZO RTD module (temperature) for "live" temperature compensation option in certain functions described bellow.
         NB.2: NOT TESTED but... supposed to detect presence of "not Atlas Scientific" (3rd party) I2C modules. Their addresses are stored in private variables. Values of their names, versions and units will all be stored respectively as "Unknown sensor", -1.0 and "u".
+        NB.3: if a bus topology cache file was given to the constructor, it is updated with the detected EZO modules.
+        uses functions: _scan_wake(), _scan_probe(), _scan_identify(), _scan_collect()
 
     read(addr, rt=True, temp=default_temp): returns measurement of addresses EZO module. Calls private function _query() (please refer to description above) with same arguments. Returns measurement as float.
             addr, rt, temp: see respective descriptions _write() function.
         uses functions: _query()
 
-    read_t(): returns measurement of RTD EZO module. Calls read() function (please refer to description above) for RDT EZO module measurement. Returns measurement as float.
+    read_t(): returns measurement of RTD EZO module. Calls read() function (please refer to description above) for RDT EZO module measurement. Returns measurement as float. Waits for the end of the background discovery if the RTD EZO module is not discovered yet.
         uses function read()
+        NB.0: valid measurements (in range minH2Otemp - maxH2Otemp) are kept as last measured temperature for speculative temperature compensation (see read_multi() function).
         NB: if RTD EZO module not connected, always returns -100.0. For other error values the function is impacted by class mode. In development mode all other exceptions will be raised. In operation mode please refer to _read() description of error values.
 
     read_ph(rt=False, temp=default_temp): returns measurement of pH EZO module. Calls read() function (please refer to description above) for PH EZO module measurement. Returns measurement as float.
@@ -92,22 +247,59 @@ LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
         uses function read()
         NB: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
 
-    read_multi(addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp): returns measurements of several EZO modules in one go as a list of floats in the same order as the EZO modules addresses in addr list argument.
+    read_multi(addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"): returns measurements of several EZO modules in one go as a list of floats in the same order as the EZO modules addresses in addr list argument.
+            mode: Not case sensitive string argument, default value: "seq". "seq": EZO modules are queried one after the other. "sim": EZO modules are queried simultaneously (see _query_multi() function). "spec": speculative temperature compensation, see NB.2 bellow.
+            form: Not case sensitive string argument, default value: "float". "float": measurements as list of floats (error values included). "record": measurements as list of Reading records (see Reading class). "array": measurements as numpy structured array of READING_DTYPE type, one element per record, so that records can be checked and stored with array operations (eg. readings[readings["status"] == STATUS_OK]["value"]). Raises ImportError if numpy is not installed.
             manual_temp_override: Boolean argument, default value: False. Allows to manually override temperature compensation even when RTD EZO module is connected.
-            addr, mode, rt, override_temp : see respective descriptions of _query_multi() function
-        uses functions: check_addr(), read(), read_t(), _query_multi()
+            addr, rt, override_temp : see respective descriptions of _query_multi() function
+        uses functions: check_addr(), read(), read_t(), _query_multi(), _query_speculative()
         NB.1: This function have a built-in "live" temperature correction option when RTD EZO module is connected that can be used accordingly to the following examples:
                 - read_multi(LIST_OF_ADDRESSES) : reads RTD measurement first and uses it to sequentially querying other EZO modules with addresses contained in LIST_OF_ADDRESSES allowing temperature compensation.
                 - read_multi(LIST_OF_ADDRESSES, "sim") : reads RTD measurement first and uses it to simultaneously querying other EZO modules with addresses contained in LIST_OF_ADDRESSES allowing temperature compensation
+                - read_multi(LIST_OF_ADDRESSES, "spec") : simultaneously queries RTD EZO module and other EZO modules, using the last measured temperature for temperature compensation. Only EZO modules which compensation temperature differs from the new RTD measurement by more than spec_tolerance (0.5°C by default) are queried again with the new temperature. In slow temperature changing systems, this removes the RTD reading stage of almost every read. Behaves as "sim" mode as long as no valid temperature was measured (see read_t() function), when RTD EZO module is not in LIST_OF_ADDRESSES or when rt is False or manual_temp_override is True.
         NB.2: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
+        NB.3: raises ReadMultiError if mode or form is unknown.
 
-    read_all(mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp): returns measurements all connected EZO modules by calling read_multi(). Returns measurements as floats list in the following order of connected EZO modules : ["rtd", "ph", "ec", "do", "orp"]
+    read_all(mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"): returns measurements all connected EZO modules by calling read_multi(). Returns measurements as floats list in the following order of connected EZO modules : ["rtd", "ph", "ec", "do", "orp"]
             mode, rt, override_temp : see respective descriptions of _query_multi() function
+            form: see description in read_multi() function.
         uses functions: read_multi()
         NB: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
 
+    stream(rate=1.0, sensors=None, rt=True, cycles=None, buffer=4): returns a generator yielding timestamped readings of several EZO modules on a fixed schedule. Each yielded record is a dictionary {"cycle": cycle number, "timestamp": time.time() at cycle start, "monotonic": _clock() at cycle start, "addresses": list of addresses, "readings": list of floats in the same order, "statuses": list of their' status codes (see Reading class), "dropped": number of records dropped (skipped cycles included) so far}.
+            rate: Float argument, default value: 1.0. Number of cycles per second. Cycles start at fixed times on the monotonic clock (no drift). Each EZO module is sent the command of the next cycle as soon as it is read, while slower EZO modules are still measuring. If a cycle takes longer than its' period, the missed cycles are skipped (cycle numbers are not consecutive, skipped cycles are counted as dropped) and the schedule is kept.
+            sensors: List argument, default value: None. Addresses of the EZO modules to be read (see description of addr in _check_addr() function). All connected EZO modules if None.
+            rt: Boolean argument, default value: True. Temperature compensation of pH, EC and DO EZO modules. If the RTD EZO module is read, compensation uses the temperature measured at the previous cycle, so that all EZO modules are queried at once (the temperature is measured once before the first cycle). Otherwise default_temp is used.
+            cycles: Integer argument, default value: None. Number of measured cycles (skipped ones not included) after which the generator stops. Never stops if None.
+            buffer: Integer argument, default value: 4. Maximum number of records waiting for the consumer. Measurements are made by a background thread while records are consumed. If the consumer is too slow and the buffer is full, the oldest record is dropped.
+        uses functions: _check_addr(), read_t(), _query_multi(), _stream_records(), _stream_worker(), _stream_put(), _stream_end()
+        NB.1: arguments are checked when stream() is called (StreamError raised if incorrect). No other function of the class should be called while streaming. The background thread is stopped when the generator is closed (eg. break out of a for loop).
+        NB.2: function impacted by class mode. Exceptions raised in the background thread are raised by the generator. In operation mode please refer to _read() description of error values.
+
+    continuous(addr, period=1): puts EZO module with addr address in continuous mode with "C,period" command: the module makes a reading every period seconds on its' own, the latest one being read with read_latest() without any command nor sleep. The mode of the module before the first call is queried with "C,?" command and restored by close(). Returns True if the module accepted the command, False otherwise.
+            addr: see description in _check_addr() function
+            period: Integer argument, default value: 1. Seconds between two readings (1-99). 0 leaves continuous mode.
+        uses functions: _check_addr(), _send(), _read_raw()
+        NB.1: readings in continuous mode are temperature compensated with the last value given to the module (see set_t() function). Only "C,?", "C,n" and read_latest() block reads should be sent to a module in continuous mode, any other command replaces the latest reading by its' own response until the next reading.
+        NB.2: EZO modules not supporting continuous mode in I2C mode answer "C,?" with a syntax error: False is returned and read_latest() reads them on demand. Raises ContinuousError if period is not an integer in range 0-99. Other errors are impacted by class mode. In development mode all exceptions will be raised. In operation mode False is returned.
+
+    read_latest(addr, rt=True, temp=default_temp): returns the latest reading of EZO module with addr address in continuous mode with one block read, without command nor sleep. Modules not in continuous mode (or before their first reading) are read on demand with read(addr, rt, temp). A module found out of continuous mode (no reading in its' response) is read on demand from then on.
+            addr, rt, temp: see respective descriptions _write() function.
+        uses functions: _check_addr(), _read_raw(), _parse(), read()
+        NB: function impacted by class mode. In development mode all exceptions will be raised. In operation mode please refer to _read() description of error values.
+
+    output(addr, params=None): returns the list of output parameters of EC or DO EZO module with addr address, in the order of its' responses, queried once with "O,?" command then kept. If params is given, the parameters of the list are enabled and the other ones are disabled ("O,param,1" and "O,param,0" commands, only for parameters changing) before the new list is returned.
+            addr: see description in _check_addr() function.
+            params: List of strings argument, default value: None. Non case sensitive parameters names among ["ec", "tds", "s", "sg"] (EC, TDS, salinity, specific gravity) for EC EZO modules, ["mg", "%"] (mg/L, % saturation) for DO EZO modules.
+        uses functions: _check_addr(), _send(), _read_raw()
+        NB.1: read() and the other reading functions return the first enabled parameter. All parameters of a reading are given by the fields attribute of its' record (see Reading class and read_multi() "record" form), so that one query gives all of them. Unless all parameters are enabled, they are named once the output configuration was queried or set by this function: reading functions never send "O,?" command.
+        NB.2: raises OutputError if the EZO module is not an EC or DO one or if params contains an unknown parameter. Other errors are impacted by class mode. In development mode all exceptions will be raised. In operation mode None is returned.
+
+    latest_age(addr): returns the age in seconds of the last reading returned by read_latest() for EZO module with addr address (0.0 if read on demand), estimated from the time continuous mode was set and its' period. None if never read with read_latest().
+
     set_t(temp=default_temp): manually setting temperature for temperature compensation to all EZO modules allowing this option by sending "T,temp" command to them.
             temp: see description in _write() function.
+        uses functions: _send()
 
     sleep(addr): puts EZO module with addr address to sleep.
             addr: see description in _check_addr() function
@@ -133,20 +325,106 @@ LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
     addr_change(old_addr, new_addr): changes I2C address of EZO module with old_addr address to new_addr address using "I2C,new_addr" command
             old_addr: see definition of addr in _check_addr() function
             new_addr: Integer argument, default value: none. New desired address for EZO module. Must be an integer in range of 1-127 and not be atributed to an already connected EZO module.
-        NB: old_addr is replaced by new_addr in private self._addresses list. However it is NOT replaced automatically in any address list or variable in the code calling this class function! It is very strongly recommended to update any address list or variable with addresses() function right after calling addr_change() function.
+        NB: old_addr is replaced by new_addr in private self._addresses list, in the latency model and in the bus topology cache file if any. However it is NOT replaced automatically in any address list or variable in the code calling this class function! It is very strongly recommended to update any address list or variable with addresses() function right after calling addr_change() function.
 
-    addr_reset(): resets connected EZO modules's addresses to default values.
+    addr_reset(): resets connected EZO modules's addresses to default values with the minimal number of "I2C,addr" commands (see _addr_plan() function). Commands not depending on each other are sent at once so that the EZO modules reboot in parallel, then each new address is checked with one probe.
+        uses functions: _addr_plan(), _addr_settle(), _save_topology()
         NB.1: default addresses are: RTD = 102, pH = 99, EC = 100, DO = 97 and ORP = 98
-        NB.2: rather time consuming function. For 3 connected sensors the execution time is about 12 seconds.
+        NB.2: addresses are the ones detected by the last scan() (or bus topology cache check). The execution time is about one reboot of an EZO module (two if some modules swap addresses), whatever the number of connected EZO modules.
+        NB.3: if an EZO module doesn't answer at its' new address, scan() is called to update the connected EZO modules. In development mode AddrChangeError is then raised.
 
     mode_change(mode=""): changes class mode.
             mode: Non-case sensitive string argument, default value: Void. If called without this argument, the function changes class mode from "op" to "dev" or the other way around. If mode argument is given as "op" or "dev" in the function call, it changes the class mode to adequate mode.
 
+    poll_config(poll=True, first=None, interval=None, backoff=None, max_interval=None, deadline=None): activates or deactivates ready-polling and sets its' timings. Arguments left to None keep their current value.
+            poll: Boolean argument, default value: True. See description in Constructor above.
+            first: Float argument. Time in seconds slept after sending a command before the first check of the status byte (0.25 sec (250ms) by default).
+            interval: Float argument. Time in seconds slept between the first and the second check of the status byte (0.02 sec (20ms) by default).
+            backoff: Float argument. Factor applied to the interval after each check of the status byte (1.5 by default).
+            max_interval: Float argument. Maximum time in seconds slept between two checks of the status byte (0.1 sec (100ms) by default).
+            deadline: Float argument. Hard deadline in seconds after sending a command after which the EZO module is read whatever its' status byte (2.0 sec by default).
+        NB: raises PollConfigError if one of the given timings is not a positive number, or if backoff is smaller than 1.
+
+    latency(addr=None): returns the latency model of connected EZO modules as a dictionary {address: {"sensor": name, "version": version, command: {"timeout": seconds, "ewma": seconds, "samples": count}}}. "ewma" and "samples" are None and 0 for commands which latency was not learned yet.
+            addr: see description in _check_addr() function. If given, only the model of this EZO module is returned ({command: {...}}).
+
+    latency_config(alpha=None, margin=None): sets latency model parameters. Arguments left to None keep their current value.
+            alpha: Float argument. Weight of a new observed completion time in the moving average, in range ]0, 1] (0.2 by default).
+            margin: Float argument. Relative safety margin, in range [0, 1[, added to the learned latency for sleep timeouts and removed from it for the first status byte check in poll mode (0.15 by default).
+        NB: raises LatencyConfigError if one of the arguments is out of range.
+
+    latency_reset(addr=None): forgets learned latencies. Default timeouts are used again.
+            addr: see description in _check_addr() function. If given, only the latencies of this EZO module are forgotten.
+
+    latency_save(path): saves learned latencies to a JSON file.
+            path: String argument, no default value. Path of the file.
+
+    latency_load(path): loads learned latencies from a JSON file saved with latency_save(). Learned latencies of an address are only used if the EZO module connected to it is still of the same type and version.
+            path: see description in latency_save() function.
+        NB: raises LatencyFileError if the file content is not a latency model.
+
+    stats(addr=None): returns the metrics recorded since construction (or last stats_reset()) as a dictionary {address: {"commands": {command: {"count": transactions, "sum": seconds, "buckets": counts, "sleep": seconds, "polls": checks}}, "errors": {exception name: count}, "sentinels": {error value: count}}}. Per command: number of transactions and total time from command to reading, number of transactions per latency histogram bucket (upper bounds in stats_buckets, last bucket for longer ones), time slept waiting for the responses and number of status byte checks. Per address: number of EZOnotConnected, EZOnotReady and EZOError errors (raised or returned) and number of each error value returned in operation mode (-2000.0 included).
+            addr: see description in _check_addr() function. If given, only the metrics of this EZO module are returned ({} if none recorded).
+        NB: metrics are keyed by integer address (see _stats_addr() function): errors of a not connected EZO module given by its' type (eg. "do" for read_do() without DO EZO module) are recorded under its' factory default address, errors of incorrect addresses under address 0. Metrics follow the EZO modules whose address is changed by addr_change() and addr_reset().
+
+    stats_reset(addr=None): forgets recorded metrics.
+            addr: see description in stats() function. If given, only the metrics of this EZO module are forgotten.
+
+    stats_export(path): writes recorded metrics to a file in Prometheus text exposition format (eg. for node_exporter textfile collector). The file is replaced atomically.
+            path: String argument, no default value. Path of the file.
+        NB: exported metrics are atlas_ezo_transaction_seconds (histogram), atlas_ezo_sleep_seconds_total, atlas_ezo_status_checks_total, atlas_ezo_errors_total and atlas_ezo_error_values_total, labelled with bus, address, sensor and command or error.
+
+    sink_add(sink): adds sink to the functions receiving every reading made by read() (and the functions using it), _query_multi() (read_multi() "sim" and "spec" modes, stream()) and read_latest(), as sink(sensor, addr, value, timestamp, status) call: sensor name (address as string if unknown), integer address of the EZO module (as given if not connected), reading (error values included, see _read() description), _clock() time at which the reading was made and status code of the reading (see Reading class), which tells error values from identical valid readings. Used by the time-series store of atlas_hydro_store.py (HydroStore.sink() function).
+            sink: Function argument, no default value.
+        NB: sinks are called in the thread making the reading, exceptions raised by a sink are raised by the reading function. Readings of read_multi() in "sim" mode are given once the last EZO module is read.
+
+    sink_remove(sink): removes sink from the functions receiving the readings.
+
+    history_start(capacity=4096): starts keeping the recent readings of every connected EZO module in memory: the functions giving readings to the sinks (see sink_add() function) append them to a ring buffer of the module, whose oldest readings are overwritten once full. Restarts with empty buffers if already started.
+            capacity: Integer argument, default value: 4096. Number of readings kept per EZO module (18 bytes per reading, allocated at once by history_start() for every connected EZO module, or when an EZO module is discovered afterwards).
+        NB.1: readings are kept as three arrays (_clock() time of the reading, reading, status code) per EZO module: appending a reading allocates nothing and the memory used does not grow with time.
+        NB.2: raises HistoryError if capacity is not a positive integer.
+
+    history_stop(): stops keeping the readings and forgets the kept ones.
+
+    history(addr, last=None, since=None): returns the kept readings of EZO module with addr address in time order, as a (timestamps, readings, statuses) tuple of arrays: numpy arrays if numpy is installed, array module arrays ("d", "d" and "H" types) otherwise. Timestamps are _clock() times. Error values are kept (see _read() description) with their' status code (see Reading class).
+            addr: see description in _check_addr() function.
+            last: Integer argument, default value: None. Only the last readings are returned. All kept readings if None.
+            since: Float argument, default value: None. Only the readings made at this _clock() time or later are returned (eg. _clock() - 180 for the last three minutes). All kept readings if None.
+        NB: raises HistoryError if history_start() was not called.
+
+    history_resample(addr, period, since=None): returns the mean reading of EZO module with addr address per period, as a (start times, means) tuple of arrays (same types as history() function). Periods are consecutive from the first kept reading (or from since), start times are _clock() times. Readings whose status is not STATUS_OK are skipped, periods without valid reading are NaN.
+            addr, since: see respective descriptions in history() function.
+            period: Float argument, no default value. Length of the periods in seconds.
+        NB: raises HistoryError if history_start() was not called or if period is not a positive number. Vectorised with numpy if installed.
+
+    trace_start(size=100000): starts recording the bus timeline: every command written, response read (status byte checks of a still processing EZO module appear as "poll"), probe, slave address selection ioctl (SMBusTransport) and sleep, with its' start and end times (_clock()) and I2C address, plus the spans of read(), _query_multi(), set_t() and scan() calls. Restarts with an empty timeline if already started.
+            size: Integer argument, default value: 100000. Maximum number of recorded events. The oldest events are dropped once reached.
+        NB: when tracing is disabled (default), the only cost left on the measurement path is one attribute check per function call.
+
+    trace_stop(): stops recording the bus timeline. The recorded timeline is kept for trace_export().
+
+    trace_export(path): writes the recorded bus timeline to a Chrome Trace Event JSON file, to be opened with chrome://tracing or https://ui.perfetto.dev. Each I2C address has its' own lane, function spans and sleeps not related to an EZO module are on "AtlasHydroTools" lane.
+            path: String argument, no default value. Path of the file.
+        NB: raises TraceError if trace_start() was never called.
+
     cmd(addr, cmd): sends custom command to EZO module with address addr. USE AT YOUR OWN RISK...
             addr: see definition of addr in _check_addr() function.
             cmd: String argument, no default value. Should correspond to any commands described in Atlas Scientific EZO modules datasheets (examples: "R", "RT,temp", "I", "Find", "Cal,mid,7.00", etc...)
         NB: function impacted by class mode. In development mode all exceptions will be raised. In operation mode NO EXCEPTION WILL BE RAISED WHAT SO EVER...
 
+    submit_read(addr, rt=True, temp=default_temp): schedules read(addr, rt, temp) on a thread pool and returns a concurrent.futures.Future of the measurement (float), so that the conversion times of several EZO modules overlap. The pool has one thread per EZO module type and is shut down by close().
+            addr, rt, temp: see respective descriptions _write() function.
+        uses functions: read()
+        NB.1: the class can be used from several threads. Each I2C transaction (command written, response read, probe) is made under the bus lock, never held while EZO modules are processing commands, so that transactions of different threads never interleave. Each EZO module is queried by one thread at a time: a command and the reading of its' response are made under the conversation lock of the module (read(), read_multi(), set_t() and cmd() functions). Learned latencies and metrics are updated under a lock. scan(), addr_change() and addr_reset() change the connected EZO modules and should not be called while other threads use the object.
+        NB.2: raises ImportError if concurrent.futures is not available ("futures" package needed on python2). Exceptions raised by read() (development mode) are raised by the result() function of the Future.
+
+    ready(): returns a concurrent.futures.Future done once the connected EZO modules are known: at once with background=False, at the end of the background discovery otherwise. Its' result is True, in development mode it raises the exception raised by the background discovery if any. ready().done() tells whether the discovery is over without waiting, ready().add_done_callback(function) calls function once it is.
+
+    wait_ready(timeout=None): waits for the end of the background discovery. Returns True if done, False if timeout (in seconds) elapsed before.
+        NB.1: during the background discovery, EZO modules already discovered can be read at once. Functions addressing an EZO module not discovered yet (read(), read_t(), read_ph(), etc..., see _check_addr() function) wait until it is discovered (or until the end of the discovery if not connected), read_all() waits for the end of the discovery. EZO modules at their factory default address are discovered first (in about one "I" command processing time), then all other addresses are swept. addresses(), sensors(), versions() and units() return the EZO modules discovered so far.
+        NB.2: in development mode, an exception raised by the background discovery is raised by wait_ready(). In operation mode the EZO modules discovered before the exception are kept.
+
     addresses(): returns list of connected EZO modules addresses' as list of integers.
 
     sensors(): returns list of connected EZO modules names' as list of strings.
@@ -155,12 +433,147 @@ LIBRARY FUNCTIONS' AND ARGUMENTS' DESCRIPTION:
 
     units(): returns list of connected EZO modules units' as list of strings.
 
+    # ========== READING RECORD CLASS ==========#
+
+    Reading(value, status, address, sensor, timestamp, temp, fields=None): One measurement of an EZO module (see read_multi() "record" form). Attributes (__slots__, no dictionary per record):
+            value: Float. Measurement, or error value if status is not STATUS_OK (see _read() description).
+            status: Integer. STATUS_OK (0), STATUS_NOT_CONNECTED (100), STATUS_NOT_READY (200), STATUS_ERROR (1000) or STATUS_NOT_REPLACED (2000), same codes as atlas_hydro_store.py.
+            address: Integer address of the EZO module (as given to read_multi() if not connected).
+            sensor: String. Name of the EZO module (see sensors() function), address as string if not connected.
+            timestamp: Float. _clock() time at which the read command was sent (start of the measurement).
+            temp: Float. Compensation temperature sent with "RT" command, None if the EZO module was read with "R" command (no or last transmitted compensation).
+            fields: Dictionary. All output parameters of the response {parameter: value} (eg. {"ec": 1413.0, "tds": 763.0, "s": 0.69, "sg": 1.0}), named as in output() function, the sensor name for EZO modules with one parameter (eg. {"ph": 7.0}). {} for an error value or if the parameters can't be named (output configuration of an EC or DO EZO module with some parameters disabled not queried yet, see output() function).
+
+    ok(): returns True if status is STATUS_OK.
+
+    READING_DTYPE: numpy dtype description of the elements of read_multi() "array" form: value (float64), status (uint16), address (uint8, 0 if not connected and given as string), sensor (unicode string of 16 characters), timestamp (float64) and temp (float64, NaN for None). Fields are not included.
+
+    # ========== I2C TRANSPORT CLASSES ==========#
+
+    All I2C communication of AtlasHydroTools goes through a transport object offering send(), read(), probe() and close() functions described bellow. Any object offering them can be given to the constructor, subclassing Transport is not required. The constructor wraps it so that its' functions are called under the bus lock (see submit_read() function).
+
+    Transport(bus=1): Abstract base class of the transports: subclasses must define send(), read() and probe() functions (close() does nothing by default). Keeps the encoded frames (command + null character) of fixed commands ("R", "I", "Sleep", "L,0", "L,1") and of the last parameterised commands (eg. "RT,23.2") so that they are not encoded again at every call.
+            bus: Integer argument, default value: 1. See description in AtlasHydroTools constructor.
+
+    send(addr, cmd): sends cmd command (String argument, without terminating null character) to EZO module with addr address.
+
+    read(addr, length=16): reads length bytes of response from EZO module with addr address. Returns bytes as list of integers (status byte first).
+        NB: transports given to the constructor whose read() function takes no length argument (read(addr), previous interface) are still accepted: their' responses are read with the length they choose, which may cut the responses of EC and DO EZO modules with several output parameters.
+
+    probe(addr): raises IOError/OSError if no I2C module answers at addr address.
+
+    frame(cmd): returns encoded frame of cmd command, from the frames cache if possible.
+
+    close(): closes the bus.
+
+    SMBusTransport(bus=1) ("smbus"): Sends one char commands and reads responses through smbus module, sends other commands through a raw file stream. Remembers the slave address currently selected on the file stream so that the I2C_SLAVE ioctl is only made when the addressed EZO module changes.
+
+    SMBus2Transport(bus=1) ("smbus2"): Same as SMBusTransport, using smbus2 module (pure python) instead of smbus.
+
+    RawTransport(bus=1) ("raw"): Makes all communication through one file descriptor with I2C_RDWR ioctl message batches. No python module is needed and no slave address is selected: every message carries its' address. A command is one write message and a response read is one combined write (0x32 register byte) + read message batch, so each is made in a single kernel round trip.
+        NB: one char commands are sent with their terminating null character (eg. "R" + "\00"), as done by atlas_scientific_nru.py.
+
+    MemoryTransport(bus=1, devices=None): In-memory bus without any I2C hardware, for tests and simulations.
+            devices: Dictionary argument, default value: None (empty bus). {address: device} of the devices on the bus. A device should offer command(cmd) function receiving the commands sent to it and response(length) function returning its' response as a list of length integers. Missing addresses behave as not connected I2C modules (IOError raised).
+
+    # ========== MULTI-BUS CLASS ==========#
+
+    MultiBusHydroTools(buses=(1,), mode="op", silent=True, keep_awake=True, poll=False, cache=None, transport="smbus"): Manages several I2C buses (several Tentacle hats, soft-I2C buses, etc...) in one object. One AtlasHydroTools object and one worker thread are created per bus, so that measurements on different buses are made truly in parallel while each bus is only used by its' own worker.
+            buses: List of integers argument, default value: (1,). Numbers of the I2C buses, each one given once (BusError raised otherwise). AtlasHydroTools objects of all buses are constructed in parallel.
+            mode, silent, keep_awake, poll: see respective descriptions in AtlasHydroTools constructor.
+            cache: String argument, default value: None. Path of the bus topology cache files, in which "{bus}" is replaced by the bus number (eg. "/var/cache/ezo_{bus}.json"). See description in AtlasHydroTools constructor.
+            transport: String argument, default value: "smbus". Name of the I2C backend used on every bus. See description in AtlasHydroTools constructor.
+        NB: EZO modules are addressed by (bus, addr) tuples, addr being as described in _check_addr() function.
+
+    submit(bus, function, *args): queues call of function with args arguments to the worker of bus. function is either the name of an AtlasHydroTools function (eg. "read") or a function taking the AtlasHydroTools object of the bus as first argument. Returns a job whose result(timeout=None) function waits for and returns the result of the call (or raises its' exception).
+
+    run(bus, function, *args): same as submit() but waits for and returns the result of the call.
+
+    read(addr, rt=True, temp=default_temp): returns measurement of EZO module addr (a (bus, addr) tuple) as float. See description in AtlasHydroTools read() function.
+
+    read_multi(addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"): returns measurements of several EZO modules given as a list of (bus, addr) tuples, as a list of floats (Reading objects or structured array, depending on form) in the same order. Modules are grouped by bus and buses are read in parallel. See description in AtlasHydroTools read_multi() function for other arguments.
+        NB: raises ReadMultiError or BusError before any bus is read if mode, form or any bus is incorrect. Addresses of Reading objects and structured array are the ones on their' bus.
+
+    read_all(mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"): returns measurements of all connected EZO modules of all buses as a list of floats in the same order as addresses(). Buses are read in parallel, so the function takes as long as the slowest bus rather than the sum of all buses. "Live" temperature compensation uses the RTD EZO module of each bus.
+
+    set_t(temp=default_temp): sends "T,temp" command to all EZO modules allowing it on all buses in parallel.
+
+    buses(): returns list of managed buses numbers.
+
+    bus(bus): returns AtlasHydroTools object of bus. USE WITH CARE: calls to this object are not serialised with its' worker, please prefer submit() or run().
+
+    addresses(), sensors(), versions(), units(): same as AtlasHydroTools functions for all buses. addresses() returns a list of (bus, address) tuples.
+
+    close(): closes the AtlasHydroTools objects (see AtlasHydroTools close() function) and stops the workers. No function using the buses can be called afterwards (BusError raised). Should be called explicitly when done, or the object used as a context manager (with MultiBusHydroTools(...) as buses: ...). Also called by the destructor.
+
 '''
 
-import smbus
+import abc
 import fcntl
 import time
+import os
+import errno
+import ctypes
+import json
 import io
+import heapq
+import inspect
+import bisect
+import copy
+import array
+import threading
+from collections import OrderedDict, deque
+
+try:
+    import queue
+except ImportError:  # python2
+    import Queue as queue
+
+try:
+    from concurrent import futures
+except ImportError:  # python2 without "futures" package
+    futures = None
+
+try:
+    import numpy
+except ImportError:  # history() arrays returned as array module arrays.
+    numpy = None
+
+_clock = getattr(time, "monotonic", time.time)  # monotonic clock for timeouts and deadlines (time.time on python2).
+
+I2C_SLAVE = 0x703  # ioctl request selecting the I2C slave address of a file stream (0x703 by default).
+I2C_RDWR = 0x707  # ioctl request making a batch of I2C messages in one transaction (0x707 by default).
+I2C_M_RD = 0x1  # flag of I2C messages reading from the slave (0x1 by default).
+
+# status codes of the reading records (please refer to Reading class description in this file header).
+STATUS_OK = 0
+STATUS_NOT_CONNECTED = 100  # -100.0 error value.
+STATUS_NOT_READY = 200  # -200.0 error value.
+STATUS_ERROR = 1000  # -1000.0 error value.
+STATUS_NOT_REPLACED = 2000  # -2000.0 error value.
+
+READING_DTYPE = [("value", "f8"), ("status", "u2"), ("address", "u1"), ("sensor", "U16"), ("timestamp", "f8"), ("temp", "f8")]  # numpy structured array of read_multi() "array" form.
+
+
+class Reading(object):
+
+    __slots__ = ("value", "status", "address", "sensor", "timestamp", "temp", "fields")
+
+    def __init__(self, value, status, address, sensor, timestamp, temp, fields=None):
+        self.value = value
+        self.status = status
+        self.address = address
+        self.sensor = sensor
+        self.timestamp = timestamp
+        self.temp = temp
+        self.fields = fields if fields is not None else {}
+
+    def __repr__(self):
+        return "Reading(" + ", ".join(name + "=" + repr(getattr(self, name)) for name in self.__slots__) + ")"
+
+    def ok(self):
+        return self.status == STATUS_OK
+
 
 class AtlasHydroTools:
 
@@ -175,21 +588,75 @@ class AtlasHydroTools:
 
     # ========== CONSTRUCTOR/DESTRUCTOR (please refer to descriptions in this file header) ==========#
 
-    def __init__(self, mode="op", silent=True, keep_awake=True):
+    def __init__(self, mode="op", silent=True, keep_awake=True, poll=False, cache=None, autoscan=True, bus=1, transport="smbus", background=False):
 
         self.silent = silent  # defining silent behaviour of the class.
         self.keep_awake = keep_awake  # defining class handling of putting to sleep connected EZO modules in class destructor.
 
-        self._def_bus = 1  # default bus (1 by default).
-        self._I2C_SLAVE = 0x703  # needed fro the io operations (0x703 by default).
+        self._def_bus = bus  # I2C bus (1 by default).
         self._def_sensors = ["rtd", "ph", "ec", "do", "orp"] # default sensors names and their prefered list order (["rtd", "ph", "ec", "do", "orp"] by default).
         self._def_units = ["°C", "", "uS/cm", "mg/L", "mV"]  # list of EZO modules' units for print purposes. Should be same order as in self.def_addresses (["°C", "", "uS/cm", "mg/L", "mV"] by default).
         self._long_timeout = .9  # sleep timeout period for pH (R and RT commands), EC (R and RT commands) and DO (RT command) EZO modules (0.9 sec (900ms) by default).
         self._medium_timeout = .6  # sleep timeout period for RTD (R command), DO (R command) ORP (R command) EZO modules (0.6 sec (600ms) by default).
         self._short_timeout = .3  # sleep timeout period for set_t function and other EZO modules commands (0.3 sec (300ms) by default).
 
-        self._file_write = io.open("/dev/i2c-" + str(self._def_bus), "wb", buffering=0)  # used to send commands to EZO modules of more than one char (eg. "RT,23.2").
-        self._bus = smbus.SMBus(self._def_bus)  # used to send one char commands to EZO modules and read from EZO modules.
+        # default timeout per EZO module type and read command. Used until the latency of a module is learned (please refer to latency() description in this file header).
+        self._def_latency = {"rtd": {"R": self._medium_timeout},
+                             "ph": {"R": self._long_timeout, "RT": self._long_timeout},
+                             "ec": {"R": self._medium_timeout, "RT": self._long_timeout},
+                             "do": {"R": self._medium_timeout, "RT": self._long_timeout},
+                             "orp": {"R": self._long_timeout}}
+        self._latency = {}  # learned latencies {address: {"sensor": name, "version": version, command: [ewma, samples]}}.
+        self._latency_alpha = .2  # weight of a new observation in the latency moving average (0.2 by default).
+        self._latency_margin = .15  # relative safety margin around the learned latency (0.15 by default).
+
+        # metrics of the transactions and errors (please refer to stats() description in this file header).
+        self.stats_buckets = (.05, .1, .25, .5, .75, 1.0, 1.5, 2.0, 5.0)  # upper bounds (in seconds) of the transactions latency histogram buckets.
+        self._stats = {}  # {address: {"commands": {command: {"count", "sum", "buckets", "sleep", "polls"}}, "errors": {name: count}, "sentinels": {value: count}}}.
+
+        self._tracer = None  # bus timeline tracer, None when tracing is disabled (please refer to trace_start() description in this file header).
+        self._last_tracer = None  # last stopped tracer, kept for trace_export().
+        self._sinks = []  # functions receiving every reading (please refer to sink_add() description in this file header).
+        self._history = None  # {address: _Ring} recent readings of EZO modules, None when not kept (please refer to history_start() description in this file header).
+        self._history_capacity = 4096  # number of readings kept per EZO module (4096 by default).
+
+        # EZO modules in continuous mode (please refer to continuous() description in this file header).
+        self._continuous = {}  # {address: {"period": seconds, "start": _clock() time of "C,period" command}} of EZO modules in continuous mode.
+        self._prior_modes = {}  # {address: period} continuous mode of EZO modules before their first continuous() call, restored by close().
+        self._ages = {}  # {address: seconds} age of the last reading returned by read_latest().
+
+        # ready-polling of EZO modules status byte instead of sleeping whole timeouts (please refer to poll_config() description in this file header).
+        self.poll = poll
+        self._poll_first = .25  # sleep period before first status byte check (0.25 sec (250ms) by default).
+        self._poll_interval = .02  # sleep period between first and second status byte checks (0.02 sec (20ms) by default).
+        self._poll_backoff = 1.5  # factor applied to the sleep period after each status byte check (1.5 by default).
+        self._poll_max_interval = .1  # maximum sleep period between two status byte checks (0.1 sec (100ms) by default).
+        self._poll_deadline = 2.0  # hard deadline after which the EZO module is read whatever its' status (2.0 sec by default).
+
+        # thread safety (please refer to submit_read() description in this file header).
+        self._bus_lock = threading.Lock()  # held during each I2C transaction only, never while EZO modules are processing commands.
+        self._conversations = {}  # {address: RLock} held from a command sent to an EZO module to the reading of its' response.
+        self._state_lock = threading.Lock()  # protects learned latencies and metrics.
+        self._executor = None  # thread pool of submit_read(), created at first call.
+
+        # discovery of connected EZO modules (please refer to wait_ready() description in this file header).
+        self._ready = threading.Event()  # set once the connected EZO modules are known.
+        self._discovered = threading.Condition()  # notified every time an EZO module is discovered.
+        self._discovery = None  # background discovery thread.
+        self._discovery_error = None  # exception raised by the background discovery, raised again by wait_ready() in development mode.
+        self._ready_future = futures.Future() if futures is not None else None  # returned by ready(), done with the discovery.
+
+        # I2C backend used to send commands to EZO modules and read from EZO modules, its' transactions serialised by the bus lock.
+        if isinstance(transport, str):
+            if transport.lower() not in _transports:
+                raise TransportError
+            transport = _transports[transport.lower()](self._def_bus)
+        elif not all(callable(getattr(transport, function, None)) for function in ["send", "read", "probe", "close"]):
+            raise TransportError
+        if not _UnsizedTransport.sized(transport):
+            transport = _UnsizedTransport(transport)
+        self._transport = _LockedTransport(transport, self._bus_lock)
+        self._closed = False  # set by close().
 
         # way that the class handles exceptions.
         if mode == "dev":
@@ -201,322 +668,1088 @@ class AtlasHydroTools:
         self.minH2Otemp = 0.0
         self.maxH2Otemp = 100.0
 
+        # speculative temperature compensation (please refer to read_multi() description in this file header).
+        self.spec_tolerance = 0.5  # maximum difference (in °C) between assumed and measured temperature not triggering a new compensated query (0.5°C by default).
+        self._last_temp = None  # last valid temperature measured by RTD EZO module (None until measured).
+
         self._no_rt = ["rtd", "orp"]  # EZO modules that do not have temperature correction function.
 
+        # output parameters of EZO modules (please refer to output() description in this file header).
+        self._def_outputs = {"ec": ["ec", "tds", "s", "sg"], "do": ["mg", "%"]}  # parameters of EZO modules with several ones, in their responses order.
+        self._outputs = {}  # {address: enabled parameters} queried with "O,?" command.
+        self._lengths = {}  # {address: bytes} response length read from EZO modules.
+
+        self._topology_cache = cache  # path of the bus topology cache file (None by default, no cache).
+
         if not silent:
             print("\nAtlasScientific class constructed with following parameters:")
             print("\tErrors management mode:", self.mode)
             print("\tSilent mode:", self.silent, "(obviously... if you are reading this message)")
             print("\tGoing to keep EZO modules awake at end of code:", self.keep_awake)
+            print("\tReady-polling of EZO modules:", self.poll)
+            print("\tBus topology cache:", self._topology_cache)
+            print("\tBackground discovery:", autoscan and background)
+            print("\tI2C transport:", type(self._transport.transport).__name__)
+
+        # lists of connected EZO modules' addresses, names, versions and units (filled by scan() or _load_topology()).
+        self._init_addresses = []
+        self._init_sensors = []
+        self._init_versions = []
+        self._init_units = []
+        self._addresses = []
+        self._sensors = []
+        self._versions = []
+        self._units = []
+        self._rtd = False
 
-        self.scan()  # scanning and initialising connected modules.
+        if autoscan and background:  # discovery made by a background thread, the constructor returns at once.
+            self._discovery = threading.Thread(target=self._discover, name="AtlasHydroTools discovery")
+            self._discovery.daemon = True
+            self._discovery.start()
+        else:
+            if autoscan and (cache is None or not self._load_topology()):
+                self.scan()  # scanning and initialising connected modules.
+            self._set_ready()
 
     def __del__(self, keep_awake=False):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if getattr(self, "_closed", True):  # constructor failed before the transport was opened, or already closed.
+            return
+        self._closed = True
+        if self._discovery is not None:
+            self._discovery.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        for addr, prior in self._prior_modes.items():  # restoring continuous mode of EZO modules changed by continuous().
+            if self._continuous.get(addr, {}).get("period", 0) != prior:
+                try:
+                    self._transport.send(addr, "C," + str(prior))
+                except (IOError, OSError):
+                    pass
         keep_awake = self.keep_awake
         if not keep_awake:
             if not self.silent:
                 print("Putting to sleep all connected modules...")
             for addr in self._addresses:
-                cmd = "sleep" + "\00"
-                fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-                self._file_write.write(cmd.encode('latin-1'))
-        self._bus.close()
+                self._transport.send(addr, "sleep")
+        self._transport.close()
 
 
 # ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
 
-    def _check_addr(self,addr):
-        if isinstance(addr, bool):
-            raise AddrTypeError
-        elif isinstance(addr, int):
-            if addr in range(1, 128):
-                if addr in self._addresses:
-                    return addr
-                else:
-                    raise EZOnotConnected
-            else:
-                raise AddrRangeError
-        elif isinstance(addr, str):
-            if addr in self._sensors:
-                return self._addresses[self._sensors.index(addr)]
-            elif addr in self._def_sensors:
-                raise EZOnotConnected
-            else:
-                raise AddrRangeError
-        else:
-            raise AddrTypeError
-
-    def _write(self, addr, rt=True, temp=default_temp):
-        addr = self._check_addr(addr)
-        if not rt or self._sensors[self._addresses.index(addr)] in self._no_rt:  # queries of RTD and ORP sensors are made with "R" command as they don't have temperature compensation function.
-            self._bus.write_byte(addr, ord("R"))
-            if not self.silent:
-                print("cmd sent: \"R\" to I2C address", addr)
-        else:  # queries of all other sensor is made with "RT,temperature" command for temperature compensation.
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-            if self.minH2Otemp < temp < self.maxH2Otemp:
+    def _identify(self, info):
+        if len(info) > 0 and info[0] == "?" and info.count(",") == 2:
+            sensor = str(info.split(",")[1]).lower()
+            try:
+                return sensor, float(info.split(",")[2]), self._def_units[self._def_sensors.index(sensor)]
+            except ValueError:  # other EZO module type (eg. "?I,RGB,1.0") or invalid version.
                 pass
-            else:
-                temp = self.default_temp
-            cmd = "RT," + str(temp) + "\00"
-            self._file_write.write(cmd.encode('latin-1'))
-            if not self.silent:
-                print("cmd sent: \"", cmd, "\" to I2C address", addr)
-
-    def _read(self, addr):
-        try:
-            addr = self._check_addr(addr)
-            res = self._bus.read_i2c_block_data(addr, 0x32, 16)
-            char_list = "".join(chr(x) for x in res[1:] if x != 0)
-            return float(char_list)
-        except EZOnotConnected:
-            if self.mode == "op" or (not self._rtd and (addr == self._def_sensors[self._def_sensors.index("rtd")] or addr == self._def_rtd_add)):
-                return -100.0  # error value in operation mode when no EZO module connected to this address.
-            else:
-                raise EZOnotConnected
-        except ValueError:
-            if self.mode == "op":
-                return -200.00  # error value in operation mode when EZO module had nothing to give when tried to be read from.
-            else:
-                return EZOnotReady
-        except OSError:
-            if self.mode == "op":
-                return -1000.0  # argument addr corresponds to a connected EZO module's address but is not responding correctly.
-            else:
-                raise EZOError
+        return "Unknown Sensor", -1.0, "u"
 
-    def _query(self, addr, rt=True, temp=default_temp):
-        try:
-            self._write(addr, rt, temp)
-        except EZOnotConnected:
-            if self.mode == "op" or (not self._rtd and (addr == self._def_sensors[self._def_sensors.index("rtd")] or addr == self._def_rtd_add)):
-                return -100.0 # error value in operation mode when no EZO module connected to this address.
-            else:
-                raise EZOnotConnected
-        except OSError:
-            if self.mode == "op":
-                return -1000.0 # argument addr corresponds to a connected EZO module's address but is not responding correctly.
-            else:
-                raise EZOError
+    def _order_modules(self, report=True):
+        addresses = []
+        sensors = []
+        versions = []
+        units = []
 
-        if self._sensors[self._addresses.index(self._check_addr(addr))] == "rtd" or (not rt and self._sensors[self._addresses.index(self._check_addr(addr))] in ["ec", "do"]):
-            if not self.silent:
-                print("Sleeping for", self._medium_timeout * 1000, "msec...")
-            time.sleep(self._medium_timeout)
-        else:
-            if not self.silent:
-                print("Sleeping for", self._long_timeout * 1000, "msec...")
-            time.sleep(self._long_timeout)
+        # reordering connected EZO sensors in following order : rtd, ph, ec, do, orp
+        for sensor in self._def_sensors:
+            if sensor in self._init_sensors:
+                addresses.append(self._init_addresses[self._init_sensors.index(sensor)])
+                sensors.append(sensor)
+                versions.append(self._init_versions[self._init_sensors.index(sensor)])
+                units.append(self._init_units[self._init_sensors.index(sensor)])
 
-        return self._read(addr)
+        # new lists replacing the previous ones at once, so that threads reading EZO modules never see half filled lists (see _discover() function).
+        self._addresses, self._sensors, self._versions, self._units = addresses, sensors, versions, units
+        self._lengths = {}  # response lengths depending on the EZO module type.
 
-    def _query_multi(self, addr, rt=True, temp=default_temp):
-        readings = [-2000.0] * len(addr)  # initialisation of readings list. A final reading resulting in -2000.0 would mean the value in this list was not replaced. Technically something went wrong somewhere...
+        # detecting presence of connected RTD EZO module
+        self._rtd = "rtd" in self._sensors
 
-        for address in addr:
-            try:
-                self._write(address, rt, temp)
-            except EZOnotConnected:
-                if self.mode == "op" or (not self._rtd and (addr == self._def_sensors[self._def_sensors.index("rtd")] or addr == self._def_rtd_add)):
-                    readings[addr.index(address)] = -100.0  # error value in operation mode when no EZO module connected to this address.
-                else:
-                    raise EZOnotConnected
-            except OSError:
-                if self.mode == "op":
-                    readings[addr.index(address)] = -1000.0  # argument addr corresponds to a connected EZO module's address but is not responding correctly. EZO module was asleep OR is faulty OR its' I2C address was changed without using addr_change() function OR an undetected during debugging process error occurred.
-                else:
-                    raise EZOError
+        self._history_rings()
 
-        sensors = []
-        for address in addr:
-            try:
-                sensors.append(self._sensors[self._addresses.index(address)])
-            except ValueError:
-                sensors.append(addr)
+        if report and not self.silent:
+            print("\n" + str(len(self._addresses)) + " connected EZO modules detected:")
+            for i in range(len(self._addresses)):
+                print("\t", self._sensors[i], "\b, address:", self._addresses[i], "\b, version:", self._versions[i], "\b, unit:", self._units[i])
 
-        if (rt and any(elem in sensors for elem in ["ph", "ec", "do"])) or (not rt and any(elem in sensors for elem in ["ph", "orp"])):
+    def _load_topology(self):
+        try:
+            with open(self._topology_cache) as f:
+                topology = json.load(f)
+            addresses = [int(module["address"]) for module in topology]
+            sensors = [str(module["sensor"]) for module in topology]
+            versions = [float(module["version"]) for module in topology]
+            units = [module["unit"] for module in topology]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
             if not self.silent:
-                print("Sleeping for", self._long_timeout*1000, "msec...")
-            time.sleep(self._long_timeout)
-        else:
+                print("\nNo valid bus topology cache found in", self._topology_cache)
+            return False
+        if len(addresses) == 0:
+            return False
+
+        if not self.silent:
+            print("\nChecking cached EZO modules...")
+        for addr in addresses:
+            try:
+                self._transport.send(addr, "L,1")  # waking up asleep cached EZO modules, so that they answer "I" command.
+            except (IOError, OSError):
+                pass
+        self._sleep(self._short_timeout)
+        try:
+            for addr in addresses:
+                self._transport.send(addr, "I")
+            start = _clock()
+            for i in range(len(addresses)):
+                sensor, version, unit = self._identify(self._poll(addresses[i], start, self._short_timeout)[1])
+                if sensor != sensors[i] or version != versions[i]:
+                    if not self.silent:
+                        print("Cached EZO module", sensors[i], "\b, version", versions[i], "not found at address", addresses[i], "\b, scanning...")
+                    return False
+        except (IOError, OSError, ValueError):  # ValueError: cached address answering with an unexpected module type.
             if not self.silent:
-                print("Sleeping for", self._medium_timeout*1000, "msec...")
-            time.sleep(self._medium_timeout)
+                print("Cached EZO module(s) not responding, scanning...")
+            return False
 
-        for address in addr:
-            if readings[addr.index(address)] != -100.0:
-                    readings[addr.index(address)] = self._read(address)
+        self._init_addresses = addresses
+        self._init_sensors = sensors
+        self._init_versions = versions
+        self._init_units = units
+        self._order_modules()
+        return True
 
-        return readings
+    def _discover(self):
+        try:
+            if self._topology_cache is None or not self._load_topology():
+                defaults = [self._def_rtd_add, self._def_ph_add, self._def_ec_add, self._def_do_add, self._def_orp_add]
+                self._init_addresses, self._init_sensors, self._init_versions, self._init_units = [], [], [], []
+                self._discover_addresses(defaults)  # EZO modules at their factory default address first, usable before the end of the sweep.
+                self._discover_addresses([addr for addr in range(1, 128) if addr not in defaults])
+                self._order_modules()
+                if self._topology_cache is not None:
+                    self._save_topology()
+        except Exception as error:
+            self._discovery_error = error
+            if not self.silent:
+                print("Background discovery failed:", repr(error))
+        finally:
+            self._set_ready()
+
+    def _set_ready(self):
+        with self._discovered:
+            self._ready.set()
+            self._discovered.notify_all()
+        if self._ready_future is not None:
+            if self._discovery_error is not None and self.mode == "dev":
+                self._ready_future.set_exception(self._discovery_error)
+            else:
+                self._ready_future.set_result(True)
+
+    def _discover_addresses(self, addresses):
+        for addr in addresses:
+            try:
+                self._transport.send(addr, "L,1")  # waking up asleep EZO modules.
+            except (IOError, OSError):
+                pass
+        self._sleep(self._short_timeout)
 
+        found = []
+        for addr in addresses:
+            try:
+                self._transport.probe(addr)
+                found.append(addr)
+            except (IOError, OSError):
+                pass
+        for addr in found:
+            try:
+                self._transport.send(addr, "I")
+            except (IOError, OSError):
+                pass  # identified as unknown bellow.
+        start = _clock()
 
-# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+        for addr in found:  # each EZO module published as soon as identified.
+            try:
+                sensor, version, unit = self._identify(self._poll(addr, start, self._short_timeout)[1])
+            except (IOError, OSError, ValueError):  # I2C module not answering "I" command, kept as unknown so that the sweep goes on.
+                sensor, version, unit = self._identify("")
+            self._init_addresses.append(addr)
+            self._init_sensors.append(sensor)
+            self._init_versions.append(version)
+            self._init_units.append(unit)
+            with self._discovered:
+                self._order_modules(False)
+                self._discovered.notify_all()
+            if not self.silent:
+                print("Discovered", sensor, "\b, version:", version, "at I2C address", addr)
 
-    def scan(self):  # waking up, scanning and detecting ports on witch EZO modules are connected. Storing EZO modules addresses, types, units and version.
-        # initialisation list of connected EZO modules' addresses.
-        self._init_addresses = []
+    def _discovering(self):
+        return not self._ready.is_set() and threading.current_thread() is not self._discovery
 
-        time.sleep(self._short_timeout)
+    def _await_module(self, found):
+        with self._discovered:
+            while not found() and not self._ready.is_set():
+                self._discovered.wait()
 
+    def _scan_wake(self):
         # waking up any asleep connected EZO modules with default addresses
         for addr in range(1, 128):
             try:
-                cmd = "L,1" + "\00"
-                fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-                self._file_write.write(cmd.encode('latin-1'))
+                self._transport.send(addr, "L,1")
             except (IOError, OSError):
                 pass
-        time.sleep(self._short_timeout)
+
+    def _scan_probe(self):
+        # initialisation list of connected EZO modules' addresses.
+        self._init_addresses = []
 
         # scanning for connected EZO modules
         if not self.silent:
             print("\nScanning for connected EZO modules...")
         for addr in range(1, 128):
             try:
-                self._bus.read_byte(addr)
+                self._transport.probe(addr)
                 self._init_addresses.append(addr)
             except (IOError, OSError):
                 pass
-        time.sleep(self._short_timeout)
 
+    def _scan_identify(self):
+        for addr in self._init_addresses:
+            try:
+                self._transport.send(addr, "I")
+            except (IOError, OSError):
+                pass  # identified as unknown by _scan_collect().
+
+    def _scan_collect(self):
         # initialisation lists of connected EZO modules' names, units and versions.
         self._init_sensors = [" "] * len(self._init_addresses)
         self._init_units = [" "] * len(self._init_addresses)
         self._init_versions = [0.0] * len(self._init_addresses)
 
-        # initialisation of the lists of connected EZO modules' names, units and versions.
-        for addr in self._init_addresses:
-            self._bus.write_byte(addr, ord("I"))
-        time.sleep(self._medium_timeout)
-
         for addr in self._init_addresses:
-            res = self._bus.read_i2c_block_data(addr, 0x32, 16)
-            info = "".join(chr(x) for x in res[1:] if x != 0)
-            if len(info) > 0 and info[0] == "?" and info.count(",") == 2:
-                self._init_sensors[self._init_addresses.index(addr)] = str(info.split(",")[1]).lower()
-                self._init_versions[self._init_addresses.index(addr)] = float(info.split(",")[2])
-                self._init_units[self._init_addresses.index(addr)] = self._def_units[self._def_sensors.index(self._init_sensors[self._init_addresses.index(addr)])]
+            i = self._init_addresses.index(addr)
+            try:
+                self._init_sensors[i], self._init_versions[i], self._init_units[i] = self._identify(self._read_raw(addr)[1])
+            except (IOError, OSError, ValueError):  # I2C module not answering "I" command, kept as unknown so that the scan goes on.
+                self._init_sensors[i], self._init_versions[i], self._init_units[i] = self._identify("")
+
+        self._order_modules()
+
+        if self._topology_cache is not None:
+            self._save_topology()
+
+    def _query_speculative(self, addr, readings=None):
+        rtd = addr.index(self._addresses[self._sensors.index("rtd")])
+        assumed = {}  # {index in addr: temperature used for compensation of the outstanding or last command} of temperature compensated EZO modules.
+        done = set()  # indexes in addr of temperature compensated EZO modules already read.
+        measured = [None]  # temperature measured during this query.
+
+        for i in range(len(addr)):
+            if i != rtd and addr[i] in self._addresses and self._sensors[self._addresses.index(addr[i])] not in self._no_rt:
+                assumed[i] = self._last_temp
+
+        def on_ready(i, reading, status):
+            if i == rtd:
+                if status == STATUS_OK and self.minH2Otemp < reading < self.maxH2Otemp:
+                    measured[0] = self._last_temp = reading
+                retry = [j for j in done if measured[0] is not None and abs(assumed[j] - measured[0]) > self.spec_tolerance]
+            elif i in assumed:
+                done.add(i)
+                retry = [i] if measured[0] is not None and abs(assumed[i] - measured[0]) > self.spec_tolerance else []
             else:
-                self._init_sensors[self._init_addresses.index(addr)] = "Unknown Sensor"
-                self._init_versions[self._init_addresses.index(addr)] = -1.0
-                self._init_units[self._init_addresses.index(addr)] = "u"
-
-        # detecting presence of connected RTD EZO module
-        self._rtd = "rtd" in self._init_sensors
+                retry = []
+            for j in retry:
+                done.discard(j)
+                assumed[j] = measured[0]
+                if not self.silent:
+                    print("Temperature changed to", measured[0], "\b°C, querying I2C address", addr[j], "again")
+            return [(j, True, measured[0]) for j in retry]
 
-        self._addresses = []
-        self._sensors = []
-        self._versions = []
-        self._units = []
+        return self._query_multi(addr, True, self._last_temp, on_ready, None, readings)
 
-        # reordering connected EZO sensors in following order : rtd, ph, ec, do, orp
-        for sensor in self._def_sensors:
-            if sensor in self._init_sensors:
-                self._addresses.append(self._init_addresses[self._init_sensors.index(sensor)])
-                self._sensors.append(sensor)
-                self._versions.append(self._init_versions[self._init_sensors.index(sensor)])
-                self._units.append(self._init_units[self._init_sensors.index(sensor)])
-
-        if not self.silent:
-            print("\n" + str(len(self._addresses)) + " connected EZO modules detected:")
-            for i in range(len(self._addresses)):
-                print("\t", self._sensors[i], "\b, address:", self._addresses[i], "\b, version:", self._versions[i], "\b, unit:", self._units[i])
-
-        time.sleep(self._short_timeout)
+    def _stream_worker(self, addr, period, rt, cycles, records, stop):
+        try:
+            rtd = self._addresses[self._sensors.index("rtd")] if self._rtd else None
+            rtd = addr.index(rtd) if rtd in addr else None
+            temp = [self.default_temp]  # compensation temperature, the last one measured if the RTD EZO module is read.
+            if rt and rtd is not None:
+                temp[0] = self.read_t()
+
+            start = _clock()
+            offset = time.time() - start  # conversion of _clock() times to time.time() ones.
+            counters = {"started": 1, "dropped": 0}
+            cycle_of = [0] * len(addr)  # cycle of the outstanding command of each EZO module.
+            cycle_readings = {0: [[-2000.0] * len(addr), len(addr), [STATUS_NOT_REPLACED] * len(addr)]}  # {cycle: [readings, EZO modules not read yet, status codes]} of started cycles.
+            successors = {}  # {cycle: next cycle, None if none} decided when the first EZO module is done with cycle.
+
+            def on_ready(i, reading, status):
+                cycle = cycle_of[i]
+                readings = cycle_readings[cycle]
+                readings[0][i] = reading
+                readings[1] -= 1
+                readings[2][i] = status
+                if rt and i == rtd:
+                    temp[0] = reading  # out of range values are replaced with default_temp by _write().
+
+                if cycle not in successors:
+                    if stop.is_set() or (cycles is not None and counters["started"] >= cycles):
+                        successors[cycle] = None
+                    else:
+                        successor = cycle + 1
+                        late = _clock() - (start + successor * period)
+                        if late > period:  # cycle overran, skipping missed cycles to keep the schedule.
+                            counters["dropped"] += int(late // period)
+                            successor += int(late // period)
+                        successors[cycle] = successor
+                        cycle_readings[successor] = [[-2000.0] * len(addr), len(addr), [STATUS_NOT_REPLACED] * len(addr)]
+                        counters["started"] += 1
+                successor = successors[cycle]
+
+                if readings[1] == 0:  # cycle complete. Cycles complete in order, as each EZO module is read in cycles order.
+                    del cycle_readings[cycle]
+                    del successors[cycle]
+                    if self._sinks or self._history is not None:
+                        for address, value, status in zip(addr, readings[0], readings[2]):
+                            self._emit(address, value, status)
+                    counters["dropped"] += self._stream_put(records, {"cycle": cycle, "timestamp": offset + start + cycle * period, "monotonic": start + cycle * period, "addresses": list(addr), "readings": readings[0], "statuses": readings[2], "dropped": counters["dropped"]})
+
+                if successor is None:
+                    return []
+                cycle_of[i] = successor
+                return [(i, rt, temp[0], start + successor * period)]  # next command of this EZO module, overlapping the reading of slower ones.
+
+            self._query_multi(addr, rt, temp[0], on_ready, stop)
+            self._stream_end(records, None, stop)
+        except Exception as error:
+            self._stream_end(records, error, stop)
+
+    def _stream_records(self, addr, period, rt, cycles, buffer):
+        records = queue.Queue(buffer)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._stream_worker, args=(addr, period, rt, cycles, records, stop), name="AtlasHydroTools stream")
+        worker.daemon = True
+        worker.start()
+        try:
+            while True:
+                record = records.get()
+                if record is None:
+                    break
+                elif isinstance(record, Exception):
+                    raise record
+                yield record
+        finally:
+            stop.set()
+            worker.join()
+
+    def _stream_put(self, records, record):
+        dropped = 0
+        while True:
+            try:
+                records.put_nowait(record)
+                return dropped
+            except queue.Full:
+                try:
+                    records.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    pass
 
-    def read(self, addr, rt=True, temp=default_temp):
-        return self._query(addr, rt, temp)
+    def _stream_end(self, records, end, stop):
+        while not stop.is_set():
+            try:
+                records.put(end, timeout=self._poll_max_interval)  # stop checked again if still full.
+                return
+            except queue.Full:
+                pass
 
-    def read_t(self):
+    def _stats_addr(self, addr):
+        if isinstance(addr, str):
+            if addr in self._sensors:
+                return self._addresses[self._sensors.index(addr)]
+            elif addr in self._def_sensors:  # EZO module not connected, factory default address of its' type.
+                return [self._def_rtd_add, self._def_ph_add, self._def_ec_add, self._def_do_add, self._def_orp_add][self._def_sensors.index(addr)]
+        elif isinstance(addr, int) and not isinstance(addr, bool):
+            return addr
+        return 0  # incorrect address.
+
+    def _stats_entry(self, addr):
+        addr = self._stats_addr(addr)
+        entry = self._stats.get(addr)
+        if entry is None:
+            entry = self._stats[addr] = {"commands": {}, "errors": {}, "sentinels": {}}
+        return entry
+
+    def _observe(self, addr, cmd, elapsed, slept, polls):
+        with self._state_lock:
+            commands = self._stats_entry(addr)["commands"]
+            if cmd not in commands:
+                commands[cmd] = {"count": 0, "sum": 0.0, "buckets": [0] * (len(self.stats_buckets) + 1), "sleep": 0.0, "polls": 0}
+            entry = commands[cmd]
+            entry["count"] += 1
+            entry["sum"] += elapsed
+            entry["buckets"][bisect.bisect_left(self.stats_buckets, elapsed)] += 1
+            entry["sleep"] += slept
+            entry["polls"] += polls
+
+    def _count_error(self, error, addr, value):
+        with self._state_lock:
+            entry = self._stats_entry(addr)
+            if error is not None:
+                entry["errors"][error.__name__] = entry["errors"].get(error.__name__, 0) + 1
+            if value is not None:
+                entry["sentinels"][value] = entry["sentinels"].get(value, 0) + 1
+
+    def _module_locks(self, addr):
+        addresses = set()
+        for address in addr:
+            try:
+                addresses.add(self._check_addr(address))
+            except (EZOnotConnected, AddrTypeError, AddrRangeError):  # error made by the caller, no EZO module queried.
+                pass
+        locks = []
+        for address in sorted(addresses):  # always acquired in the same order, so that two threads never wait for each other.
+            lock = self._conversations.get(address)
+            if lock is None:
+                lock = self._conversations.setdefault(address, threading.RLock())
+            locks.append(lock)
+        return _Locks(locks)
+
+    def _sleep(self, seconds, addr=None):
+        if self._tracer is None:
+            time.sleep(seconds)
+        else:
+            start = _clock()
+            time.sleep(seconds)
+            self._tracer.span("sleep", "sleep", start, _clock(), addr, {"seconds": seconds})
+
+    def _emit(self, addr, value, status):
+        if addr in self._sensors:  # EZO module given by its' sensor name.
+            addr = self._addresses[self._sensors.index(addr)]
+        sensor = self._sensors[self._addresses.index(addr)] if addr in self._addresses else str(addr)
+        timestamp = _clock()
+        if self._history is not None:
+            with self._state_lock:
+                ring = self._history.get(addr) if self._history is not None else None  # allocated by history_start() or when the module was discovered.
+                if ring is not None:
+                    ring.append(timestamp, value, status)
+        for sink in self._sinks:
+            sink(sensor, addr, value, timestamp, status)
+
+    def _measure(self, addr, rt=True, temp=default_temp):
+        if self._tracer is not None:
+            reading = self._traced("read", self._query, addr, rt, temp)
+        else:
+            reading = self._query(addr, rt, temp)
+        if self._sinks or self._history is not None:
+            self._emit(addr, reading[0], reading[1])
+        return reading
+
+    def _measure_t(self):
+        if not self._rtd and self._discovering():
+            self._await_module(lambda: self._rtd)
         if self._rtd:
-            return self.read(self._addresses[self._sensors.index("rtd")])
+            reading = self._measure(self._addresses[self._sensors.index("rtd")])
+            if reading[1] == STATUS_OK and self.minH2Otemp < reading[0] < self.maxH2Otemp:
+                self._last_temp = reading[0]
+            return reading
         else:
-            return -100.0
+            return -100.0, STATUS_NOT_CONNECTED, _clock(), None, None
 
-    def read_ph(self, rt=False, temp=default_temp):
+    def _history_rings(self):
+        with self._state_lock:
+            if self._history is not None:
+                for addr in self._addresses:
+                    if addr not in self._history:
+                        self._history[addr] = _Ring(self._history_capacity)
+
+    def _traced(self, name, function, *args):
+        start = _clock()
         try:
-            return self.read(self._addresses[self._sensors.index("ph")], rt, temp)
-        except ValueError:
-            if self.mode =="op":
-                return -100.00
+            return function(*args)
+        finally:
+            self._tracer.span(name, "function", start, _clock())
+
+    def _save_topology(self):
+        topology = []
+        for i in range(len(self._addresses)):
+            topology.append({"address": self._addresses[i], "sensor": self._sensors[i], "version": self._versions[i], "unit": self._units[i]})
+        try:
+            with open(self._topology_cache, "w") as f:
+                json.dump(topology, f, indent=4)
+        except (IOError, OSError):
+            if self.mode == "dev":
+                raise
+            elif not self.silent:
+                print("Bus topology cache could not be written to", self._topology_cache)
+
+    def _addr_plan(self, targets):
+        occupied = set(self._init_addresses + self._addresses)
+        pending = dict((src, dst) for src, dst in targets.items() if src != dst)
+        temporary = set()  # temporary addresses of EZO modules moved out of a cycle.
+        first, second = [], []
+        while pending:
+            ready = sorted(src for src, dst in pending.items() if dst not in occupied)
+            if ready:
+                for src in ready:
+                    dst = pending.pop(src)
+                    if src in temporary:  # left after the first wave only, the temporary address stays taken until then.
+                        second.append((src, dst))
+                    else:
+                        first.append((src, dst))
+                        occupied.discard(src)
+                    occupied.add(dst)
+                continue
+
+            blocked = sorted(src for src, dst in pending.items() if dst not in pending)  # target address taken by an I2C module not moving.
+            if blocked:
+                for src in blocked:
+                    if not self.silent:
+                        print("I2C address", pending[src], "taken by another I2C module, EZO module kept at I2C address", src)
+                    del pending[src]
+                continue
+
+            # every remaining target address is the address of another EZO module to be moved: cycles, broken by moving one EZO module to a free address.
+            src = min(pending)
+            for tmp in range(1, 128):
+                if tmp in occupied or tmp in targets.values():
+                    continue
+                try:
+                    self._transport.probe(tmp)  # unknown I2C module, not detected by last scan().
+                    occupied.add(tmp)
+                except (IOError, OSError):
+                    break
             else:
-                raise EZOnotConnected
+                raise AddrChangeError  # no free address left on the bus.
+            first.append((src, tmp))
+            occupied.discard(src)
+            occupied.add(tmp)
+            pending[tmp] = pending.pop(src)
+            temporary.add(tmp)
+        return first, second
+
+    def _addr_settle(self, addresses):
+        start = _clock()
+        waiting = set(addresses)
+        self._sleep(self._short_timeout)
+        while True:
+            for addr in sorted(waiting):
+                try:
+                    self._transport.probe(addr)
+                    waiting.discard(addr)
+                except (IOError, OSError):  # EZO module still rebooting.
+                    pass
+            if not waiting or _clock() + self._poll_max_interval > start + self._poll_deadline:
+                return sorted(waiting)
+            self._sleep(self._poll_max_interval)
 
-    def read_ec(self, rt=False, temp=default_temp):
-        try:
-            return self.read(self._addresses[self._sensors.index("ec")], rt, temp)
-        except ValueError:
-            if self.mode =="op":
-                return -100.00
+    def _check_addr(self,addr):
+        if isinstance(addr, bool):
+            raise AddrTypeError
+        elif isinstance(addr, int):
+            if addr in range(1, 128):
+                if addr in self._addresses:
+                    return addr
+                elif self._discovering():  # maybe not discovered yet.
+                    self._await_module(lambda: addr in self._addresses)
+                    return self._check_addr(addr)
+                else:
+                    raise EZOnotConnected
             else:
+                raise AddrRangeError
+        elif isinstance(addr, str):
+            if addr in self._sensors:
+                return self._addresses[self._sensors.index(addr)]
+            elif addr in self._def_sensors:
+                if self._discovering():  # maybe not discovered yet.
+                    self._await_module(lambda: addr in self._sensors)
+                    return self._check_addr(addr)
                 raise EZOnotConnected
+            else:
+                raise AddrRangeError
+        else:
+            raise AddrTypeError
 
-    def read_do(self, rt=False, temp=default_temp):
+    def _write(self, addr, rt=True, temp=default_temp):
+        addr = self._check_addr(addr)
+        if not rt or self._sensors[self._addresses.index(addr)] in self._no_rt:  # queries of RTD and ORP sensors are made with "R" command as they don't have temperature compensation function.
+            self._transport.send(addr, "R")
+            if not self.silent:
+                print("cmd sent: \"R\" to I2C address", addr)
+            return addr, "R", None
+        else:  # queries of all other sensor is made with "RT,temperature" command for temperature compensation.
+            if self.minH2Otemp < temp < self.maxH2Otemp:
+                pass
+            else:
+                temp = self.default_temp
+            cmd = "RT," + str(temp)
+            self._transport.send(addr, cmd)
+            if not self.silent:
+                print("cmd sent: \"", cmd, "\" to I2C address", addr)
+            return addr, "RT", float(temp)
+
+    def _error(self, error, addr=None):
+        value = None
+        if error is EZOnotConnected:
+            if self.mode == "op" or (not self._rtd and (addr == self._def_sensors[self._def_sensors.index("rtd")] or addr == self._def_rtd_add)):
+                value = -100.0  # error value in operation mode when no EZO module connected to this address.
+        elif error is EZOnotReady:
+            if self.mode == "op":
+                value = -200.0  # error value in operation mode when EZO module had nothing to give when tried to be read from.
+        elif error is EZOError:
+            if self.mode == "op":
+                value = -1000.0  # argument addr corresponds to a connected EZO module's address but is not responding correctly. EZO module was asleep OR is faulty OR its' I2C address was changed without using addr_change() function OR an undetected during debugging process error occurred.
+        self._count_error(error, addr, value)
+        if value is None:
+            raise error
+        return value
+
+    def _failure(self, error, addr, start=None, temp=None):
+        value = self._error(error, addr)
+        return value, -int(value), _clock() if start is None else start, temp, None  # status code of the error value.
+
+    def _records(self, addr, readings, form):
+        if form == "array":
+            records = numpy.empty(len(addr), dtype=READING_DTYPE)  # one allocation for all records, filled in place.
+        else:
+            records = [None] * len(addr)
+        for i in range(len(addr)):
+            value, status, timestamp, temp, data = readings[i]
+            address = addr[i]
+            sensor = self._sensors[self._addresses.index(address)] if address in self._addresses else str(address)
+            if form == "array":
+                records[i] = (value, status, address if isinstance(address, int) else 0, sensor, timestamp, float("nan") if temp is None else temp)
+            else:
+                records[i] = Reading(value, status, address, sensor, timestamp, temp, self._fields(address, data))
+        return records
+
+    def _parse(self, status, data):
+        if status != 1:  # 1: command successful. 2: syntax error, 254: still processing, 255: no data to send.
+            raise ValueError
+        return float(data.partition(",")[0])  # first output parameter.
+
+    def _send(self, addr, cmd):
+        self._transport.send(addr, cmd)
+        if not self.silent:
+            print("cmd sent: \"", cmd, "\" to I2C address", addr)
+
+    def _read_raw(self, addr):
+        length = self._lengths.get(addr)
+        if length is None:
+            length = self._response_length(addr)
+        res = self._transport.read(addr, length)
+        return res[0], "".join(chr(x) for x in res[1:] if x != 0)
+
+    def _response_length(self, addr):
+        if addr not in self._addresses:  # EZO module not identified yet (scan).
+            return 16
+        outputs = self._outputs.get(addr)
+        if self._sensors[self._addresses.index(addr)] in self._def_outputs and (outputs is None or len(outputs) > 1):
+            length = 32  # several output parameters, up to 31 characters.
+        else:
+            length = 16
+        self._lengths[addr] = length
+        return length
+
+    def _output_names(self, addr, count):
+        sensor = self._sensors[self._addresses.index(addr)]
+        params = self._def_outputs.get(sensor)
+        if params is None:
+            return [sensor] if count == 1 else None
+        if count == len(params):  # all parameters enabled.
+            return params
+        outputs = self._outputs.get(addr)  # known once queried or set by output().
+        return outputs if outputs is not None and len(outputs) == count else None
+
+    def _fields(self, addr, data):
+        if data is None or addr not in self._addresses:
+            return {}
         try:
-            return self.read(self._addresses[self._sensors.index("do")], rt, temp)
+            values = [float(field) for field in data.split(",")]
         except ValueError:
-            if self.mode =="op":
-                return -100.00
-            else:
-                raise EZOnotConnected
+            return {}
+        names = self._output_names(addr, len(values))
+        return dict(zip(names, values)) if names is not None else {}
+
+    def _poll(self, addr, start, first=None, cmd=None):
+        if first is None:
+            first = self._poll_first
+        interval = self._poll_interval
+        polls = 1
+        slept = 0.0
+        wait = start + first - _clock()
+        if wait > 0:
+            self._sleep(wait, addr)
+            slept += wait
+        status, data = self._read_raw(addr)
+        while status == 254 and _clock() + interval < start + self._poll_deadline:  # 254: EZO module still processing the command.
+            self._sleep(interval, addr)
+            slept += interval
+            interval = min(interval * self._poll_backoff, self._poll_max_interval)
+            status, data = self._read_raw(addr)
+            polls += 1
+        if cmd is not None:
+            if status == 1 and self.poll:
+                self._learn(addr, cmd, _clock() - start)
+            self._observe(addr, cmd, _clock() - start, slept, polls)
+        if not self.silent:
+            print("I2C address", addr, "polled", polls, "times, ready after", round((_clock() - start) * 1000), "msec")
+        return status, data
 
-    def read_orp(self):
+    def _read(self, addr, start=None, first=None, cmd=None, temp=None):
         try:
-            return self.read(self._addresses[self._sensors.index("orp")])
+            addr = self._check_addr(addr)
+            if start is None:
+                status, data = self._read_raw(addr)
+            else:
+                status, data = self._poll(addr, start, first, cmd)
+            return self._parse(status, data), STATUS_OK, _clock() if start is None else start, temp, data
+        except EZOnotConnected:
+            return self._failure(EZOnotConnected, addr, start, temp)
         except ValueError:
-            if self.mode =="op":
-                return -100.00
+            return self._failure(EZOnotReady, addr, start, temp)
+        except OSError:
+            return self._failure(EZOError, addr, start, temp)
+
+    def _timeout(self, addr, cmd):
+        timeout = self._def_latency.get(self._sensors[self._addresses.index(addr)], {}).get(cmd, self._long_timeout)
+        model = self._latency_model(addr, cmd)
+        if model is not None:
+            timeout = min(timeout, model[0] * (1 + self._latency_margin))
+        return timeout
+
+    def _first_check(self, addr, cmd):
+        model = self._latency_model(addr, cmd)
+        if model is None:
+            return self._poll_first
+        return model[0] * (1 - self._latency_margin)
+
+    def _latency_model(self, addr, cmd):  # returns learned [ewma, samples] of addr address for cmd command if learned with the currently connected EZO module, None otherwise.
+        entry = self._latency.get(addr)
+        i = self._addresses.index(addr)
+        if entry is None or entry["sensor"] != self._sensors[i] or entry["version"] != self._versions[i]:
+            return None
+        return entry.get(cmd)
+
+    def _learn(self, addr, cmd, elapsed):
+        i = self._addresses.index(addr)
+        with self._state_lock:
+            entry = self._latency.get(addr)
+            if entry is None or entry["sensor"] != self._sensors[i] or entry["version"] != self._versions[i]:  # new EZO module at this address, previously learned latencies are not relevant.
+                entry = self._latency[addr] = {"sensor": self._sensors[i], "version": self._versions[i]}
+            if cmd in entry:
+                entry[cmd][0] += self._latency_alpha * (elapsed - entry[cmd][0])
+                entry[cmd][1] += 1
             else:
-                raise EZOnotConnected
+                entry[cmd] = [elapsed, 1]
+
+    def _query(self, addr, rt=True, temp=default_temp):
+        with self._module_locks([addr]):
+            try:
+                addr, cmd, temp = self._write(addr, rt, temp)
+                start = _clock()
+            except EZOnotConnected:
+                return self._failure(EZOnotConnected, addr)
+            except OSError:
+                return self._failure(EZOError, addr)
+
+            if self.poll:
+                return self._read(addr, start, self._first_check(addr, cmd), cmd, temp)
+
+            timeout = self._timeout(addr, cmd)
+            if not self.silent:
+                print("Sleeping for", timeout * 1000, "msec...")
+
+            return self._read(addr, start, timeout, cmd, temp)  # timeout slept by _poll().
+
+    def _issue(self, pending, i, addr, rt, temp, readings):
+        try:
+            addr, cmd, temp = self._write(addr, rt, temp)
+        except EZOnotConnected:
+            readings[i] = self._failure(EZOnotConnected, addr)
+            return False
+        except OSError:
+            readings[i] = self._failure(EZOError, addr)
+            return False
+        start = _clock()
+        if self.poll:
+            due = start + self._first_check(addr, cmd)
+        else:
+            due = start + self._timeout(addr, cmd)
+        heapq.heappush(pending, (due, i, addr, cmd, start, self._poll_interval, 0.0, 1, temp))
+        return True
+
+    def _query_multi(self, addr, rt=True, temp=default_temp, on_ready=None, stop=None, readings=None):
+        with self._module_locks(addr):
+            readings = [None] * len(addr) if readings is None else list(readings)  # initialisation of readings list. A final reading resulting in -2000.0 would mean the value in this list was not replaced. Technically something went wrong somewhere...
+            measured = [reading is None for reading in readings]  # EZO modules measured here, the others' measurements being given.
+            traced = _clock() if self._tracer is not None else None
 
-    def read_multi(self, addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp):  # reads multiple sensors in one go.
-        if mode.lower() in ["seq", "sim"]:
-            readings = [-2000.0] * len(addr)
+            pending = []  # heap of outstanding commands (and of commands to be sent, with None command name), earliest due first.
+            for i in range(len(addr)):
+                if measured[i]:
+                    heapq.heappush(pending, (_clock(), i, addr[i], None, (rt, temp), 0.0, 0.0, 0, None))
+
+            while pending:
+                due, i, address, cmd, start, interval, slept, polls, sent = heapq.heappop(pending)
+                wait = due - _clock()
+                if cmd is None:  # command to be sent at due time, start being its' (rt, temp) arguments.
+                    if stop is not None:
+                        if stop.wait(max(0.0, wait)):
+                            continue  # stopped, command dropped.
+                    elif wait > 0:
+                        self._sleep(wait, address)
+                    if self._issue(pending, i, address, start[0], start[1], readings):
+                        continue
+                else:
+                    if wait > 0:
+                        self._sleep(wait, address)
+                        slept += wait
+                    try:
+                        status, data = self._read_raw(address)
+                        if status == 254 and _clock() + interval < start + self._poll_deadline:  # 254: EZO module still processing the command, checking again later.
+                            heapq.heappush(pending, (_clock() + interval, i, address, cmd, start, min(interval * self._poll_backoff, self._poll_max_interval), slept, polls + 1, sent))
+                            continue
+                        if status == 1 and self.poll:
+                            self._learn(address, cmd, _clock() - start)
+                        self._observe(address, cmd, _clock() - start, slept, polls)
+                        readings[i] = self._parse(status, data), STATUS_OK, start, sent, data
+                    except ValueError:
+                        readings[i] = self._failure(EZOnotReady, address, start, sent)
+                    except OSError:
+                        readings[i] = self._failure(EZOError, address, start, sent)
+                    if not self.silent:
+                        print("I2C address", address, "read after", round((_clock() - start) * 1000), "msec:", readings[i][0])
+
+                if on_ready is not None:  # also called when the command could not be sent.
+                    for command in on_ready(i, readings[i][0], readings[i][1]) or []:
+                        heapq.heappush(pending, (command[3] if len(command) > 3 else _clock(), command[0], addr[command[0]], None, (command[1], command[2]), 0.0, 0.0, 0, None))
+
+            for i in range(len(addr)):
+                if readings[i] is None:  # command dropped (stop set).
+                    readings[i] = (-2000.0, STATUS_NOT_REPLACED, _clock(), None, None)
+
+            if traced is not None:
+                self._tracer.span("_query_multi", "function", traced, _clock(), None, {"addresses": [str(address) for address in addr]})
+            if stop is None and (self._sinks or self._history is not None):  # stream() gives readings to sinks cycle by cycle.
+                for i in range(len(addr)):
+                    if measured[i]:
+                        self._emit(addr[i], readings[i][0], readings[i][1])
+            return readings
+
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def scan(self):  # waking up, scanning and detecting ports on witch EZO modules are connected. Storing EZO modules addresses, types, units and version.
+        traced = _clock() if self._tracer is not None else None
+        self._sleep(self._short_timeout)
+        self._scan_wake()
+        self._sleep(self._short_timeout)
+        self._scan_probe()
+        self._sleep(self._short_timeout)
+        self._scan_identify()
+        self._sleep(self._medium_timeout)
+        self._scan_collect()
+        self._sleep(self._short_timeout)
+        if traced is not None:
+            self._tracer.span("scan", "function", traced, _clock())
+
+    def read(self, addr, rt=True, temp=default_temp):
+        return self._measure(addr, rt, temp)[0]
+
+    def read_t(self):
+        return self._measure_t()[0]
+
+    def read_ph(self, rt=False, temp=default_temp):
+        return self.read("ph", rt, temp)
+
+    def read_ec(self, rt=False, temp=default_temp):
+        return self.read("ec", rt, temp)
+
+    def read_do(self, rt=False, temp=default_temp):
+        return self.read("do", rt, temp)
+
+    def read_orp(self):
+        return self.read("orp")
+
+    def read_multi(self, addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"):  # reads multiple sensors in one go.
+        if mode.lower() in ["seq", "sim", "spec"] and form.lower() in ["float", "record", "array"]:
+            if form.lower() == "array" and numpy is None:
+                raise ImportError("numpy is needed for read_multi() \"array\" form")
+            readings = [None] * len(addr)  # measurement tuples (see _read() function).
 
             for i in range(len(addr)):
                 try:
                     addr[i] = self._check_addr(addr[i])
                 except EZOnotConnected:
-                    if self.mode == "op" or (not self._rtd and (addr == self._def_sensors[self._def_sensors.index("rtd")] or addr == self._def_rtd_add)):
-                        readings[i] = -100.0  # error value in operation mode when no EZO module connected to this address.
-                    else:
-                        raise EZOnotConnected
+                    readings[i] = self._failure(EZOnotConnected, addr[i])
                 except OSError:
-                    if self.mode == "op":
-                        readings[i] =  -1000.0  # argument addr corresponds to a connected EZO module's address but is not responding correctly
-                    else:
-                        raise EZOError
+                    readings[i] = self._failure(EZOError, addr[i])
+
+            speculative = mode.lower() == "spec" and rt and not manual_temp_override and self._last_temp is not None and self._rtd and self._addresses[self._sensors.index("rtd")] in addr
 
-            if rt and not manual_temp_override:
+            if rt and not manual_temp_override and not speculative:
                 try:
-                    readings[addr.index(self._addresses[self._sensors.index("rtd")])] = self.read_t()
-                    override_temp = readings[addr.index(self._addresses[self._sensors.index("rtd")])]
+                    readings[addr.index(self._addresses[self._sensors.index("rtd")])] = self._measure_t()
+                    override_temp = readings[addr.index(self._addresses[self._sensors.index("rtd")])][0]
                 except ValueError:
                     pass
 
             if mode.lower() == "seq":
-                for address in addr:
-                    if readings[addr.index(address)] == -2000.0:
-                        readings[addr.index(address)] = self.read(address, rt, override_temp)
-            elif mode.lower() == "sim":
-                readings = self._query_multi(addr, rt, override_temp)
+                for i in range(len(addr)):
+                    if readings[i] is None:
+                        readings[i] = self._measure(addr[i], rt, override_temp)
+            elif speculative:
+                readings = self._query_speculative(addr, readings)
+            else:
+                readings = self._query_multi(addr, rt, override_temp, None, None, readings)  # failures and RTD measurement above neither made nor counted again.
         else:
             raise ReadMultiError
 
-        return readings
+        for address, reading in zip(addr, readings):
+            if reading[1] == STATUS_NOT_REPLACED:  # reading not replaced, counted as error value.
+                self._count_error(None, address, reading[0])
+
+        if form.lower() != "float":
+            return self._records(addr, readings, form.lower())
+        return [reading[0] for reading in readings]
+
+    def read_all(self, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"):  # reads all connected EZO modules by calling read_multi() function.
+        if self._discovering():
+            self._ready.wait()
+        return self.read_multi(self._addresses, mode, rt, manual_temp_override, override_temp, form)
+
+    def stream(self, rate=1.0, sensors=None, rt=True, cycles=None, buffer=4):  # arguments checked at call, not at first next() of the generator.
+        if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate <= 0 or isinstance(buffer, bool) or not isinstance(buffer, int) or buffer < 1:
+            raise StreamError
+        if cycles is not None and (isinstance(cycles, bool) or not isinstance(cycles, int) or cycles < 1):
+            raise StreamError
+        if sensors is None:
+            sensors = self._addresses
+        addr = [self._check_addr(address) for address in sensors]
+        return self._stream_records(addr, 1.0 / rate, rt, cycles, buffer)
+
+    def continuous(self, addr, period=1):
+        if isinstance(period, bool) or not isinstance(period, int) or not 0 <= period <= 99:
+            raise ContinuousError
+        with self._module_locks([addr]):
+            try:
+                addr = self._check_addr(addr)
+                self._send(addr, "C,?")
+                self._sleep(self._short_timeout)
+                status, data = self._read_raw(addr)
+                if status != 1 or not data.upper().startswith("?C,"):  # 2: syntax error, continuous mode not supported by the EZO module.
+                    if not self.silent:
+                        print("I2C address", addr, "does not support continuous mode")
+                    return False
+                if addr not in self._prior_modes:
+                    self._prior_modes[addr] = int(data.split(",")[1])
+                self._send(addr, "C," + str(period))
+                start = _clock()
+                self._sleep(self._short_timeout)
+                status, data = self._read_raw(addr)
+            except EZOnotConnected:
+                self._error(EZOnotConnected, addr)
+                return False
+            except (OSError, ValueError, IndexError):
+                self._error(EZOError, addr)
+                return False
+            if status != 1:
+                self._error(EZOError, addr)
+                return False
+            if period:
+                self._continuous[addr] = {"period": period, "start": start}
+            else:
+                self._continuous.pop(addr, None)
+            return True
+
+    def read_latest(self, addr, rt=True, temp=default_temp):
+        try:
+            address = self._check_addr(addr)
+        except EZOnotConnected:
+            return self._error(EZOnotConnected, addr)
+        with self._module_locks([address]):
+            entry = self._continuous.get(address)
+            if entry is not None:
+                now = _clock()
+                first = entry["start"] + self._timeout(address, "R")  # first reading of the EZO module in continuous mode.
+                if now >= first:
+                    try:
+                        status, data = self._read_raw(address)
+                        value = self._parse(status, data)
+                    except ValueError:  # no reading: the EZO module left continuous mode (sleep, reboot, other command).
+                        del self._continuous[address]
+                        if not self.silent:
+                            print("I2C address", address, "left continuous mode, reading on demand")
+                    except OSError:
+                        return self._error(EZOError, address)
+                    else:  # exceptions raised by sinks are not taken for a module out of continuous mode.
+                        self._ages[address] = (now - first) % entry["period"]
+                        if self._sinks or self._history is not None:
+                            self._emit(address, value, STATUS_OK)
+                        return value
+            self._ages[address] = 0.0
+            return self.read(address, rt, temp)
+
+    def output(self, addr, params=None):
+        try:
+            address = self._check_addr(addr)
+        except EZOnotConnected:
+            self._error(EZOnotConnected, addr)
+            return None
+        available = self._def_outputs.get(self._sensors[self._addresses.index(address)])
+        if available is None or (params is not None and not set(param.lower() for param in params) <= set(available)):
+            raise OutputError
+        with self._module_locks([address]):
+            try:
+                outputs = self._outputs.get(address)
+                if outputs is None:
+                    self._send(address, "O,?")
+                    self._sleep(self._short_timeout, address)
+                    status, data = self._read_raw(address)
+                    if status != 1 or not data.upper().startswith("?O,"):
+                        raise ValueError
+                    enabled = [field.lower() for field in data.split(",")[1:]]  # "?O,No output" if none.
+                    outputs = [param for param in available if param in enabled]
+                if params is not None:
+                    wanted = [param.lower() for param in params]
+                    for param in available:
+                        if (param in wanted) != (param in outputs):
+                            self._send(address, "O," + param + "," + str(int(param in wanted)))
+                            self._sleep(self._short_timeout, address)
+                            if self._read_raw(address)[0] != 1:
+                                raise ValueError
+                    outputs = [param for param in available if param in wanted]
+            except (OSError, ValueError):
+                self._outputs.pop(address, None)  # unknown after a partial change.
+                self._lengths.pop(address, None)
+                self._error(EZOError, address)
+                return None
+            self._outputs[address] = outputs
+            self._lengths.pop(address, None)  # response length depending on the number of parameters.
+        if not self.silent:
+            print("I2C address", address, "output parameters:", outputs)
+        return list(outputs)
 
-    def read_all(self, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp):  # reads all connected EZO modules by calling read_multi() function.
-        return self.read_multi(self._addresses, mode, rt, manual_temp_override, override_temp)
+    def latest_age(self, addr):
+        return self._ages.get(self._check_addr(addr))
 
     def set_t(self, temp=default_temp):
-        cmd = "T," + str(temp) + "\00"
-        for addr in self._addresses:
-            if not (self._sensors[self._addresses.index(addr)] in ["rtd", "orp"]):
-                fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-                self._file_write.write(cmd.encode('latin-1'))
-                if not self.silent:
-                    print("cmd sent : \"", cmd, "\" to I2C address", addr)
-        time.sleep(self._short_timeout)
+        traced = _clock() if self._tracer is not None else None
+        with self._module_locks(self._addresses):
+            for addr in self._addresses:
+                if not (self._sensors[self._addresses.index(addr)] in self._no_rt):
+                    self._send(addr, "T," + str(temp))
+            self._sleep(self._short_timeout)
+        if traced is not None:
+            self._tracer.span("set_t", "function", traced, _clock())
 
     def sleep(self, addr):
         try:
@@ -524,13 +1757,12 @@ class AtlasHydroTools:
         except Exception:
             pass
 
-        cmd = "sleep" + "\00"
+        cmd = "sleep"
         try:
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-            self._file_write.write(cmd.encode('latin-1'))
+            self._transport.send(addr, cmd)
             if not self.silent:
                 print("cmd sent: \"", cmd, "\" to I2C address", addr)
-            time.sleep(self._short_timeout)
+            self._sleep(self._short_timeout)
         except (IOError, OSError):
             pass
 
@@ -540,36 +1772,33 @@ class AtlasHydroTools:
         except Exception:
             pass
 
-        cmd = "L,1" + "\00"
+        cmd = "L,1"
         try:
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-            self._file_write.write(cmd.encode('latin-1'))
+            self._transport.send(addr, cmd)
         except (IOError, OSError):
             if not self.silent:
                 print("waking-up cmd sent: \"", cmd, "\" to I2C address", addr)
-                time.sleep(self._short_timeout)
+                self._sleep(self._short_timeout)
             pass
 
     def sleep_all(self):
         for addr in self._addresses:
-            cmd = "sleep" + "\00"
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-            self._file_write.write(cmd.encode('latin-1'))
+            cmd = "sleep"
+            self._transport.send(addr, cmd)
             if not self.silent:
                 print("cmd sent: \"", cmd, "\" to I2C address", addr)
-        time.sleep(self._short_timeout)
+        self._sleep(self._short_timeout)
 
     def wake_all(self):
         for addr in self._addresses:
-            cmd = "L,1" + "\00"
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
+            cmd = "L,1"
             try:
-                self._file_write.write(cmd.encode('latin-1'))
+                self._transport.send(addr, cmd)
                 if not self.silent:
                     print("cmd sent: \"", cmd, "\" to I2C address", addr)
             except OSError:
                 pass
-        time.sleep(self._short_timeout)
+        self._sleep(self._short_timeout)
 
     def led(self, addr, state=1):
         try:
@@ -577,13 +1806,12 @@ class AtlasHydroTools:
         except Exception:
             pass
 
-        cmd = "L," + str(state) + "\00"
+        cmd = "L," + str(state)
         try:
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-            self._file_write.write(cmd.encode('latin-1'))
+            self._transport.send(addr, cmd)
             if not self.silent:
                 print("cmd sent: \"", cmd, "\" to I2C address", addr)
-            time.sleep(self._short_timeout)
+            self._sleep(self._short_timeout)
         except (IOError, OSError):
             pass
 
@@ -595,73 +1823,101 @@ class AtlasHydroTools:
             except Exception:
                 pass
 
-            cmd = "L," + str(state) + "\00"
+            cmd = "L," + str(state)
             try:
-                fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-                self._file_write.write(cmd.encode('latin-1'))
+                self._transport.send(addr, cmd)
                 if not self.silent:
                     print("cmd sent: \"", cmd, "\" to I2C address", addr)
             except (IOError, OSError):
                 pass
-        time.sleep(self._short_timeout)
+        self._sleep(self._short_timeout)
 
     def addr_change(self, old_addr, new_addr):
         old_addr = self._check_addr(old_addr)
 
-        time.sleep(self._short_timeout)
+        self._sleep(self._short_timeout)
 
         if new_addr in self._addresses or not isinstance(new_addr, int) or new_addr not in range(1,128):
             raise AddrChangeError
 
-        cmd = "I2C," + str(new_addr) + "\00"
-        fcntl.ioctl(self._file_write, self._I2C_SLAVE, old_addr)
-        self._file_write.write(cmd.encode('latin-1'))
+        cmd = "I2C," + str(new_addr)
+        self._transport.send(old_addr, cmd)
         self._addresses[self._addresses.index(old_addr)] = new_addr
+        if old_addr in self._init_addresses:  # so that addr_reset() doesn't see old_addr as taken.
+            self._init_addresses[self._init_addresses.index(old_addr)] = new_addr
+        self._continuous.pop(old_addr, None)  # continuous mode left by the reboot of the EZO module.
+        if old_addr in self._outputs:
+            self._outputs[new_addr] = self._outputs.pop(old_addr)
+        self._lengths.pop(old_addr, None)
+        if old_addr in self._latency:
+            self._latency[new_addr] = self._latency.pop(old_addr)
+        with self._state_lock:
+            if old_addr in self._stats:
+                self._stats[new_addr] = self._stats.pop(old_addr)
+        if self._history is not None and old_addr in self._history:
+            self._history[new_addr] = self._history.pop(old_addr)
         if not self.silent:
             print("cmd sent: \"", cmd, "\" to I2C address", old_addr)
             print(self._sensors[self._addresses.index(new_addr)].upper(),"EZO module I2C address changed from", old_addr, "to", new_addr)
             print("IMPORTANT: don't forget to update your local address list and/or variable...")
-        time.sleep(self._long_timeout)
+        if self._topology_cache is not None:
+            self._save_topology()
+        self._sleep(self._long_timeout)
 
     def addr_reset(self):
         if not self.silent:
             print("\n-!-!-!-!-!-!-!- RESETTING EZO MODULES ADDRESSES TO DEFAULT VALUES -!-!-!-!-!-!-!-")
 
         self._def_addresses = [self._def_rtd_add, self._def_ph_add, self._def_ec_add, self._def_do_add, self._def_orp_add]
-
-        time.sleep(self._short_timeout)
-
-        self.scan()
-
-        if not self.silent:
-            print("\n")
-
-        i = 1
-        for addr in self._addresses:
-            continue_looping = True
-            while continue_looping:
+        targets = dict((self._addresses[n], self._def_addresses[self._def_sensors.index(self._sensors[n])]) for n in range(len(self._addresses)))
+        first, second = self._addr_plan(targets)
+
+        location = dict((addr, addr) for addr in self._init_addresses + self._addresses)  # {address before reset: current address}
+        for wave in [first, second]:
+            if not wave:
+                continue
+            for src, dst in wave:  # all commands of a wave sent at once, EZO modules reboot at their new address in parallel.
+                cmd = "I2C," + str(dst)
                 try:
-                    self._bus.read_byte(i)
+                    self._transport.send(src, cmd)
                 except (IOError, OSError):
-                    time.sleep(self._short_timeout)
-                    self.addr_change(addr, i)
-                    continue_looping = False
-                i += 1
-
-        self.scan()
-
-        if not self.silent:
-            print("\n")
-
-        for n in range(len(self._addresses)):
-            self.addr_change(self._addresses[n], self._def_addresses[self._def_sensors.index(self._sensors[n])])
-            self._addresses[n] = self._def_addresses[self._def_sensors.index(self._sensors[n])]
-            if not self.silent:
-                print(self._sensors[n].upper(), "I2C address reset to default value:", self._addresses[n])
+                    pass  # detected by _addr_settle().
+                if not self.silent:
+                    print("cmd sent: \"", cmd, "\" to I2C address", src)
+            missing = self._addr_settle([dst for src, dst in wave])
+            moves = dict(wave)
+            for addr in location:
+                if location[addr] in moves and moves[location[addr]] not in missing:
+                    location[addr] = moves[location[addr]]
+            if missing:
+                if not self.silent:
+                    print("No EZO module answering at I2C addresses", missing, "after address change, scanning the bus...")
+                self.scan()
+                if self.mode == "dev":
+                    raise AddrChangeError
+                return
+
+        for addr in location:
+            if location[addr] != addr:
+                self._continuous.pop(addr, None)  # continuous mode left by the reboot of the EZO module.
+                self._prior_modes.pop(addr, None)
+        self._init_addresses = [location[addr] for addr in self._init_addresses]
+        self._addresses = [location[addr] for addr in self._addresses]
+        self._latency = dict((location.get(addr, addr), entry) for addr, entry in self._latency.items())
+        self._outputs = dict((location.get(addr, addr), entry) for addr, entry in self._outputs.items())
+        with self._state_lock:
+            self._stats = dict((location.get(addr, addr), entry) for addr, entry in self._stats.items())
+        if self._history is not None:
+            self._history = dict((location.get(addr, addr), entry) for addr, entry in self._history.items())
+        self._lengths = {}
+        if self._topology_cache is not None:
+            self._save_topology()
 
         if not self.silent:
+            for n in range(len(self._addresses)):
+                if self._addresses[n] == self._def_addresses[self._def_sensors.index(self._sensors[n])]:
+                    print(self._sensors[n].upper(), "I2C address reset to default value:", self._addresses[n])
             print("\n-!-!-!-!-!-!-!- RESETTING COMPLETE -!-!-!-!-!-!-!-")
-        time.sleep(self._long_timeout)
 
     def mode_change(self, mode=""):
         if not isinstance(mode, str) or not mode.lower() in ["", "dev", "op"]:
@@ -684,26 +1940,261 @@ class AtlasHydroTools:
             if not self.silent:
                 print("Mode switched to development. All known errors will be raised.")
 
+    def poll_config(self, poll=True, first=None, interval=None, backoff=None, max_interval=None, deadline=None):
+        for value in [first, interval, backoff, max_interval, deadline]:
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                raise PollConfigError
+        if backoff is not None and backoff < 1:
+            raise PollConfigError
+
+        self.poll = bool(poll)
+        if first is not None:
+            self._poll_first = float(first)
+        if interval is not None:
+            self._poll_interval = float(interval)
+        if backoff is not None:
+            self._poll_backoff = float(backoff)
+        if max_interval is not None:
+            self._poll_max_interval = float(max_interval)
+        if deadline is not None:
+            self._poll_deadline = float(deadline)
+        if not self.silent:
+            print("Ready-polling:", self.poll, "\b, first check after", self._poll_first * 1000, "msec, interval", self._poll_interval * 1000, "msec, backoff", self._poll_backoff, "\b, max interval", self._poll_max_interval * 1000, "msec, deadline", self._poll_deadline * 1000, "msec")
+
     def cmd(self, addr, cmd):
-        if self.mode =="op":
-            try:
-                addr = self._check_addr(addr)
-                cmd = str(cmd) + "\00"
-                fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-                self._file_write.write(cmd.encode('latin-1'))
-                if not self.silent:
-                    print("custom cmd sent: \"", cmd, "\" to I2C address", addr)
-                time.sleep(self._long_timeout)
-            except Exception:
-                pass
-        elif self.mode == "dev":
+        with self._module_locks([addr]):
+            if self.mode =="op":
+                try:
+                    self._send(self._check_addr(addr), str(cmd))
+                    self._sleep(self._long_timeout)
+                except Exception:
+                    pass
+            elif self.mode == "dev":
+                self._send(self._check_addr(addr), str(cmd))
+                self._sleep(self._long_timeout)
+
+    def submit_read(self, addr, rt=True, temp=default_temp):
+        if futures is None:
+            raise ImportError("submit_read() needs concurrent.futures (\"futures\" package on python2)")
+        if self._executor is None:
+            with self._state_lock:
+                if self._executor is None:
+                    self._executor = futures.ThreadPoolExecutor(max_workers=len(self._def_sensors))  # one thread per EZO module type, more would only wait for the conversation locks.
+        return self._executor.submit(self.read, addr, rt, temp)
+
+    def latency(self, addr=None):
+        if addr is not None:
             addr = self._check_addr(addr)
-            cmd = str(cmd) + "\00"
-            fcntl.ioctl(self._file_write, self._I2C_SLAVE, addr)
-            self._file_write.write(cmd.encode('latin-1'))
+        model = {}
+        for address in self._addresses:
+            i = self._addresses.index(address)
+            model[address] = {"sensor": self._sensors[i], "version": self._versions[i]}
+            for cmd in self._def_latency.get(self._sensors[i], {}):
+                learned = self._latency_model(address, cmd)
+                model[address][cmd] = {"timeout": self._timeout(address, cmd),
+                                       "ewma": learned[0] if learned is not None else None,
+                                       "samples": learned[1] if learned is not None else 0}
+        if addr is not None:
+            return model[addr]
+        return model
+
+    def latency_config(self, alpha=None, margin=None):
+        for value in [alpha, margin]:
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise LatencyConfigError
+        if (alpha is not None and not 0 < alpha <= 1) or (margin is not None and not 0 <= margin < 1):
+            raise LatencyConfigError
+
+        if alpha is not None:
+            self._latency_alpha = float(alpha)
+        if margin is not None:
+            self._latency_margin = float(margin)
+
+    def latency_reset(self, addr=None):
+        if addr is None:
+            self._latency = {}
+        else:
+            self._latency.pop(self._check_addr(addr), None)
+        if not self.silent:
+            print("Learned latencies forgotten for", "all EZO modules" if addr is None else "I2C address " + str(addr))
+
+    def latency_save(self, path):
+        with open(path, "w") as f:
+            json.dump({"alpha": self._latency_alpha, "margin": self._latency_margin,
+                       "modules": dict((str(address), entry) for address, entry in self._latency.items())}, f, indent=4)
+        if not self.silent:
+            print("Learned latencies saved to", path)
+
+    def latency_load(self, path):
+        with open(path) as f:
+            try:
+                content = json.load(f)
+                latency = {}
+                for address, entry in content["modules"].items():
+                    latency[int(address)] = {"sensor": str(entry.pop("sensor")), "version": float(entry.pop("version"))}
+                    for cmd, model in entry.items():
+                        latency[int(address)][str(cmd)] = [float(model[0]), int(model[1])]
+                alpha = float(content["alpha"])
+                margin = float(content["margin"])
+            except (ValueError, KeyError, TypeError, AttributeError, IndexError):
+                raise LatencyFileError
+        self.latency_config(alpha, margin)
+        self._latency = latency
+        if not self.silent:
+            print("Learned latencies loaded from", path, "for I2C addresses", sorted(latency))
+
+    def stats(self, addr=None):
+        if addr is not None:
+            addr = self._stats_addr(addr)
+        with self._state_lock:
+            if addr is None:
+                return copy.deepcopy(self._stats)
+            return copy.deepcopy(self._stats.get(addr, {}))
+
+    def stats_reset(self, addr=None):
+        with self._state_lock:
+            if addr is None:
+                self._stats = {}
+            else:
+                addr = self._stats_addr(addr)
+                self._stats.pop(addr, None)
+        if not self.silent:
+            print("Metrics forgotten for", "all EZO modules" if addr is None else "I2C address " + str(addr))
+
+    def stats_export(self, path):
+        histogram, sleep, polls, errors, values = [], [], [], [], []
+        stats = self.stats()
+        for addr in sorted(stats):
+            entry = stats[addr]
+            sensor = self._sensors[self._addresses.index(addr)] if addr in self._addresses else ""
+            module = 'bus="%s",address="%s",sensor="%s"' % (self._def_bus, addr, sensor)
+            for cmd in sorted(entry["commands"]):
+                metric = entry["commands"][cmd]
+                labels = module + ',command="%s"' % cmd
+                count = 0
+                for bound, n in zip(list(self.stats_buckets) + ["+Inf"], metric["buckets"]):  # Prometheus buckets are cumulative.
+                    count += n
+                    histogram.append('atlas_ezo_transaction_seconds_bucket{%s,le="%s"} %d' % (labels, bound, count))
+                histogram.append('atlas_ezo_transaction_seconds_sum{%s} %r' % (labels, metric["sum"]))
+                histogram.append('atlas_ezo_transaction_seconds_count{%s} %d' % (labels, metric["count"]))
+                sleep.append('atlas_ezo_sleep_seconds_total{%s} %r' % (labels, metric["sleep"]))
+                polls.append('atlas_ezo_status_checks_total{%s} %d' % (labels, metric["polls"]))
+            for name in sorted(entry["errors"]):
+                errors.append('atlas_ezo_errors_total{%s,error="%s"} %d' % (module, name, entry["errors"][name]))
+            for value in sorted(entry["sentinels"]):
+                values.append('atlas_ezo_error_values_total{%s,value="%s"} %d' % (module, value, entry["sentinels"][value]))
+
+        lines = ["# HELP atlas_ezo_transaction_seconds Time from read command sent to response read.",
+                 "# TYPE atlas_ezo_transaction_seconds histogram"] + histogram + [
+                 "# HELP atlas_ezo_sleep_seconds_total Time slept waiting for responses.",
+                 "# TYPE atlas_ezo_sleep_seconds_total counter"] + sleep + [
+                 "# HELP atlas_ezo_status_checks_total Status byte checks made waiting for responses.",
+                 "# TYPE atlas_ezo_status_checks_total counter"] + polls + [
+                 "# HELP atlas_ezo_errors_total EZOnotConnected, EZOnotReady and EZOError errors, raised or returned.",
+                 "# TYPE atlas_ezo_errors_total counter"] + errors + [
+                 "# HELP atlas_ezo_error_values_total Error values returned in operation mode.",
+                 "# TYPE atlas_ezo_error_values_total counter"] + values
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.rename(path + ".tmp", path)  # atomic replacement, the file is never read half written.
+        if not self.silent:
+            print("Metrics exported to", path)
+
+    def sink_add(self, sink):
+        if sink not in self._sinks:
+            self._sinks.append(sink)
+
+    def sink_remove(self, sink):
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+
+    def history_start(self, capacity=4096):
+        if isinstance(capacity, bool) or not isinstance(capacity, int) or capacity <= 0:
+            raise HistoryError
+        with self._state_lock:
+            self._history_capacity = capacity
+            self._history = {}
+        self._history_rings()
+        if not self.silent:
+            print("Keeping the last", capacity, "readings of every EZO module")
+
+    def history_stop(self):
+        with self._state_lock:
+            self._history = None
+
+    def history(self, addr, last=None, since=None):
+        if self._history is None:
+            raise HistoryError
+        addr = self._check_addr(addr)
+        with self._state_lock:
+            ring = self._history.get(addr)
+            timestamps, values, statuses = ring.window(last, since) if ring is not None else (array.array("d"), array.array("d"), array.array("H"))
+        if numpy is not None:
+            return numpy.asarray(timestamps, dtype=float), numpy.asarray(values, dtype=float), numpy.asarray(statuses, dtype=numpy.uint16)
+        return timestamps, values, statuses
+
+    def history_resample(self, addr, period, since=None):
+        if isinstance(period, bool) or not isinstance(period, (int, float)) or period <= 0:
+            raise HistoryError
+        timestamps, values, statuses = self.history(addr, None, since)
+        start = since if since is not None else (timestamps[0] if len(timestamps) else 0.0)
+        if numpy is not None:
+            bins = ((timestamps - start) // period).astype(int)
+            size = bins[-1] + 1 if len(bins) else 0
+            valid = statuses == STATUS_OK
+            sums = numpy.bincount(bins[valid], values[valid], size)
+            counts = numpy.bincount(bins[valid], minlength=size)
+            with numpy.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts  # NaN for periods without valid reading.
+            return start + period * numpy.arange(size), means
+        size = int((timestamps[-1] - start) // period) + 1 if len(timestamps) else 0
+        sums = [0.0] * size
+        counts = [0] * size
+        for timestamp, value, status in zip(timestamps, values, statuses):
+            if status == STATUS_OK:
+                i = int((timestamp - start) // period)
+                sums[i] += value
+                counts[i] += 1
+        return (array.array("d", [start + period * i for i in range(size)]),
+                array.array("d", [sums[i] / counts[i] if counts[i] else float("nan") for i in range(size)]))
+
+    def trace_start(self, size=100000):
+        if self._tracer is not None:
+            self.trace_stop()
+        self._tracer = _Tracer(self._def_bus, size)
+        self._transport.transport = _TracedTransport(self._transport.transport, self._tracer)  # inside the bus lock, spans are the transactions only.
+        if not self.silent:
+            print("Bus timeline tracing started")
+
+    def trace_stop(self):
+        if self._tracer is not None:
+            self._transport.transport = self._transport.transport.transport
+            self._transport.transport._tracer = None
+            self._last_tracer = self._tracer
+            self._tracer = None
             if not self.silent:
-                print("custom cmd sent: \"", cmd, "\" to I2C address", addr)
-            time.sleep(self._long_timeout)
+                print("Bus timeline tracing stopped")
+
+    def trace_export(self, path):
+        tracer = self._tracer if self._tracer is not None else self._last_tracer
+        if tracer is None:
+            raise TraceError
+        names = dict((address, "I2C address " + str(address) + " (" + sensor + ")") for address, sensor in zip(self._addresses, self._sensors))
+        with open(path, "w") as f:
+            json.dump(tracer.events(names), f)
+        if not self.silent:
+            print("Bus timeline exported to", path)
+
+    def ready(self):
+        if self._ready_future is None:
+            raise ImportError("ready() needs concurrent.futures (\"futures\" package on python2), please use wait_ready()")
+        return self._ready_future
+
+    def wait_ready(self, timeout=None):
+        done = self._ready.wait(timeout)
+        if done and self._discovery_error is not None and self.mode == "dev":
+            raise self._discovery_error
+        return done
 
     def addresses(self):
         return self._addresses
@@ -718,6 +2209,530 @@ class AtlasHydroTools:
         return self._units
 
 
+class Transport(abc.ABCMeta("_Transport", (object,), {})):  # abstract base class, same syntax for python2 and python3.
+
+    _tracer = None  # set by AtlasHydroTools.trace_start() to trace transport internal operations.
+    _fixed_commands = ["R", "I", "sleep", "Sleep", "L,0", "L,1"]  # commands of which the frames are encoded by the constructor.
+    _frames_size = 64  # maximum number of cached frames of parameterised commands (64 by default).
+
+    def __init__(self, bus=1):
+        self._fixed_frames = dict((cmd, self._encode(cmd)) for cmd in self._fixed_commands)  # {command: encoded frame} of fixed commands.
+        self._frames = OrderedDict()  # {command: encoded frame} of last parameterised commands.
+
+    def _encode(self, cmd):
+        return (cmd + "\00").encode('latin-1')
+
+    def frame(self, cmd):
+        frame = self._fixed_frames.get(cmd)
+        if frame is None:
+            frame = self._frames.get(cmd)
+            if frame is None:
+                frame = self._encode(cmd)
+                if len(self._frames) >= self._frames_size:
+                    self._frames.popitem(last=False)
+                self._frames[cmd] = frame
+        return frame
+
+    @abc.abstractmethod
+    def send(self, addr, cmd):
+        pass
+
+    @abc.abstractmethod
+    def read(self, addr, length=16):
+        pass
+
+    @abc.abstractmethod
+    def probe(self, addr):
+        pass
+
+    def close(self):
+        pass
+
+
+class SMBusTransport(Transport):
+
+    _module = "smbus"  # python module offering SMBus class.
+
+    def __init__(self, bus=1):
+        Transport.__init__(self, bus)
+        try:
+            module = __import__(self._module)
+        except ImportError:
+            raise TransportError("ERROR: python module \"" + self._module + "\" needed by " + type(self).__name__ + " is not installed")
+        self._file_write = io.open("/dev/i2c-" + str(bus), "wb", buffering=0)  # used to send commands to EZO modules of more than one char (eg. "RT,23.2").
+        self._bus = module.SMBus(bus)  # used to send one char commands to EZO modules and read from EZO modules.
+        self._slave = None  # slave address currently selected on self._file_write (None if unknown).
+
+    def _select(self, addr):
+        if addr != self._slave:
+            self._slave = None  # unknown until the ioctl succeeded.
+            if self._tracer is None:
+                fcntl.ioctl(self._file_write, I2C_SLAVE, addr)
+            else:
+                start = _clock()
+                fcntl.ioctl(self._file_write, I2C_SLAVE, addr)
+                self._tracer.span("ioctl I2C_SLAVE", "ioctl", start, _clock(), addr)
+            self._slave = addr
+
+    def send(self, addr, cmd):
+        if len(cmd) == 1:
+            self._bus.write_byte(addr, ord(cmd))
+        else:
+            self._select(addr)
+            self._file_write.write(self.frame(cmd))
+
+    def read(self, addr, length=16):
+        return self._bus.read_i2c_block_data(addr, 0x32, length)
+
+    def probe(self, addr):
+        self._bus.read_byte(addr)
+
+    def close(self):
+        self._bus.close()
+        self._file_write.close()
+
+
+class SMBus2Transport(SMBusTransport):
+
+    _module = "smbus2"
+
+
+class _I2CMsg(ctypes.Structure):  # struct i2c_msg of linux/i2c.h
+    _fields_ = [("addr", ctypes.c_uint16),
+                ("flags", ctypes.c_uint16),
+                ("len", ctypes.c_uint16),
+                ("buf", ctypes.POINTER(ctypes.c_uint8))]
+
+
+class _I2CRdwrData(ctypes.Structure):  # struct i2c_rdwr_ioctl_data of linux/i2c-dev.h
+    _fields_ = [("msgs", ctypes.POINTER(_I2CMsg)),
+                ("nmsgs", ctypes.c_uint32)]
+
+
+class RawTransport(Transport):
+
+    def __init__(self, bus=1):
+        Transport.__init__(self, bus)
+        self._fd = os.open("/dev/i2c-" + str(bus), os.O_RDWR)  # only file descriptor used to communicate with EZO modules.
+        self._msgs = (_I2CMsg * 2)()  # messages of the batches, reused by every transaction.
+        self._rdwr = _I2CRdwrData(ctypes.cast(self._msgs, ctypes.POINTER(_I2CMsg)), 0)
+        self._register = (ctypes.c_uint8 * 1)(0x32)  # byte written before reading a response (same transaction as smbus read_i2c_block_data(addr, 0x32, length)).
+        self._buffers = {}  # {length: response buffer}, reused by every read.
+
+    def _encode(self, cmd):
+        frame = (cmd + "\00").encode('latin-1')
+        return (ctypes.c_uint8 * len(frame)).from_buffer_copy(frame)
+
+    def _message(self, i, addr, flags, buf):
+        msg = self._msgs[i]
+        msg.addr = addr
+        msg.flags = flags
+        msg.len = len(buf)
+        msg.buf = ctypes.cast(buf, ctypes.POINTER(ctypes.c_uint8))
+
+    def _transfer(self, nmsgs):
+        self._rdwr.nmsgs = nmsgs
+        fcntl.ioctl(self._fd, I2C_RDWR, self._rdwr)
+
+    def _buffer(self, length):
+        if length not in self._buffers:
+            self._buffers[length] = (ctypes.c_uint8 * length)()
+        return self._buffers[length]
+
+    def send(self, addr, cmd):
+        self._message(0, addr, 0, self.frame(cmd))
+        self._transfer(1)
+
+    def read(self, addr, length=16):
+        buf = self._buffer(length)
+        self._message(0, addr, 0, self._register)
+        self._message(1, addr, I2C_M_RD, buf)
+        self._transfer(2)
+        return list(buf)
+
+    def probe(self, addr):
+        self._message(0, addr, I2C_M_RD, self._buffer(1))
+        self._transfer(1)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class MemoryTransport(Transport):
+
+    def __init__(self, bus=1, devices=None):
+        Transport.__init__(self, bus)
+        self.devices = dict(devices) if devices is not None else {}  # {address: device} of the devices on the bus.
+
+    def _device(self, addr):
+        if addr not in self.devices:
+            raise IOError(errno.ENXIO, "No such device or address")
+        return self.devices[addr]
+
+    def send(self, addr, cmd):
+        self._device(addr).command(cmd)
+
+    def read(self, addr, length=16):
+        return list(self._device(addr).response(length))
+
+    def probe(self, addr):
+        self._device(addr)
+
+
+class _Tracer(object):  # events of a bus timeline, exported as Chrome Trace Event JSON.
+
+    def __init__(self, bus, size):
+        self._bus = bus
+        self._events = deque(maxlen=size)  # (name, category, start, end, address, args), oldest events dropped once full.
+
+    def span(self, name, category, start, end, addr=None, args=None):
+        self._events.append((name, category, start, end, addr, args))
+
+    def events(self, names):
+        events = [{"name": "process_name", "ph": "M", "pid": self._bus, "tid": 0, "args": {"name": "I2C bus " + str(self._bus)}},
+                  {"name": "thread_name", "ph": "M", "pid": self._bus, "tid": 0, "args": {"name": "AtlasHydroTools"}}]
+        lanes = set()
+        for name, category, start, end, addr, args in list(self._events):
+            tid = addr if isinstance(addr, int) else 0  # one lane per I2C address, functions and other sleeps on lane 0.
+            if tid not in lanes and tid != 0:
+                lanes.add(tid)
+                events.append({"name": "thread_name", "ph": "M", "pid": self._bus, "tid": tid, "args": {"name": names.get(tid, "I2C address " + str(tid))}})
+            events.append({"name": name, "cat": category, "ph": "X", "pid": self._bus, "tid": tid,
+                           "ts": start * 1e6, "dur": (end - start) * 1e6, "args": args or {}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class _TracedTransport(object):  # transport recording the operations of transport in tracer.
+
+    def __init__(self, transport, tracer):
+        self.transport = transport
+        self._tracer = tracer
+        transport._tracer = tracer
+
+    def __getattr__(self, name):  # other attributes are the ones of the traced transport (eg. SimBus.transactions).
+        if name == "transport":
+            raise AttributeError(name)
+        return getattr(self.transport, name)
+
+    def _span(self, name, category, start, addr, args):
+        self._tracer.span(name, category, start, _clock(), addr, args)
+
+    def send(self, addr, cmd):
+        start = _clock()
+        try:
+            self.transport.send(addr, cmd)
+        except Exception as error:
+            self._span(cmd, "write", start, addr, {"error": str(error)})
+            raise
+        self._span(cmd, "write", start, addr, None)
+
+    def read(self, addr, length=16):
+        start = _clock()
+        try:
+            res = self.transport.read(addr, length)
+        except Exception as error:
+            self._span("read", "read", start, addr, {"error": str(error)})
+            raise
+        self._span("read", "poll" if res[0] == 254 else "read", start, addr, {"status": res[0]})  # 254: EZO module still processing the command.
+        return res
+
+    def probe(self, addr):
+        start = _clock()
+        try:
+            self.transport.probe(addr)
+        except Exception:
+            self._span("probe", "probe", start, addr, {"answered": False})
+            raise
+        self._span("probe", "probe", start, addr, {"answered": True})
+
+    def close(self):
+        self.transport.close()
+
+
+class _LockedTransport(object):  # transport whose transactions are serialised by lock, so that the slave address selection of one thread is never followed by the transaction of another one.
+
+    def __init__(self, transport, lock):
+        self.transport = transport
+        self._lock = lock
+
+    def __getattr__(self, name):  # other attributes are the ones of the transport (eg. SimBus.transactions, MemoryTransport.devices), not locked.
+        if name == "transport":
+            raise AttributeError(name)
+        return getattr(self.transport, name)
+
+    def send(self, addr, cmd):
+        with self._lock:
+            self.transport.send(addr, cmd)
+
+    def read(self, addr, length=16):
+        with self._lock:
+            return self.transport.read(addr, length)
+
+    def probe(self, addr):
+        with self._lock:
+            self.transport.probe(addr)
+
+    def close(self):
+        with self._lock:
+            self.transport.close()
+
+
+class _UnsizedTransport(object):  # transport whose read() function takes no length argument, given the interface of the other ones.
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def __getattr__(self, name):
+        if name == "transport":
+            raise AttributeError(name)
+        return getattr(self.transport, name)
+
+    @staticmethod
+    def sized(transport):  # True if read() function of transport takes a length argument (or if it can't be told).
+        try:
+            spec = inspect.getfullargspec(transport.read) if hasattr(inspect, "getfullargspec") else inspect.getargspec(transport.read)
+        except TypeError:  # built-in function.
+            return True
+        return spec.varargs is not None or len(spec.args) - int(inspect.ismethod(transport.read)) >= 2
+
+    def send(self, addr, cmd):
+        self.transport.send(addr, cmd)
+
+    def read(self, addr, length=16):
+        return self.transport.read(addr)
+
+    def probe(self, addr):
+        self.transport.probe(addr)
+
+    def close(self):
+        self.transport.close()
+
+
+class _Locks(object):  # context manager holding several locks, acquired in the given order.
+
+    def __init__(self, locks):
+        self._locks = locks
+
+    def __enter__(self):
+        acquired = []
+        try:
+            for lock in self._locks:
+                lock.acquire()
+                acquired.append(lock)
+        except BaseException:  # locks already acquired released, eg. on KeyboardInterrupt.
+            for lock in reversed(acquired):
+                lock.release()
+            raise
+
+    def __exit__(self, *args):
+        for lock in reversed(self._locks):
+            lock.release()
+
+
+_transports = {"smbus": SMBusTransport, "smbus2": SMBus2Transport, "raw": RawTransport}  # transports selectable by name in AtlasHydroTools constructor (a MemoryTransport is useless without its' devices).
+
+
+class _Ring(object):  # fixed capacity ring buffer of the (timestamp, reading, status code) of one EZO module.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array.array("d", [0.0]) * capacity  # allocated once.
+        self.values = array.array("d", [0.0]) * capacity
+        self.statuses = array.array("H", [0]) * capacity
+        self.count = 0  # number of readings appended since creation.
+
+    def append(self, timestamp, value, status):
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.values[i] = value
+        self.statuses[i] = status
+        self.count += 1
+
+    def _slice(self, column, first, size):  # readings first to size - 1 (0 = oldest kept) of column, in time order.
+        start = (self.count - size + first) % self.capacity
+        end = start + size - first
+        if end <= self.capacity:
+            return column[start:end]
+        return column[start:] + column[:end - self.capacity]
+
+    def window(self, last=None, since=None):
+        size = min(self.count, self.capacity)
+        first = max(0, size - last) if last is not None else 0
+        if since is not None:  # binary search of the first reading made at since or later.
+            low, high = first, size
+            oldest = self.count - size
+            while low < high:
+                middle = (low + high) // 2
+                if self.timestamps[(oldest + middle) % self.capacity] < since:
+                    low = middle + 1
+                else:
+                    high = middle
+            first = low
+        return self._slice(self.timestamps, first, size), self._slice(self.values, first, size), self._slice(self.statuses, first, size)
+
+
+class _BusJob(object):  # call queued to a MultiBusHydroTools bus worker.
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def run(self, tools):
+        try:
+            if callable(self.function):
+                self._value = self.function(tools, *self.args)
+            else:
+                self._value = getattr(tools, self.function)(*self.args)
+        except Exception as error:
+            self._error = error
+        self._done.set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise BusTimeoutError
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class MultiBusHydroTools:
+
+    default_temp = AtlasHydroTools.default_temp
+
+    # ========== CONSTRUCTOR/DESTRUCTOR (please refer to descriptions in this file header) ==========#
+
+    def __init__(self, buses=(1,), mode="op", silent=True, keep_awake=True, poll=False, cache=None, transport="smbus"):
+        self._buses = list(buses)
+        self._tools = {}  # {bus: AtlasHydroTools object}
+        self._queues = {}  # {bus: queue of _BusJob objects to be run by the bus worker}
+        self._workers = []
+        if len(set(self._buses)) != len(self._buses):  # a second worker of a bus would never be stopped.
+            raise BusError("ERROR: bus given more than once to MultiBusHydroTools constructor. Each bus should be given once")
+
+        started = []
+        for bus in self._buses:
+            self._queues[bus] = queue.Queue()
+            bus_cache = cache.replace("{bus}", str(bus)) if cache is not None else None
+            job = _BusJob(lambda tools, *args: AtlasHydroTools(*args), (mode, silent, keep_awake, poll, bus_cache, True, bus, transport))
+            worker = threading.Thread(target=self._worker, args=(self._queues[bus], job), name="AtlasHydroTools bus " + str(bus))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+            started.append(job)
+
+        try:
+            for bus, job in zip(self._buses, started):
+                self._tools[bus] = job.result()
+        except Exception:
+            self.close()
+            raise
+
+    def __del__(self):
+        if getattr(self, "_workers", None) is not None:  # constructor failed before the workers list was set.
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ========== PRIVATE FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    @staticmethod
+    def _worker(jobs, job):  # runs constructor job, then queued jobs of the bus until close() is called. Not bound to the object, so that running workers never keep it alive.
+        job.run(None)
+        if job._error is not None:
+            return
+        tools = job._value
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            job.run(tools)
+
+# ========== PUBLIC FUNCTIONS (please refer to descriptions in this file header) ==========#
+
+    def submit(self, bus, function, *args):
+        if bus not in self._tools:
+            raise BusError
+        job = _BusJob(function, args)
+        self._queues[bus].put(job)
+        return job
+
+    def run(self, bus, function, *args):
+        return self.submit(bus, function, *args).result()
+
+    def read(self, addr, rt=True, temp=default_temp):
+        return self.run(addr[0], "read", addr[1], rt, temp)
+
+    def read_multi(self, addr, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"):
+        if mode.lower() not in ["seq", "sim", "spec"] or form.lower() not in ["float", "record", "array"]:
+            raise ReadMultiError
+        if any(address[0] not in self._tools for address in addr):  # checked before any job is queued, so that no bus is read for nothing.
+            raise BusError
+        if form.lower() == "array" and numpy is None:
+            raise ImportError("numpy is needed for read_multi() \"array\" form")
+
+        jobs = []
+        for bus in self._buses:
+            indexes = [i for i in range(len(addr)) if addr[i][0] == bus]
+            if indexes:
+                jobs.append((indexes, self.submit(bus, "read_multi", [addr[i][1] for i in indexes], mode, rt, manual_temp_override, override_temp, form)))
+
+        if form.lower() == "array":
+            readings = numpy.empty(len(addr), dtype=READING_DTYPE)
+            for indexes, job in jobs:
+                readings[indexes] = job.result()
+            return readings
+        readings = [None] * len(addr)
+        for indexes, job in jobs:
+            for i, reading in zip(indexes, job.result()):
+                readings[i] = reading
+        return readings
+
+    def read_all(self, mode="seq", rt=True, manual_temp_override=False, override_temp=default_temp, form="float"):
+        return self.read_multi(self.addresses(), mode, rt, manual_temp_override, override_temp, form)
+
+    def set_t(self, temp=default_temp):
+        for job in [self.submit(bus, "set_t", temp) for bus in self._buses]:
+            job.result()
+
+    def buses(self):
+        return list(self._buses)
+
+    def bus(self, bus):
+        if bus not in self._tools:
+            raise BusError
+        return self._tools[bus]
+
+    def addresses(self):
+        return [(bus, addr) for bus in self._buses for addr in self._tools[bus].addresses()]
+
+    def sensors(self):
+        return [sensor for bus in self._buses for sensor in self._tools[bus].sensors()]
+
+    def versions(self):
+        return [version for bus in self._buses for version in self._tools[bus].versions()]
+
+    def units(self):
+        return [unit for bus in self._buses for unit in self._tools[bus].units()]
+
+    def close(self):
+        for bus in self._queues:
+            self._queues[bus].put(_BusJob("close", ()))  # AtlasHydroTools object closed by its' own worker.
+            self._queues[bus].put(None)
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join()
+        self._workers = []
+        self._queues = {}
+        self._tools = {}
+
+
 # ========== LIBRARY RELATED EXCEPTIONS ==========#
 
 class AddrTypeError(Exception):
@@ -745,13 +2760,57 @@ class ModeError(Exception):
         super(ModeError, self).__init__(msg)
 
 class ReadMultiError(Exception):
-    def __init__(self, msg="ERROR: incorrect read_all() mode argument. Please use \"seq\" or \"sim\""):
+    def __init__(self, msg="ERROR: incorrect read_all() mode or form argument. Please use \"seq\", \"sim\" or \"spec\" mode and \"float\", \"record\" or \"array\" form"):
         super(ReadMultiError, self).__init__(msg)
 
 class AddrChangeError(Exception):
     def __init__(self, msg="ERROR: new address already taken by other EZO module OR new address is not an integer OR new address in not in range 1-127 !"):
         super(AddrChangeError, self).__init__(msg)
 
+class LatencyConfigError(Exception):
+    def __init__(self, msg="ERROR: incorrect latency_config() argument. alpha should be a number in range ]0, 1] and margin a number in range [0, 1["):
+        super(LatencyConfigError, self).__init__(msg)
+
+class LatencyFileError(Exception):
+    def __init__(self, msg="ERROR: file given to latency_load() is not a latency model saved with latency_save()"):
+        super(LatencyFileError, self).__init__(msg)
+
+class StreamError(Exception):
+    def __init__(self, msg="ERROR: incorrect stream() argument. rate should be a positive number (cycles per second), buffer a positive integer and cycles None or a positive integer"):
+        super(StreamError, self).__init__(msg)
+
+class BusError(Exception):
+    def __init__(self, msg="ERROR: bus not managed by this MultiBusHydroTools object. EZO modules should be addressed with (bus, addr) tuples"):
+        super(BusError, self).__init__(msg)
+
+class BusTimeoutError(Exception):
+    def __init__(self, msg="ERROR: bus worker job not done before timeout"):
+        super(BusTimeoutError, self).__init__(msg)
+
+class PollConfigError(Exception):
+    def __init__(self, msg="ERROR: incorrect poll_config() argument. Timings should be positive numbers (in seconds) and backoff should be greater than or equal to 1"):
+        super(PollConfigError, self).__init__(msg)
+
+class TransportError(Exception):
+    def __init__(self, msg="ERROR: incorrect transport argument. Please use \"smbus\", \"smbus2\", \"raw\" or a transport object offering send(), read(), probe() and close() functions"):
+        super(TransportError, self).__init__(msg)
+
+class TraceError(Exception):
+    def __init__(self, msg="ERROR: no bus timeline to export. Please call trace_start() first"):
+        super(TraceError, self).__init__(msg)
+
+class ContinuousError(Exception):
+    def __init__(self, msg="ERROR: incorrect continuous() argument. period should be an integer in range 0-99 (seconds between two readings, 0 to leave continuous mode)"):
+        super(ContinuousError, self).__init__(msg)
+
+class HistoryError(Exception):
+    def __init__(self, msg="ERROR: no readings kept (please call history_start() first), incorrect history_start() capacity (should be a positive integer) or incorrect history_resample() period (should be a positive number of seconds)"):
+        super(HistoryError, self).__init__(msg)
+
+class OutputError(Exception):
+    def __init__(self, msg="ERROR: incorrect output() argument. Output parameters are only available for EC ([\"ec\", \"tds\", \"s\", \"sg\"]) and DO ([\"mg\", \"%\"]) EZO modules"):
+        super(OutputError, self).__init__(msg)
+
 
 # Example of library functions usage. Runs flawlessly (so far...) on an RPi 3 B+ with an Atlas Scientific Tentacle T3 hat and three EZO modules (RTD, pH and EC) connected to Atlas Scientific PT-1000, pH and K0.1 probes.
 if __name__ == '__main__':
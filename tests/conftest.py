@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # library modules are at the repository root.
+
+import atlas_hydro_tools  # noqa: E402
+from atlas_hydro_sim import SimBus  # noqa: E402
+from atlas_hydro_tools import AtlasHydroTools  # noqa: E402
+
+
+class _VirtualClock(object):  # _clock() replacement moved forward by time.sleep() instead of waiting, so that the SimBus delays take no real time.
+
+    def __init__(self, clock, sleep):
+        self._clock = clock
+        self._sleep = sleep
+        self._offset = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self._clock() + self._offset  # real time still elapses (asyncio sleeps, thread switches).
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._offset += max(0.0, seconds)
+        self._sleep(0)  # lets the other threads run.
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    real = atlas_hydro_tools._clock
+    virtual = _VirtualClock(real, time.sleep)
+    for name, module in list(sys.modules.items()):
+        if name.startswith("atlas_hydro") and getattr(module, "_clock", None) is real:
+            monkeypatch.setattr(module, "_clock", virtual)
+    monkeypatch.setattr(time, "sleep", virtual.sleep)
+    return virtual
+
+
+@pytest.fixture
+def bus():
+    return SimBus(sensors=("rtd", "ph", "ec"))
+
+
+@pytest.fixture
+def tools(bus):
+    tentacle = AtlasHydroTools(transport=bus, poll=True)
+    yield tentacle
+    tentacle.close()
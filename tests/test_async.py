@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from atlas_hydro_async import AsyncAtlasHydroTools
+from atlas_hydro_tools import ReadMultiError, Reading, STATUS_OK, STATUS_NOT_CONNECTED
+
+
+@pytest.fixture(autouse=True)
+def virtual_sleep(clock, monkeypatch):  # asyncio waits moved to the virtual clock as well.
+    sleep = asyncio.sleep
+
+    async def advance(delay, result=None):
+        clock.sleep(delay)
+        return await sleep(0, result)
+
+    monkeypatch.setattr(asyncio, "sleep", advance)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_async_read(bus):
+    async def main():
+        async with await AsyncAtlasHydroTools.create(transport=bus) as tentacle:
+            readings = await asyncio.gather(tentacle.read_t(), tentacle.read_ph())
+            return readings, await tentacle.read_all("sim")
+
+    readings, all_readings = run(main())
+    assert readings == [21.5, 7.0]
+    assert all_readings == [21.5, 7.0, 1413.0]
+
+
+def test_async_close_releases_tools(bus):
+    closed = []
+    close = bus.close
+    bus.close = lambda: (closed.append(True), close())
+
+    async def main():
+        async with await AsyncAtlasHydroTools.create(transport=bus) as tentacle:
+            await tentacle.read_ph()
+        await tentacle.close()  # only the first call has an effect.
+
+    run(main())
+    assert closed == [True]
+
+
+def test_async_read_multi_forms(bus):
+    async def main():
+        async with await AsyncAtlasHydroTools.create(transport=bus) as tentacle:
+            return await tentacle.read_multi(["rtd", "ph", "do"], "sim", form="record"), await tentacle.read_all(form="array")
+
+    records, readings = run(main())
+    assert all(isinstance(record, Reading) for record in records)
+    assert [record.status for record in records] == [STATUS_OK, STATUS_OK, STATUS_NOT_CONNECTED]
+    assert records[1].temp == 21.5  # compensated with the measured temperature.
+    assert list(readings["value"]) == [21.5, 7.0, 1413.0]
+
+
+def test_async_spec_mode(bus):
+    async def main():
+        async with await AsyncAtlasHydroTools.create(transport=bus) as tentacle:
+            first = await tentacle.read_all("spec")  # "sim" mode until a temperature is measured.
+            bus.module("rtd").value = 30.0
+            return first, await tentacle.read_all("spec", form="record")
+
+    first, records = run(main())
+    assert first == [21.5, 7.0, 1413.0]
+    assert [record.value for record in records] == [30.0, 7.0, 1413.0]
+    assert [record.temp for record in records[1:]] == [30.0, 30.0]  # queried again with the measured temperature.
+    assert bus.module("ph").temp == 30.0
+
+
+@pytest.mark.parametrize("args", [{"mode": "par"}, {"form": "dict"}])
+def test_async_read_multi_arguments(bus, args):
+    async def main():
+        async with await AsyncAtlasHydroTools.create(transport=bus) as tentacle:
+            await tentacle.read_all(**args)
+
+    with pytest.raises(ReadMultiError):
+        run(main())
+
+
+def test_async_set_t_waits_measurements(bus):
+    async def main():
+        async with await AsyncAtlasHydroTools.create(transport=bus) as tentacle:
+            reading = asyncio.ensure_future(tentacle.read_ph())
+            await asyncio.sleep(0)  # "R" command sent.
+            await tentacle.set_t(25.0)
+            assert reading.done()  # "T" command sent once the pH EZO module was read.
+            return await reading
+
+    assert run(main()) == 7.0
+    assert bus.module("ph").temp == 25.0
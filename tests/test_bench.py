@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import atlas_hydro_bench
+from atlas_hydro_bench import BenchError, bench
+
+
+def test_bench_read():
+    result = bench("read", ("rtd", "ph"), rt=False, poll=True, repeat=2)
+    assert result["transactions"]["send"] == 1.0 and result["transactions"]["read"] > 1.0
+    assert result["slept"] > 0
+
+
+def test_bench_addr_reset_moves_modules():
+    result = bench("addr_reset", ("rtd", "ph", "ec"), repeat=2)
+    assert result["transactions"]["send"] == 3.0  # one "I2C,addr" command per module, the addr_change() ones not counted.
+    assert result["transactions"]["probe"] >= 3.0
+
+
+def test_bench_operation_without_transaction(monkeypatch):
+    monkeypatch.setattr(atlas_hydro_bench, "_cycle", lambda tools, op, rt: None)
+    with pytest.raises(BenchError):
+        bench("read", ("ph",), repeat=1)
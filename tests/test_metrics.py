@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+
+def test_metrics(tools, bus, tmp_path):
+    tools.read_ph()
+    bus.module("ph").inject("nack")
+    tools.read_ph()
+    tools.read_do()
+    stats = tools.stats()
+    assert stats[99]["commands"]["R"]["count"] == 1
+    assert stats[99]["errors"] == {"EZOError": 1}
+    assert stats[97]["errors"] == {"EZOnotConnected": 1}  # not connected DO EZO module, under its' factory default address.
+    path = str(tmp_path / "ezo.prom")
+    tools.stats_export(path)
+    content = open(path).read()
+    assert "atlas_ezo_transaction_seconds_count" in content and 'address="99"' in content
+    tools.stats_reset("ph")
+    assert tools.stats("ph") == {}
+
+
+@pytest.mark.parametrize("mode", ["seq", "sim", "spec"])
+def test_missing_module_counted_once(tools, mode):
+    tools.read_t()
+    assert tools.read_multi([97, "ph"], mode) == [-100.0, 7.0]
+    assert tools.stats(97)["errors"] == {"EZOnotConnected": 1}
+    assert tools.stats(97)["sentinels"] == {-100.0: 1}
+
+
+def test_rtd_read_once_in_sim_mode(tools, bus):
+    commands = bus.module("rtd").commands
+    tools.read_all("sim")
+    assert bus.module("rtd").commands == commands + 1  # measured first for compensation, not queried again.
+    assert tools.stats("rtd")["commands"]["R"]["count"] == 1
+
+
+def test_trace_export(tools, tmp_path):
+    tools.trace_start()
+    tools.read_ph()
+    tools.trace_stop()
+    path = str(tmp_path / "trace.json")
+    tools.trace_export(path)
+    events = json.load(open(path))["traceEvents"]
+    assert set(["read", "R", "sleep"]) <= set(event["name"] for event in events)  # function span, command written and sleeps.
+    lanes = set(event["tid"] for event in events if event["ph"] == "X" and event["name"] != "read")
+    assert lanes <= set([0, 99])  # pH EZO module lane, sleeps not related to a module on lane 0.
+    assert tools.read_ph() == 7.0  # transport restored.
+
+
+def test_traced_transport_attributes_delegated(tools, bus):
+    tools.trace_start()
+    assert tools._transport.transactions is bus.transactions
+    tools.trace_stop()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+import pytest
+
+from atlas_hydro_sim import SimBus, SimEZO
+from atlas_hydro_tools import AtlasHydroTools, ContinuousError
+
+
+def test_topology_cache_skips_scan(tmp_path, bus):
+    cache = str(tmp_path / "topology.json")
+    AtlasHydroTools(transport=bus, cache=cache).close()
+    assert [module["sensor"] for module in json.load(open(cache))] == ["rtd", "ph", "ec"]
+    probes = bus.transactions["probe"]
+    with AtlasHydroTools(transport=bus, cache=cache) as tentacle:
+        assert tentacle.sensors() == ["rtd", "ph", "ec"]
+    assert bus.transactions["probe"] == probes  # cached modules identified without sweeping the bus.
+
+
+def test_topology_cache_rescans_changed_bus(tmp_path, bus):
+    cache = str(tmp_path / "topology.json")
+    AtlasHydroTools(transport=bus, cache=cache).close()
+    bus.module("ph").asleep = True  # woken up by the constructor.
+    bus.module("ec").version = "2.12"
+    probes = bus.transactions["probe"]
+    with AtlasHydroTools(transport=bus, cache=cache) as tentacle:
+        assert tentacle.sensors() == ["rtd", "ph", "ec"]
+    assert bus.transactions["probe"] > probes
+    assert [module["version"] for module in json.load(open(cache))] == [2.10, 2.10, 2.12]
+
+
+def test_continuous_mode_restored_by_close(bus):
+    with AtlasHydroTools(transport=bus, poll=True) as tentacle:
+        assert tentacle.continuous("ph", 1)
+        time.sleep(bus.module("ph").processing_time("R") + .1)
+        commands = bus.module("ph").commands
+        assert tentacle.read_latest("ph") == 7.0
+        assert bus.module("ph").commands == commands  # latest reading fetched without any command.
+        assert tentacle.latest_age("ph") is not None
+        assert bus.module("ph").continuous == 1
+    assert bus.module("ph").continuous == 0
+
+
+def test_continuous_mode_not_supported(tools, bus):
+    bus.module("ph").continuous_support = False
+    assert not tools.continuous("ph", 1)
+    assert tools.read_latest("ph") == 7.0  # read on demand.
+    assert tools.latest_age("ph") == 0.0
+
+
+def test_continuous_period_checked(tools):
+    with pytest.raises(ContinuousError):
+        tools.continuous("ph", 100)
+
+
+def test_addr_reset_moves_modules_back(tools, bus):
+    tools.addr_change("ph", 50)
+    assert bus.module("ph").address == 50 and 50 in tools.addresses()
+    tools.addr_reset()
+    assert bus.module("ph").address == 99
+    assert tools.addresses() == [102, 99, 100]
+    assert tools.read_ph() == 7.0
+
+
+def test_addr_reset_swaps_modules(tools, bus):
+    tools.addr_change("ph", 50)
+    tools.addr_change("ec", 99)  # the factory default address of the pH module.
+    tools.addr_change("ph", 100)
+    tools.addr_reset()
+    assert [bus.module(sensor).address for sensor in ["rtd", "ph", "ec"]] == [102, 99, 100]
+    assert bus.collisions() == []
+    assert tools.read_all() == [21.5, 7.0, 1413.0]
+
+
+def test_background_discovery():
+    bus = SimBus(sensors=("rtd", "ph"))
+    with AtlasHydroTools(transport=bus, background=True, poll=True) as tentacle:
+        assert tentacle.read_ph() == 7.0  # waits for the pH EZO module to be discovered.
+        assert tentacle.ready().result(timeout=10) is True
+        assert tentacle.sensors() == ["rtd", "ph"]
+        assert tentacle.read_do() == -100.0  # not connected, known at the end of the discovery.
+
+
+def test_background_discovery_goes_on_after_unknown_module():
+    bus = SimBus(sensors=("ph",))
+    other = SimEZO("ec", address=30)
+    other._names = {"ec": "RGB"}  # EZO module of a type not supported by the library: "?I,RGB,2.10".
+    bus.add(other)
+    bus.add(SimEZO("do", address=40))
+    with AtlasHydroTools(transport=bus, background=True, poll=True) as tentacle:
+        assert tentacle.wait_ready(10)
+        assert tentacle.addresses() == [99, 40]
+        assert tentacle.read_do() == 8.26  # swept after the unknown module.
+
+
+def test_output_parameters_and_fields(tools, bus):
+    assert tools.output("ec") == ["ec"]  # "?O,EC" answer of the module.
+    assert tools.read_multi(["ec"], form="record")[0].fields == {"ec": 1413.0}
+    assert tools.output("ec", ["ec", "tds", "s", "sg"]) == ["ec", "tds", "s", "sg"]
+    assert bus.module("ec").outputs == ["EC", "TDS", "S", "SG"]
+    fields = tools.read_multi(["ec"], form="record")[0].fields
+    assert fields == {"ec": 1413.0, "tds": 763.0, "s": 0.69, "sg": 1.001}
+    assert tools.read_ec() == 1413.0  # first parameter.
+
+
+def test_fields_never_query_output_configuration(tools, bus):
+    bus.module("ec").outputs = ["EC", "TDS"]
+    sent = []
+    send = bus.send
+    bus.send = lambda addr, cmd: (sent.append(cmd), send(addr, cmd))
+    record = tools.read_multi(["ec"], form="record")[0]
+    assert record.value == 1413.0 and record.fields == {}  # not named until output() is called.
+    assert "O,?" not in sent
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+import atlas_hydro_tools
+from atlas_hydro_sim import SimBus
+from atlas_hydro_tools import BusError, MultiBusHydroTools, STATUS_OK
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    monkeypatch.setitem(atlas_hydro_tools._transports, "sim", SimBus)  # one simulated bus per bus number.
+
+
+@pytest.fixture
+def buses(sim):
+    with MultiBusHydroTools(buses=(1, 2), poll=True, transport="sim") as multi:
+        yield multi
+
+
+def test_multibus_read_all(buses):
+    assert buses.addresses() == [(1, 102), (1, 99), (1, 100), (2, 102), (2, 99), (2, 100)]
+    assert buses.read_all("sim") == [21.5, 7.0, 1413.0] * 2
+    assert buses.read((2, "ph")) == 7.0
+
+
+def test_multibus_array_form(buses):
+    pytest.importorskip("numpy")
+    readings = buses.read_all("sim", form="array")
+    assert list(readings["status"]) == [STATUS_OK] * 6
+    assert list(readings["value"]) == [21.5, 7.0, 1413.0] * 2
+
+
+def test_multibus_unknown_bus(buses):
+    with pytest.raises(BusError):
+        buses.read_multi([(3, "ph")])
+
+
+def test_multibus_duplicate_bus(sim):
+    workers = threading.active_count()
+    with pytest.raises(BusError):
+        MultiBusHydroTools(buses=(1, 1), transport="sim")
+    assert threading.active_count() == workers  # no worker started.
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_multibus_failed_constructor_deleted():
+    with pytest.raises(TypeError):
+        MultiBusHydroTools(buses=None)  # destructor called without any attribute set.
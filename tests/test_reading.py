@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from atlas_hydro_sim import SimBus
+from atlas_hydro_tools import AtlasHydroTools, HistoryError, READING_DTYPE, Reading, STATUS_ERROR, STATUS_NOT_CONNECTED, STATUS_NOT_READY, STATUS_OK
+
+
+@pytest.mark.parametrize("mode", ["seq", "sim", "spec"])
+def test_read_all_modes(tools, mode):
+    tools.read_t()  # spec mode needs a measured temperature.
+    assert tools.read_all(mode) == [21.5, 7.0, 1413.0]
+
+
+def test_poll_mode_reads_when_ready(tools, bus, clock):
+    reads = bus.transactions["read"]
+    start = clock()
+    assert tools.read("ph", rt=False) == 7.0
+    assert bus.transactions["read"] - reads > 1  # status byte checked until the measurement is ready.
+    assert clock() - start < bus.module("ph").processing_time("R") + tools._poll_max_interval
+
+
+def test_poll_mode_learns_latency(tools, bus):
+    for _ in range(3):
+        tools.read("ph", rt=False)
+    model = tools.latency("ph")["R"]
+    assert model["samples"] == 3
+    assert 0 < model["ewma"] < bus.module("ph").processing_time("R") + .2
+    assert model["timeout"] <= tools._def_latency["ph"]["R"]
+
+
+def test_learned_latency_used_in_sleep_mode(bus, tmp_path):
+    bus.module("ph")._read_times = {"ph": {"R": .4}}  # faster than the default timeout.
+    path = str(tmp_path / "latency.json")
+    with AtlasHydroTools(transport=bus, poll=True) as tentacle:
+        for _ in range(3):
+            tentacle.read("ph", rt=False)
+        tentacle.latency_save(path)
+    with AtlasHydroTools(transport=bus) as tentacle:
+        tentacle.latency_load(path)
+        assert tentacle._timeout(99, "R") < tentacle._def_latency["ph"]["R"]
+        assert tentacle.read("ph", rt=False) == 7.0
+
+
+def test_sim_mode_reads_earliest_deadline_first(tools, bus):
+    done = []
+    read = bus.read
+
+    def traced(addr, length=16):
+        response = read(addr, length)
+        if response[0] == 1:  # measurement read.
+            done.append(addr)
+        return response
+
+    bus.read = traced
+    assert tools.read_multi(["ph", "ec"], "sim", rt=False) == [7.0, 1413.0]
+    assert done == [100, 99]  # EC EZO module (0.55 sec) read while the pH one (0.8 sec) is still processing.
+
+
+def test_spec_mode_queries_again_when_temperature_changed(tools, bus):
+    tools.read_t()
+    bus.module("rtd").value = 30.0
+    assert tools.read_all("spec") == [30.0, 7.0, 1413.0]
+    assert bus.module("ph").temp == 30.0  # compensated with the measured temperature, not the assumed one.
+
+
+def test_spec_mode_keeps_close_temperature(tools, bus):
+    tools.read_t()
+    bus.module("rtd").value = 21.7
+    commands = bus.module("ph").commands
+    assert tools.read_all("spec") == [21.7, 7.0, 1413.0]
+    assert bus.module("ph").commands == commands + 1  # within spec_tolerance: one query only.
+    assert bus.module("ph").temp == 21.5
+
+
+def test_submit_read(tools):
+    futures = [tools.submit_read(sensor) for sensor in ["ph", "ec"]]
+    assert [future.result(timeout=10) for future in futures] == [7.0, 1413.0]
+
+
+def test_threads_share_the_bus(tools):
+    results = {}
+
+    def read(sensor):
+        results[sensor] = [tools.read(sensor) for n in range(3)]
+
+    threads = [threading.Thread(target=read, args=(sensor,)) for sensor in ["rtd", "ph", "ec"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == {"rtd": [21.5] * 3, "ph": [7.0] * 3, "ec": [1413.0] * 3}
+
+
+def test_history_ring_wraps_around(tools):
+    tools.history_start(4)
+    for _ in range(6):
+        tools.read_ph()
+    timestamps, values, statuses = tools.history("ph")
+    assert len(timestamps) == 4
+    assert list(timestamps) == sorted(timestamps)
+    assert list(values) == [7.0] * 4 and list(statuses) == [STATUS_OK] * 4
+    assert len(tools.history("ph", last=2)[0]) == 2
+
+
+def test_history_resample_skips_errors(tools, bus):
+    tools.history_start(8)
+    tools.read_ph()
+    bus.module("ph").inject("nack")
+    tools.read_ph()
+    starts, means = tools.history_resample("ph", 60.0)
+    assert list(means) == [7.0]
+
+
+@pytest.mark.parametrize("capacity", [0, -1, 2.5, True])
+def test_history_capacity_checked(tools, capacity):
+    with pytest.raises(HistoryError):
+        tools.history_start(capacity)
+    with pytest.raises(HistoryError):  # not started.
+        tools.history("ph")
+
+
+def test_record_form_carries_status(tools, bus):
+    bus.module("ph").inject("nack")
+    records = tools.read_multi(["rtd", "ph", "do"], "sim", form="record")
+    assert all(isinstance(record, Reading) for record in records)
+    assert [record.status for record in records] == [STATUS_OK, STATUS_ERROR, STATUS_NOT_CONNECTED]
+    assert records[0].value == 21.5 and records[0].temp is None
+    assert records[1].sensor == "ph" and records[1].value == -1000.0
+
+
+def test_array_form(tools, bus):
+    pytest.importorskip("numpy")
+    bus.module("ec").inject("syntax")
+    readings = tools.read_all("sim", form="array")
+    assert readings.dtype.names == tuple(name for name, kind in READING_DTYPE)
+    assert list(readings["status"]) == [STATUS_OK, STATUS_OK, STATUS_NOT_READY]
+    assert list(readings["sensor"]) == ["rtd", "ph", "ec"]
+    assert readings["value"][1] == 7.0
+
+
+def test_valid_reading_equal_to_error_value():
+    bus = SimBus(sensors=("orp",))
+    bus.module("orp").value = -1000.0  # valid ORP reading (mV).
+    with AtlasHydroTools(transport=bus, poll=True) as tentacle:
+        record = tentacle.read_all(form="record")[0]
+    assert record.value == -1000.0 and record.ok()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import math
+import random
+
+import pytest
+
+from atlas_hydro_rollup import HydroRollup, RollupError
+from atlas_hydro_tools import STATUS_OK, STATUS_NOT_READY, _clock
+
+
+def test_sliding_window_statistics():
+    rollup = HydroRollup(windows=(60,), panes=6)
+    for i, value in enumerate([1.0, 2.0, 3.0, 4.0]):
+        rollup.add("ph", value, 6000.0 + i)
+    stats = rollup.stats("ph", 60, now=6010.0)
+    assert stats["count"] == 4
+    assert stats["mean"] == pytest.approx(2.5)
+    assert stats["stddev"] == pytest.approx(1.2909944)
+    assert (stats["min"], stats["max"]) == (1.0, 4.0)
+    assert rollup.stats("ph", 60, now=6100.0)["count"] == 0  # slid out of the window.
+
+
+def test_tumbling_windows():
+    rollup = HydroRollup(windows=(60,))
+    rollup.add("ph", 7.0, 6000.0)
+    rollup.add("ph", 8.0, 6030.0)
+    rollup.add("ph", 9.0, 6065.0)
+    assert rollup.stats("ph", 60, "tumbling", now=6070.0)["mean"] == pytest.approx(7.5)
+    assert rollup.stats("ph", 60, "current", now=6070.0)["mean"] == pytest.approx(9.0)
+
+
+def test_errors_counted_by_status():
+    rollup = HydroRollup(windows=(60,))
+    rollup.sink("orp", 98, -200.0, _clock(), STATUS_OK)  # valid reading equal to an error value.
+    rollup.sink("orp", 98, -200.0, _clock(), STATUS_NOT_READY)
+    stats = rollup.stats("orp", 60)
+    assert (stats["count"], stats["errors"]) == (1, 1)
+
+
+def test_merged_panes_match_direct_computation():
+    generator = random.Random(7)
+    values = [generator.gauss(7.0, .2) for i in range(500)]
+    rollup = HydroRollup(windows=(60,), panes=6)
+    for i, value in enumerate(values):
+        rollup.add("ph", value, 6000.0 + i * .1)  # 50 seconds spread over the panes.
+    stats = rollup.stats("ph", 60, now=6050.0)
+    mean = sum(values) / len(values)
+    assert stats["count"] == len(values)
+    assert stats["mean"] == pytest.approx(mean)
+    assert stats["stddev"] == pytest.approx(math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1)))
+    assert (stats["min"], stats["max"]) == (min(values), max(values))
+
+
+@pytest.mark.parametrize("window, kind", [(3600, "sliding"), (60, "hopping")])
+def test_unknown_window(window, kind):
+    with pytest.raises(RollupError):
+        HydroRollup(windows=(60,)).stats("ph", window, kind)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from atlas_hydro_sim import SimBus
+
+server = pytest.importorskip("atlas_hydro_server")  # Unix only (Unix domain sockets).
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "hydro.sock")
+
+
+def _gate(hydro, release):  # wraps the physical queries of hydro so that each one waits for release().
+    query = hydro.tools()._query_multi
+
+    def gated(*args, **kwargs):
+        hydro.querying.set()
+        release()
+        return query(*args, **kwargs)
+
+    hydro.querying = threading.Event()
+    hydro.tools()._query_multi = gated
+
+
+def _start(target, *args):  # daemon thread, not blocking the tests exit if a request hangs.
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def test_server_answers_requests(path, bus):
+    hydro = server.HydroServer(path, transport=bus)
+    hydro.start()
+    try:
+        assert server.request("read", path, addr="ph")["result"] == 7.0
+        assert server.request("read_all", path)["result"] == [21.5, 7.0, 1413.0]
+        assert server.request("read", path, addr="do")["result"] == -100.0
+        assert not server.request("read", path, addr=200)["ok"]
+        with pytest.raises(server.ServerError):  # another server accepts connections on path.
+            server.HydroServer(path, transport=SimBus())
+    finally:
+        hydro.close()
+
+
+def test_server_coalesces_requests(path, bus):
+    clients = 6
+    hydro = server.HydroServer(path, transport=bus)
+    arrived = threading.Event()
+
+    def release():  # the query starts once every client request has arrived.
+        assert arrived.wait(10)
+
+    _gate(hydro, release)
+    hydro.start()
+    commands = bus.module("ph").commands
+    responses = []
+
+    def client():
+        responses.append(server.request("read", path, addr="ph"))
+
+    try:
+        threads = [_start(client) for n in range(clients)]
+        for n in range(1000):
+            with hydro._lock:
+                if hydro._counters["requests"] == clients:
+                    break
+            threading.Event().wait(.01)
+        arrived.set()
+        for thread in threads:
+            thread.join(10)
+        assert [response["result"] for response in responses] == [7.0] * clients
+        assert bus.module("ph").commands - commands == 1  # a single physical query for all the clients.
+        assert server.request("stats", path)["result"]["queries"] == 1
+        assert sum(response["batch"] for response in responses) == clients * clients
+    finally:
+        arrived.set()
+        hydro.close()
+
+
+def test_close_fails_queued_requests(path, bus):
+    hydro = server.HydroServer(path, transport=bus)
+    closing = threading.Event()
+    _gate(hydro, lambda: closing.wait(10))
+    responses = {}
+
+    def client(addr):
+        responses[addr] = hydro._handle('{"op": "read", "addr": "%s"}' % addr)
+
+    running = _start(client, "ph")
+    assert hydro.querying.wait(10)
+    queued = _start(client, "ec")  # waits for the next query, never made.
+    for n in range(1000):
+        with hydro._lock:
+            if hydro._next.requests:
+                break
+        threading.Event().wait(.01)
+    closer = _start(hydro.close)
+    for n in range(1000):
+        if hydro._closed:
+            break
+        threading.Event().wait(.01)
+    closing.set()
+    for thread in [running, queued, closer]:
+        thread.join(10)
+        assert not thread.is_alive()
+    assert responses["ph"]["result"] == 7.0
+    assert not responses["ec"]["ok"] and responses["ec"]["error"] == "ServerError"
+    assert hydro._handle('{"op": "read", "addr": "ph"}')["error"] == "ServerError"
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from atlas_hydro_sim import SimBus
+from atlas_hydro_tools import EZOError, TransportError
+
+shm = pytest.importorskip("atlas_hydro_shm")  # Unix only (fcntl, shared mmap).
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "segment")
+
+
+def test_broker_publishes_readings(path, bus):
+    broker = shm.HydroBroker(path, rate=2.0, transport=bus)
+    try:
+        broker.run(cycles=2)
+        client = shm.HydroClient(path, max_age=60.0)
+        assert client.read_all() == [21.5, 7.0, 1413.0]
+        assert client.sensors() == ["rtd", "ph", "ec"] and client.addresses() == [102, 99, 100]
+        assert client.age("ph") is not None
+        assert client.state() == "stopped"
+        client.close()
+    finally:
+        broker.close()
+
+
+def test_published_status_tells_errors(path):
+    bus = SimBus(sensors=("ph", "orp"))
+    bus.module("orp").value = -100.0  # valid ORP reading (mV), equal to an error value.
+    broker = shm.HydroBroker(path, rate=1.0, transport=bus)
+    bus.module("ph").inject("nack", -1)
+    try:
+        broker.run(cycles=1)
+        client = shm.HydroClient(path, max_age=60.0)
+        assert client.read_orp() == -100.0
+        assert client.read_ph() == -1000.0
+        client.mode = "dev"
+        assert client.read_orp() == -100.0
+        with pytest.raises(EZOError):
+            client.read_ph()
+        client.close()
+    finally:
+        broker.close()
+
+
+def test_broker_failure_published(path, bus):
+    broker = shm.HydroBroker(path, rate=2.0, transport=bus)
+    try:
+        broker.run(cycles=1)
+        broker.tools().stream = None  # measurement raising an exception.
+        with pytest.raises(TypeError):
+            broker.run(cycles=1)
+        client = shm.HydroClient(path)
+        assert client.state() == "failed"
+        assert client.read_ph() == -1000.0
+        client.close()
+    finally:
+        broker.close()
+
+
+def test_second_broker_refused(path, bus):
+    broker = shm.HydroBroker(path, transport=bus)
+    try:
+        with pytest.raises(shm.BrokerError):
+            shm.HydroBroker(path, transport=SimBus())
+    finally:
+        broker.close()
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")  # destructor of the failed broker.
+def test_failed_broker_constructor_releases_segment(path, bus):
+    with pytest.raises(TransportError):
+        shm.HydroBroker(path, transport="nope")
+    broker = shm.HydroBroker(path, transport=bus)  # segment lock released.
+    broker.close()
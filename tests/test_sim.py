@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from atlas_hydro_sim import SimBus, SimEZO
+from atlas_hydro_tools import AtlasHydroTools, EZOError
+
+
+def test_scan_orders_modules(tools):
+    assert tools.sensors() == ["rtd", "ph", "ec"]
+    assert tools.addresses() == [102, 99, 100]
+
+
+def test_sleep_mode_waits_processing_time(bus):
+    with AtlasHydroTools(transport=bus) as tentacle:  # fixed timeouts, longer than the processing times.
+        assert tentacle.read_all() == [21.5, 7.0, 1413.0]
+    assert bus.transactions["send"] > 0 and bus.transactions["read"] > 0
+
+
+@pytest.mark.parametrize("fault, value", [("nack", -1000.0), ("syntax", -200.0), ("garbage", -200.0)])
+def test_fault_injection_operation_mode(tools, bus, fault, value):
+    bus.module("ph").inject(fault)
+    assert tools.read_ph() == value
+    assert tools.read_ph() == 7.0  # fault injected in one command only.
+
+
+def test_fault_injection_development_mode(tools, bus):
+    tools.mode_change("dev")
+    bus.module("ph").inject("nack")
+    with pytest.raises(EZOError):
+        tools.read_ph()
+
+
+def test_slow_module_not_ready_at_deadline(tools, bus):
+    bus.module("ph").inject("slow")  # 2.4 seconds, after the 2.0 seconds polling deadline.
+    assert tools.read_ph() == -200.0
+    assert tools.read_ph() == 7.0
+
+
+def test_colliding_modules_corrupt_readings():
+    bus = SimBus(sensors=("ph",))
+    bus.add(SimEZO("ec", address=99))
+    assert bus.collisions() == [99]
+    assert len(bus.modules()) == 2
+
+
+def test_unknown_module_type():
+    with pytest.raises(ValueError):
+        SimEZO("co2")
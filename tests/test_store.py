@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from atlas_hydro_store import HydroStore, StoreError, _header_size
+from atlas_hydro_tools import STATUS_ERROR, STATUS_OK
+
+
+def test_append_query(tmp_path):
+    store = HydroStore(str(tmp_path), capacity=8)
+    for i in range(20):  # three segments.
+        store.append("ph", 1000.0 + i, 7.0 + i / 100.0)
+    timestamps, values, statuses = store.query("ph", 1005.0, 1015.0)
+    assert list(timestamps) == [1000.0 + i for i in range(5, 15)]
+    assert values[0] == 7.05 and list(statuses) == [STATUS_OK] * 10
+    assert store.count("ph") == 20 and store.last("ph") == (1019.0, 7.19, STATUS_OK)
+    store.close()
+
+
+def test_status_kept(tmp_path):
+    with_error = HydroStore(str(tmp_path))
+    with_error.sink("orp", 98, -1000.0, 1.0, STATUS_OK)
+    with_error.sink("orp", 98, -1000.0, 2.0, STATUS_ERROR)
+    assert list(with_error.query("orp")[2]) == [STATUS_OK, STATUS_ERROR]
+    with_error.close()
+
+
+def test_last_segment_continued(tmp_path):
+    for i in range(3):
+        store = HydroStore(str(tmp_path), capacity=8)
+        store.append("ph", 1000.0 + i, 7.0)
+        store.close()
+    assert os.listdir(str(tmp_path / "ph")) == ["00000000.seg"]
+    store = HydroStore(str(tmp_path), capacity=8)
+    assert store.count("ph") == 3
+    store.close()
+
+
+def test_torn_record_dropped(tmp_path):
+    store = HydroStore(str(tmp_path), capacity=8)
+    for i in range(4):
+        store.append("ph", 1000.0 + i, 7.0)
+    store.close()
+    with open(str(tmp_path / "ph" / "00000000.seg"), "r+b") as f:  # last record partially written: value without its' checksum.
+        f.seek(_header_size + 8 * 8 + 8 * 3)
+        f.write(b"\xff" * 8)
+    store = HydroStore(str(tmp_path), capacity=8)
+    assert store.count("ph") == 3
+    assert store.last("ph") == (1002.0, 7.0, STATUS_OK)
+    store.append("ph", 1004.0, 7.5)  # the torn record is overwritten.
+    assert store.count("ph") == 4
+    store.close()
+
+
+def test_closed_store(tmp_path):
+    store = HydroStore(str(tmp_path))
+    store.close()
+    with pytest.raises(StoreError):
+        store.append("ph", 1.0, 7.0)
+    with pytest.raises(StoreError):
+        store.keys()
+
+
+def _mapped(path):  # number of files of path directory open by this process.
+    fds = "/proc/self/fd"
+    return sum(1 for fd in os.listdir(fds) if os.path.realpath(os.path.join(fds, fd)).startswith(os.path.realpath(path)))
+
+
+@pytest.mark.parametrize("capacity", [0, -8, 2.5, True])
+def test_capacity_checked(tmp_path, capacity):
+    with pytest.raises(ValueError):
+        HydroStore(str(tmp_path), capacity=capacity)
+
+
+@pytest.mark.parametrize("content", [b"", b"AHSTORE1", b"NOTASEGMENT" + b"\x00" * 200])
+def test_corrupt_segment_releases_opened_ones(tmp_path, content):
+    if not os.path.isdir("/proc/self/fd"):
+        pytest.skip("open files listed by /proc only")
+    store = HydroStore(str(tmp_path), capacity=8)
+    for key in ["ec", "ph"]:
+        store.append(key, 1000.0, 7.0)
+    store.close()
+    with open(str(tmp_path / "ph" / "00000001.seg"), "wb") as f:
+        f.write(content)
+    with pytest.raises(ValueError):
+        HydroStore(str(tmp_path), capacity=8)
+    assert _mapped(str(tmp_path)) == 0
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from atlas_hydro_tools import StreamError, STATUS_OK
+
+
+def test_stream_cycles(tools):
+    records = list(tools.stream(rate=1.0, cycles=2))
+    assert [record["cycle"] for record in records] == [0, 1]
+    for record in records:
+        assert record["addresses"] == tools.addresses()
+        assert record["readings"] == [21.5, 7.0, 1413.0]
+        assert record["statuses"] == [STATUS_OK] * 3
+    assert records[1]["monotonic"] - records[0]["monotonic"] == pytest.approx(1.0)
+
+
+def test_stream_gives_readings_to_sinks(tools):
+    readings = []
+    tools.sink_add(lambda sensor, addr, value, timestamp, status: readings.append((sensor, value, status)))
+    list(tools.stream(rate=1.0, cycles=1))
+    assert readings[-3:] == [("rtd", 21.5, STATUS_OK), ("ph", 7.0, STATUS_OK), ("ec", 1413.0, STATUS_OK)]
+
+
+def test_stream_skips_late_cycles(tools):
+    records = list(tools.stream(rate=4.0, sensors=["ph"], cycles=3))  # cycles shorter than the pH measurement.
+    cycles = [record["cycle"] for record in records]
+    assert cycles == sorted(cycles) and cycles[-1] > len(records) - 1
+    assert records[-1]["dropped"] > 0
+
+
+@pytest.mark.parametrize("args", [{"rate": 0}, {"rate": True}, {"buffer": 0}, {"cycles": 0}])
+def test_stream_arguments_checked_at_call(tools, args):
+    with pytest.raises(StreamError):
+        tools.stream(**args)
+
+
+@pytest.mark.parametrize("buffer", [1, 4])
+def test_stream_last_record_kept(tools, buffer):
+    records = list(tools.stream(rate=1.0, cycles=1, buffer=buffer))  # end of stream not taking the place of the last record.
+    assert [record["cycle"] for record in records] == [0]
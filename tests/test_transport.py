@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+import atlas_hydro_tools
+from atlas_hydro_sim import SimBus
+from atlas_hydro_tools import AtlasHydroTools, MemoryTransport, RawTransport, SMBusTransport, Transport, TransportError
+
+
+class _LegacyTransport(object):  # user transport of the previous interface, read() without length argument.
+
+    def __init__(self):
+        self.bus = SimBus(sensors=("ph",))
+
+    def send(self, addr, cmd):
+        self.bus.send(addr, cmd)
+
+    def read(self, addr):
+        return self.bus.read(addr, 16)
+
+    def probe(self, addr):
+        self.bus.probe(addr)
+
+    def close(self):
+        pass
+
+
+def _smbus_transport():  # SMBusTransport writing to a memory file instead of /dev/i2c-1.
+    transport = SMBusTransport.__new__(SMBusTransport)
+    Transport.__init__(transport)
+    transport._file_write = io.BytesIO()
+    transport._slave = None
+    return transport
+
+
+def test_frames_encoded_once():
+    transport = MemoryTransport()
+    assert transport.frame("R") is transport.frame("R")  # fixed command, encoded by the constructor.
+    assert transport.frame("RT,25.0") == b"RT,25.0\x00"
+    assert transport.frame("RT,25.0") is transport.frame("RT,25.0")
+
+
+def test_frames_cache_bounded():
+    transport = MemoryTransport()
+    for i in range(transport._frames_size + 10):
+        transport.frame("T," + str(i))
+    assert len(transport._frames) == transport._frames_size
+    assert "T,0" not in transport._frames and "T," + str(transport._frames_size + 9) in transport._frames
+
+
+def test_slave_address_selected_once(monkeypatch):
+    ioctls = []
+    monkeypatch.setattr(atlas_hydro_tools.fcntl, "ioctl", lambda f, request, addr: ioctls.append((request, addr)))
+    transport = _smbus_transport()
+    transport.send(99, "RT,25.0")
+    transport.send(99, "RT,25.0")
+    transport.send(100, "T,25.0")
+    assert ioctls == [(atlas_hydro_tools.I2C_SLAVE, 99), (atlas_hydro_tools.I2C_SLAVE, 100)]
+    assert transport._file_write.getvalue() == b"RT,25.0\x00RT,25.0\x00T,25.0\x00"
+
+
+def test_failed_selection_forgotten(monkeypatch):
+    def ioctl(f, request, addr):
+        raise IOError(121, "Remote I/O error")
+
+    transport = _smbus_transport()
+    monkeypatch.setattr(atlas_hydro_tools.fcntl, "ioctl", ioctl)
+    with pytest.raises(IOError):
+        transport.send(99, "RT,25.0")
+    assert transport._slave is None  # selected again by the next command.
+
+
+def test_transport_is_abstract():
+    with pytest.raises(TypeError):
+        Transport()
+
+
+@pytest.mark.parametrize("transport", ["nope", object()])
+def test_incorrect_transport(transport):
+    with pytest.raises(TransportError):
+        AtlasHydroTools(transport=transport)
+
+
+def test_empty_memory_transport():
+    with AtlasHydroTools(transport=MemoryTransport()) as tentacle:
+        assert tentacle.addresses() == []
+        assert tentacle.read_ph() == -100.0
+
+
+def test_raw_transport_combined_transactions(monkeypatch):
+    transfers = []
+
+    def ioctl(fd, request, rdwr):
+        transfers.append([(rdwr.msgs[i].addr, rdwr.msgs[i].flags, rdwr.msgs[i].len) for i in range(rdwr.nmsgs)])
+        if rdwr.nmsgs == 2:
+            rdwr.msgs[1].buf[0] = 1  # status byte of the response.
+
+    monkeypatch.setattr(atlas_hydro_tools.os, "open", lambda path, flags: -1)  # without /dev/i2c-1.
+    transport = RawTransport()
+    monkeypatch.setattr(atlas_hydro_tools.fcntl, "ioctl", ioctl)
+    transport.send(99, "R")
+    assert transport.read(99, 16)[0] == 1
+    assert transfers == [[(99, 0, 2)], [(99, 0, 1), (99, atlas_hydro_tools.I2C_M_RD, 16)]]  # register write and response read in one transaction.
+
+
+def test_locked_transport_attributes_delegated(tools, bus):
+    assert tools._transport.transactions is bus.transactions
+    assert tools._transport.module("ph") is bus.module("ph")
+
+
+def test_transport_reading_without_length():
+    with AtlasHydroTools(transport=_LegacyTransport()) as tentacle:
+        assert tentacle.read_ph() == 7.0